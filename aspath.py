@@ -0,0 +1,96 @@
+class ASPath:
+    __slots__ = ('asn', 'tail', 'length', 'origin')
+
+    def __init__(self, asn:int, tail=None):
+        '''
+        Create an immutable AS path node. A route only stores the first ASN and a pointer to the path of the
+        neighbor (shared suffix), so announcing a route to the next AS allocates one node instead of a new list.
+        :param asn: first ASN of the path
+        :param tail: ASPath with the rest of the path (None if this ASN is the origin)
+        '''
+        self.asn = asn
+        self.tail = tail
+        if tail is None:
+            self.length = 1
+            self.origin = asn
+        else:
+            self.length = tail.length + 1
+            self.origin = tail.origin
+
+
+    @classmethod
+    def from_list(cls, asp:list):
+        '''
+        Create the path nodes from a list of ASNs
+        :param asp: AS path (list, the origin is the last ASN)
+        :return: ASPath object
+        '''
+        node = None
+        for asn in reversed(asp):
+            node = cls(asn, node)
+        return node
+
+
+    def prepend(self, asn:int):
+        '''
+        New path with the ASN in the beginning (this path is not changed)
+        :param asn: ASN
+        :return: ASPath object
+        '''
+        return ASPath(asn, self)
+
+
+    def __len__(self):
+        return self.length
+
+
+    def __iter__(self):
+        node = self
+        while node is not None:
+            yield node.asn
+            node = node.tail
+
+
+    def __contains__(self, asn:int):
+        node = self
+        while node is not None:
+            if node.asn == asn:
+                return True
+            node = node.tail
+        return False
+
+
+    def __getitem__(self, i:int):
+        '''
+        Only the first (0) and the last (-1) ASNs are accessed without walking the path
+        '''
+        if i == 0:
+            return self.asn
+        elif i == -1:
+            return self.origin
+        return self.to_list()[i]
+
+
+    def count(self, asn:int):
+        '''
+        How many times the ASN is in the path (used to check prepends)
+        :param asn: ASN
+        :return: int
+        '''
+        return sum(1 for a in self if a == asn)
+
+
+    def to_list(self):
+        '''
+        Materialise the full AS path
+        :return: AS path (list)
+        '''
+        return list(self)
+
+
+    def __str__(self):
+        return str(self.to_list())
+
+
+    def __repr__(self):
+        return str(self.to_list())
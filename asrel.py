@@ -0,0 +1,132 @@
+import bz2
+import hashlib
+import io
+import json
+import os
+import re
+import numpy as np
+import pandas as pd
+
+# Change it when the content of the cache changes (old caches are ignored and created again)
+CACHE_VERSION = 1
+# Folder (inside the folder of the snapshot) where the caches are saved
+CACHE_FOLDER = 'cache'
+ARRAYS = ('as1', 'as2', 'conn', 'tier1', 'ixp')
+
+
+def file_hash(file:str):
+    '''
+    SHA-256 of a file
+    :param file: path to the file
+    :return: hexadecimal digest (str)
+    '''
+    digest = hashlib.sha256()
+    with open(file, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parse_header(data:bytes, name:bytes):
+    '''
+    ASNs listed in a header line of the snapshot (e.g. "# input clique: 174 209 ...")
+    :param data: content of the file
+    :param name: start of the header line
+    :return: list of ASNs
+    '''
+    asns = list()
+    for line in re.findall(rb'^' + re.escape(name) + rb'[^:\n]*:([^\n]*)$', data, re.M):
+        asns.extend(int(t) for t in line.split())
+    return asns
+
+
+def parse_as_rel(input_file:str):
+    '''
+    Read a CAIDA AS relationship snapshot (as1|as2|conn) with a vectorised reader
+    :param input_file: path to the file (.txt or .txt.bz2)
+    :return: a dict {'as1', 'as2', 'conn', 'tier1', 'ixp': numpy array}
+    '''
+    if input_file.endswith('.bz2'):
+        with bz2.open(input_file, 'rb') as f:
+            data = f.read()
+    else:
+        with open(input_file, 'rb') as f:
+            data = f.read()
+    edges = pd.read_csv(io.BytesIO(data), sep='|', comment='#', header=None, usecols=[0, 1, 2],
+                        names=['as1', 'as2', 'conn'], dtype='Int64', engine='c')
+    # lines with less than 3 fields are ignored
+    edges = edges.dropna()
+    return {'as1': edges['as1'].to_numpy(dtype=np.int64),
+            'as2': edges['as2'].to_numpy(dtype=np.int64),
+            'conn': edges['conn'].to_numpy(dtype=np.int8),
+            'tier1': np.array(parse_header(data, b'# input'), dtype=np.int64),
+            'ixp': np.array(parse_header(data, b'# IXP'), dtype=np.int64)}
+
+
+def cache_path(input_file:str, digest:str=None):
+    '''
+    Folder of the binary cache of a snapshot, named by the hash of the file and the version of the cache
+    :param input_file: path to the snapshot
+    :param digest: hash of the file (computed if None)
+    :return: path (str)
+    '''
+    if digest is None:
+        digest = file_hash(input_file)
+    folder = os.path.join(os.path.dirname(input_file), CACHE_FOLDER)
+    name = os.path.basename(input_file).split('.txt')[0]
+    return os.path.join(folder, '{}.{}.v{}'.format(name, digest[:16], CACHE_VERSION))
+
+
+def is_cache(path:str):
+    '''
+    Check if the path is a valid cache created by this version
+    :param path: path to a folder
+    :return: True or False
+    '''
+    meta = os.path.join(path, 'meta.json')
+    if not os.path.isfile(meta):
+        return False
+    with open(meta, 'r') as f:
+        return json.load(f).get('version') == CACHE_VERSION
+
+
+def cache_as_rel(input_file:str):
+    '''
+    Create the binary cache of a snapshot if it does not exist yet
+    :param input_file: path to the snapshot (.txt or .txt.bz2)
+    :return: path to the cache folder
+    '''
+    digest = file_hash(input_file)
+    path = cache_path(input_file, digest)
+    if is_cache(path):
+        return path
+    arrays = parse_as_rel(input_file)
+    tmp = '{}.tmp{}'.format(path, os.getpid())
+    os.makedirs(tmp, exist_ok=True)
+    for key in ARRAYS:
+        np.save(os.path.join(tmp, key + '.npy'), arrays[key])
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump({'version': CACHE_VERSION, 'source': os.path.basename(input_file), 'sha256': digest,
+                   'edges': len(arrays['as1'])}, f)
+    try:
+        os.replace(tmp, path)
+    except OSError:
+        # other process created the cache first
+        for key in os.listdir(tmp):
+            os.remove(os.path.join(tmp, key))
+        os.rmdir(tmp)
+    return path
+
+
+def load_as_rel(path:str):
+    '''
+    Load the connections of a snapshot. A cache folder is memory-mapped, a snapshot is cached first
+    (see cache_as_rel) and the cache is memory-mapped.
+    :param path: path to a cache folder or to a snapshot
+    :return: a dict {'as1', 'as2', 'conn', 'tier1', 'ixp': numpy array}
+    '''
+    if not os.path.isdir(path):
+        path = cache_as_rel(path)
+    elif not is_cache(path):
+        raise ValueError('{} is not an AS relationship cache (version {})'.format(path, CACHE_VERSION))
+    return {key: np.load(os.path.join(path, key + '.npy'), mmap_mode='r') for key in ARRAYS}
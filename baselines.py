@@ -0,0 +1,138 @@
+import os
+import hashlib
+import pickle as pk
+
+# Change it when the content of the baselines changes (old files are ignored)
+BASELINE_VERSION = 2
+
+
+class BaselineCache:
+    def __init__(self, folder:str=None, max_entries:int=1):
+        '''
+        Converged legitimate routes of the victims (baselines), so the hijacks of a victim start from the same
+        legitimate propagation in every scenario. The key is built by Graph.baseline_key (topology digest, victim,
+        prefix, prepend policy, ignore_model_sometimes, propagation engine and, only if ROV can drop the announcement,
+        the ROV configuration). The scenarios created by Graph.fork share the cache, so the ROV configurations of a
+        campaign reuse the same baselines.
+        Only the last baselines are kept in memory, a full baseline of a large snapshot takes megabytes in each
+        process. If folder is not None, they are saved in one file per key, which the processes of a Pool and the next
+        runs read instead of propagating the legitimate routes again.
+        :param folder: folder to save the baselines (None = only in memory)
+        :param max_entries: number of baselines (and of layers, see get_layer) kept in memory, the oldest are dropped
+        (0 = unlimited)
+        '''
+        self.folder = folder
+        self.max_entries = max_entries
+        self.memory = dict()
+        self.layers = dict()
+        self.hits = 0
+        self.misses = 0
+        if folder is not None:
+            os.makedirs(folder, exist_ok=True)
+
+
+    def file_name(self, key:tuple):
+        '''
+        File of a baseline, named by the hash of the key
+        :param key: key (see Graph.baseline_key)
+        :return: path (str)
+        '''
+        digest = hashlib.sha256('|'.join('{}'.format(value) for value in key).encode()).hexdigest()
+        return os.path.join(self.folder, '{}.v{}.pk'.format(digest[:32], BASELINE_VERSION))
+
+
+    def get(self, key:tuple):
+        '''
+        Get a baseline from the memory or from its file
+        :param key: key (see Graph.baseline_key)
+        :return: baseline (PrefixRIB or a dict {ASN: route}) or None if it is not in the cache
+        '''
+        if key in self.memory.keys():
+            self.hits += 1
+            return self.memory[key]
+        if self.folder is not None and os.path.isfile(self.file_name(key)):
+            try:
+                with open(self.file_name(key), 'rb') as f:
+                    saved_key, baseline = pk.load(f)
+            except (EOFError, pk.UnpicklingError):
+                saved_key, baseline = None, None
+            if saved_key == key:
+                self.hits += 1
+                self.remember(key, baseline)
+                return baseline
+        self.misses += 1
+        return None
+
+
+    def put(self, key:tuple, baseline):
+        '''
+        Save a baseline in memory and in its file
+        :param key: key (see Graph.baseline_key)
+        :param baseline: PrefixRIB ('arrays' backend) or a dict {ASN: route} ('dict' backend)
+        :return: None
+        '''
+        self.remember(key, baseline)
+        if self.folder is None or os.path.isfile(self.file_name(key)):
+            return None
+        file = self.file_name(key)
+        tmp = '{}.tmp{}'.format(file, os.getpid())
+        with open(tmp, 'wb') as f:
+            pk.dump((key, baseline), f, protocol=pk.HIGHEST_PROTOCOL)
+        os.replace(tmp, file)
+
+
+    def remember(self, key:tuple, baseline):
+        self.memory[key] = baseline
+        while 0 < self.max_entries < len(self.memory):
+            del self.memory[next(iter(self.memory))]
+
+
+    def get_layer(self, key:tuple, base):
+        '''
+        Get the copy-on-write layer of AS objects with the routes of a baseline ('dict' backend, see
+        Graph.load_baseline), the scenarios of the same baseline are created on top of it
+        :param key: key (see Graph.baseline_key)
+        :param base: mapping of AS objects below the layer (the graph the scenarios were forked from)
+        :return: ScenarioASes object or None if there is no layer of the baseline over base
+        '''
+        layer = self.layers.get(key)
+        if layer is None or layer.base is not base:
+            return None
+        return layer
+
+
+    def put_layer(self, key:tuple, layer):
+        '''
+        Keep the layer of AS objects of a baseline in memory (see get_layer)
+        :param key: key (see Graph.baseline_key)
+        :param layer: ScenarioASes object
+        :return: None
+        '''
+        self.layers[key] = layer
+        while 0 < self.max_entries < len(self.layers):
+            del self.layers[next(iter(self.layers))]
+
+
+    def clear_layers(self):
+        '''
+        Remove the layers of AS objects (needed when the AS objects below them change)
+        :return: None
+        '''
+        self.layers.clear()
+
+
+    def clear(self):
+        '''
+        Remove the baselines and the layers kept in memory (the files are kept)
+        :return: None
+        '''
+        self.memory.clear()
+        self.layers.clear()
+
+
+    def __contains__(self, key:tuple):
+        return key in self.memory.keys() or (self.folder is not None and os.path.isfile(self.file_name(key)))
+
+
+    def __len__(self):
+        return len(self.memory)
@@ -0,0 +1,358 @@
+import os
+import io
+import math
+import sys
+import json
+import random
+import platform
+import shutil
+import argparse
+import tempfile
+import statistics
+from copy import deepcopy
+from contextlib import redirect_stdout
+from datetime import datetime
+from time import perf_counter
+import numpy as np
+from graph import Graph
+from netcalc_ipv4 import Prefix
+from tools import Hijackers
+from asrel import file_hash, parse_as_rel
+from synthetic import create_as_rel
+
+# Version of the JSON file (results saved with other versions are not compared)
+FORMAT_VERSION = 1
+# Benchmarks in the order they run
+BENCHMARKS = ['parse_as_rel', 'add_connections', 'fork', 'deepcopy', 'legit_propagate', 'legit_propagate_ignore_model',
+              'hijack_propagate', 'hijack_propagate_ignore_model', 'check_hijack', 'text_report', 'asp_type',
+              'prefix_parse', 'prefix_check', 'create_clusters']
+# Benchmarks that take seconds on a full snapshot run fewer times
+SLOW = {'parse_as_rel': 3, 'add_connections': 3, 'deepcopy': 1, 'create_clusters': 3}
+# Minimum time of one run, fast functions are called many times per run
+MIN_RUN_TIME = 0.1
+# Clusters of hijackers used by run_simulation.py
+CLUSTERS = [[2, 2], [3, 3], [4, 10], [11, 0]]
+
+
+class Benchmarks:
+    def __init__(self, snapshot:str, rib_backend:str='dict', algorithm:str='flood', seed:int=0, victim:int=0,
+                 hijacker:int=0, synthetic:int=0):
+        '''
+        Microbenchmarks of the simulator hot paths over an AS relationship snapshot (CAIDA or synthetic).
+        Every benchmark is a method bench_<name> that prepares its scenario and returns the function timed.
+        :param snapshot: AS relationship file (as1|as2|conn) or its cache folder
+        :param rib_backend: 'dict' or 'arrays' (see Graph)
+        :param algorithm: 'flood' or 'three_stage' (see Graph.route_propagate)
+        :param seed: seed used to select the victim, the hijacker and the prefixes
+        :param victim: ASN of the victim (0 = selected with the seed among the transit ASes)
+        :param hijacker: ASN of the hijacker (0 = selected with the seed among the stub ASes)
+        :param synthetic: number of ASes of a synthetic snapshot created with the seed (0 = use the snapshot)
+        '''
+        self.snapshot = snapshot
+        self.rib_backend = rib_backend
+        self.algorithm = algorithm
+        self.seed = seed
+        self.victim = victim
+        self.hijacker = hijacker
+        self.prefix = '10.0.0.0/24'
+        self.folder = tempfile.mkdtemp(prefix='benchmark_')
+        if synthetic > 0:
+            self.snapshot = create_as_rel(os.path.join(self.folder, 'synthetic_{}_{}.as-rel2.txt'.format(synthetic, seed)),
+                                          synthetic, seed)
+        self.base = None
+
+
+    def graph(self):
+        '''
+        Graph loaded once and shared by the benchmarks (they change only forks of it)
+        :return: Graph object
+        '''
+        if self.base is None:
+            self.base = self.load()
+            if os.path.isfile('{}/vps_rv_ripe.pk'.format(self.base.root_folder)):
+                self.base.get_vps()
+            if os.path.isfile('{}/country.csv'.format(self.base.root_folder)):
+                self.base.get_country_ases()
+            else:
+                # offline, the reports are created with ASes without country instead of downloading the countries
+                self.base.countries = {''}
+            rng = random.Random(self.seed)
+            topo = self.base.get_topology()
+            transit = topo.asns[(topo.n_customers > 0) & (topo.n_providers > 0)].tolist()
+            stubs = topo.asns[(topo.n_customers == 0) & (topo.n_providers > 0)].tolist()
+            if self.victim == 0:
+                self.victim = rng.choice(transit)
+            if self.hijacker == 0:
+                self.hijacker = rng.choice(stubs)
+        return self.base
+
+
+    def load(self):
+        graph = Graph(override=False, debug=False, rib_backend=self.rib_backend)
+        graph.add_connections(self.snapshot)
+        return graph
+
+
+    def legitimate(self, ignore_model_sometimes:bool=True):
+        '''
+        New scenario with the converged routes of the victim
+        :return: Graph object
+        '''
+        scenario = self.graph().fork()
+        scenario.add_prefix(self.victim, self.prefix, roa=False)
+        scenario.route_propagate(self.victim, hijack=False, ignore_model_sometimes=ignore_model_sometimes,
+                                 algorithm=self.algorithm)
+        return scenario
+
+
+    def hijacked(self):
+        '''
+        New scenario after the hijack of the prefix of the victim (checked with check_hijack and the legitimate routes
+        that were kept, they must have the same AS path as before the hijack)
+        :return: Graph object
+        '''
+        scenario = self.legitimate()
+        before = {asn: scenario.get_route(asn, self.prefix)[0] for asn in scenario.ases.keys()}
+        scenario.hijack(self.hijacker, self.prefix, [])
+        scenario.route_propagate(self.hijacker, hijack=True, ignore_model_sometimes=True, algorithm=self.algorithm)
+        scenario.check_hijack()
+        for asn, asp in before.items():
+            route, hijack = scenario.get_route(asn, self.prefix)
+            if not hijack and route != asp:
+                raise RuntimeError('AS{} kept its legitimate route but its AS path changed from {} to {}.'.format(
+                    asn, asp, route))
+        return scenario
+
+
+    def bench_parse_as_rel(self):
+        return lambda: parse_as_rel(self.snapshot)
+
+
+    def bench_add_connections(self):
+        return self.load
+
+
+    def bench_fork(self):
+        graph = self.graph()
+        return graph.fork
+
+
+    def bench_deepcopy(self):
+        graph = self.graph()
+        return lambda: deepcopy(graph)
+
+
+    def bench_legit_propagate(self):
+        return lambda: self.legitimate(ignore_model_sometimes=False)
+
+
+    def bench_legit_propagate_ignore_model(self):
+        return lambda: self.legitimate(ignore_model_sometimes=True)
+
+
+    def hijack_propagate(self, ignore_model_sometimes:bool):
+        scenario = self.legitimate()
+        scenario.checkpoint()
+
+        def run():
+            scenario.hijack(self.hijacker, self.prefix, [])
+            scenario.route_propagate(self.hijacker, hijack=True, ignore_model_sometimes=ignore_model_sometimes,
+                                     algorithm=self.algorithm)
+            scenario.rollback()
+        return run
+
+
+    def bench_hijack_propagate(self):
+        return self.hijack_propagate(False)
+
+
+    def bench_hijack_propagate_ignore_model(self):
+        return self.hijack_propagate(True)
+
+
+    def bench_check_hijack(self):
+        return self.hijacked().check_hijack
+
+
+    def bench_text_report(self):
+        scenario = self.hijacked()
+        outfile = os.path.join(self.folder, 'report.csv')
+        return lambda: scenario.text_report(outfile, export_asp=True)
+
+
+    def bench_asp_type(self):
+        scenario = self.hijacked()
+        paths = [asp for prefix, asp, asp_type, sequence in scenario.hijacked_as_paths(scenario.hjk_ases)]
+
+        def run():
+            for asp in paths:
+                scenario.asp_type(asp)
+        return run
+
+
+    def bench_prefix_parse(self):
+        rng = random.Random(self.seed)
+        prefixes = ['{}.{}.{}.0/{}'.format(rng.randint(1, 223), rng.randint(0, 255), rng.randint(0, 255),
+                                           rng.choice([16, 20, 22, 24])) for _ in range(10000)]
+        return lambda: [Prefix(p) for p in prefixes]
+
+
+    def bench_prefix_check(self):
+        rng = random.Random(self.seed)
+        prefixes = [Prefix('{}.{}.{}.0/{}'.format(rng.randint(1, 223), rng.randint(0, 255), rng.randint(0, 255),
+                                                  rng.choice([16, 20, 22, 24]))) for _ in range(10000)]
+        pairs = list(zip(prefixes, prefixes[1:] + prefixes[:1])) + [(p, p) for p in prefixes]
+        return lambda: [p.check(q) for p, q in pairs]
+
+
+    def bench_create_clusters(self):
+        graph = self.graph()
+        return lambda: Hijackers(graph).create_clusters(CLUSTERS)
+
+
+    def run(self, name:str, repeat:int=5):
+        '''
+        Prepare and time one benchmark (the output of the simulator is discarded). Fast functions are called many
+        times in each run, so a run takes at least MIN_RUN_TIME seconds.
+        :param name: name in BENCHMARKS
+        :param repeat: number of runs
+        :return: a dict with the times of one call in seconds (min, median, mean, stdev), the number of runs and
+        the number of calls per run
+        '''
+        with redirect_stdout(io.StringIO()):
+            function = getattr(self, 'bench_' + name)()
+            start = perf_counter()
+            function()
+            first = perf_counter() - start
+            number = max(1, math.ceil(MIN_RUN_TIME / first)) if first > 0 else 1000
+            times = list()
+            for _ in range(min(repeat, SLOW.get(name, repeat))):
+                start = perf_counter()
+                for _ in range(number):
+                    function()
+                times.append((perf_counter() - start) / number)
+        return {'min': min(times), 'median': statistics.median(times), 'mean': statistics.mean(times),
+                'stdev': (statistics.stdev(times) if len(times) > 1 else 0.0), 'repeat': len(times),
+                'number': number}
+
+
+    def close(self):
+        '''
+        Remove the files created by the benchmarks
+        :return: None
+        '''
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+
+    def metadata(self):
+        '''
+        Information to check if two results can be compared
+        :return: dict
+        '''
+        graph = self.graph()
+        return {'format': FORMAT_VERSION, 'date': datetime.now().isoformat(timespec='seconds'),
+                'snapshot': os.path.basename(os.path.normpath(self.snapshot)),
+                'sha256': (file_hash(self.snapshot) if os.path.isfile(self.snapshot) else ''),
+                'ases': len(graph.ases), 'rib_backend': self.rib_backend, 'algorithm': self.algorithm,
+                'seed': self.seed, 'victim': self.victim, 'hijacker': self.hijacker,
+                'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+                'processor': platform.processor()}
+
+
+def run_benchmarks(benchmarks:Benchmarks, names:list=BENCHMARKS, repeat:int=5):
+    '''
+    Run the benchmarks and show one line per benchmark
+    :param benchmarks: Benchmarks object
+    :param names: names of the benchmarks (see BENCHMARKS)
+    :param repeat: number of runs of each benchmark
+    :return: a dict {'metadata': dict, 'results': {name: times}}
+    '''
+    results = dict()
+    for name in names:
+        results[name] = benchmarks.run(name, repeat)
+        print('{:32} min {:12.6f}s  median {:12.6f}s  ({} runs x {})'.format(
+            name, results[name]['min'], results[name]['median'], results[name]['repeat'], results[name]['number']))
+    return {'metadata': benchmarks.metadata(), 'results': results}
+
+
+def compare(current:dict, baseline:dict, threshold:float=0.2, statistic:str='min'):
+    '''
+    Compare the times with a baseline
+    :param current: results of run_benchmarks
+    :param baseline: results of run_benchmarks saved before
+    :param threshold: relative change considered a regression or an improvement (0.2 = 20%)
+    :param statistic: time compared ('min' is the least affected by other processes, 'median' or 'mean')
+    :return: a list of [name, baseline time, current time, ratio, status] (status: 'regression', 'improvement',
+    'ok' or 'new')
+    '''
+    rows = list()
+    for name, times in current['results'].items():
+        if name not in baseline['results'].keys():
+            rows.append([name, None, times[statistic], None, 'new'])
+            continue
+        old = baseline['results'][name][statistic]
+        ratio = times[statistic] / old if old > 0 else float('inf')
+        if ratio > 1 + threshold:
+            status = 'regression'
+        elif ratio < 1 / (1 + threshold):
+            status = 'improvement'
+        else:
+            status = 'ok'
+        rows.append([name, old, times[statistic], ratio, status])
+    return rows
+
+
+def comparable(current:dict, baseline:dict):
+    '''
+    Differences between the metadata that make the comparison unfair
+    :return: a list of the keys that differ
+    '''
+    keys = ['format', 'sha256', 'ases', 'rib_backend', 'algorithm', 'victim', 'hijacker', 'machine']
+    return [key for key in keys if current['metadata'].get(key) != baseline['metadata'].get(key)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Microbenchmarks of the simulator hot paths.')
+    parser.add_argument('-s', '--snapshot', default='input/20240201.as-rel2.txt.bz2',
+                        help='AS relationship file (CAIDA or synthetic) or its cache folder')
+    parser.add_argument('-b', '--backend', default='dict', choices=['dict', 'arrays'])
+    parser.add_argument('-a', '--algorithm', default='flood', choices=['flood', 'three_stage'])
+    parser.add_argument('-n', '--repeat', type=int, default=5)
+    parser.add_argument('-k', '--only', default='', help='comma-separated benchmarks to run')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--victim', type=int, default=0)
+    parser.add_argument('--hijacker', type=int, default=0)
+    parser.add_argument('--synthetic', type=int, default=0, help='number of ASes of a synthetic snapshot (see synthetic.py)')
+    parser.add_argument('-o', '--output', default='', help='JSON file to save the results')
+    parser.add_argument('-c', '--compare', default='', help='JSON file with the baseline results')
+    parser.add_argument('-t', '--threshold', type=float, default=0.2, help='relative change flagged (0.2 = 20%%)')
+    parser.add_argument('--statistic', default='min', choices=['min', 'median', 'mean'])
+    args = parser.parse_args()
+
+    names = (BENCHMARKS if args.only == '' else args.only.split(','))
+    for name in names:
+        if name not in BENCHMARKS:
+            parser.error('Unknown benchmark {}, use some of {}.'.format(name, ','.join(BENCHMARKS)))
+    benchmarks = Benchmarks(args.snapshot, args.backend, args.algorithm, args.seed, args.victim, args.hijacker,
+                            args.synthetic)
+    try:
+        current = run_benchmarks(benchmarks, names, args.repeat)
+    finally:
+        benchmarks.close()
+    if args.output != '':
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=1)
+    if args.compare != '':
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        differ = comparable(current, baseline)
+        if len(differ) > 0:
+            print('Warning: the baseline differs in {}.'.format(', '.join(differ)))
+        regressions = 0
+        for name, old, new, ratio, status in compare(current, baseline, args.threshold, args.statistic):
+            if status == 'new':
+                print('{:32} {:>13} -> {:12.6f}s  new'.format(name, '', new))
+            else:
+                print('{:32} {:12.6f}s -> {:12.6f}s  x{:.2f}  {}'.format(name, old, new, ratio, status))
+            regressions += (status == 'regression')
+        sys.exit(1 if regressions > 0 else 0)
@@ -1,28 +1,66 @@
-import bz2
 import os.path
+import hashlib
+from collections import deque
+import heapq
+from contextlib import nullcontext
 from copy import copy
 import random
 import pickle as pk
+from time import perf_counter
 import ssl
 import urllib.request
-from time import time
+import numpy as np
 from netcalc_ipv4 import Prefix
+from aspath import ASPath
+from topology import Topology, CUSTOMER, PEER, SIBLING, PROVIDER, sorted_unique
+from rib import PrefixRIB, NO_ROUTE
+from shared import SharedArrays
+from asrel import load_as_rel
+from results import REPORT_COLUMNS
+from baselines import BaselineCache
+import propagation
+
+# Marks an entry that did not exist before the change in the undo log
+UNSET = object()
+
+# Sets of neighbours of an AS object and their relationship type in the Topology
+NEIGHBOR_SETS = {'customers': CUSTOMER, 'peers': PEER, 'siblings': SIBLING, 'providers': PROVIDER}
+
+
+class Connections(object):
+    def __init__(self, topology:Topology=None):
+        '''
+        Source of the connections of the AS objects created without their sets of neighbours (rib_backend='arrays'),
+        the sets are built from the Topology when they are used (see AS.__getattr__). It is shared by the AS objects
+        of a graph and of its scenarios. The Topology is not pickled with it, the Graph binds it again (see
+        Graph.__getstate__ and Graph.attach_arrays).
+        :param topology: Topology object with the connections of the ASes
+        '''
+        self.topology = topology
+
+
+    def __getstate__(self):
+        # the arrays are sent to other processes with the Graph or in shared memory
+        return {'topology': None}
 
-hijacks_log = open('hijacks_{}.log'.format(time()),'w')
 
 class AS(object):
-    def __init__(self, asn:int, description:str=''):
+    def __init__(self, asn:int, description:str='', connections:Connections=None):
         '''
         Create an object to represent an Autonomous System (AS)
         :param asn: Autonomous System Number(int),
         :param description: AS description (str)
+        :param connections: Connections to build the sets of neighbours when they are used (None = empty sets)
         '''
         self.description = description
         self.asn = asn
-        self.providers = set()
-        self.peers = set()
-        self.customers = set()
-        self.siblings = set()
+        if connections is None:
+            self.providers = set()
+            self.peers = set()
+            self.customers = set()
+            self.siblings = set()
+        else:
+            self.connections = connections
         self.routes = dict()
         self.prefixes = set()
         self.hijacks = set()
@@ -33,6 +71,37 @@ class AS(object):
         self.continent = ''
 
 
+    def __getattr__(self, name:str):
+        '''
+        Build a set of neighbours (providers, peers, customers or siblings) of an AS created with Connections the
+        first time it is used, the neighbours are in the order of the ASNs
+        :param name: name of the attribute
+        :return: set of ASNs
+        '''
+        connections = self.__dict__.get('connections')
+        if name not in NEIGHBOR_SETS or connections is None or connections.topology is None:
+            raise AttributeError(name)
+        topo = connections.topology
+        i = topo.get_index(self.asn)
+        neighbors = (set(topo.asns[topo.neighbors_by_rel(i, NEIGHBOR_SETS[name])].tolist()) if i >= 0 else set())
+        setattr(self, name, neighbors)
+        return neighbors
+
+
+    def fork(self):
+        '''
+        Copy the AS to a new scenario. The connections are shared with this AS (the sets of neighbours not built yet
+        are built by each copy), routes, prefixes, hijacks, forged AS path and ROV are copied.
+        :return: AS object
+        '''
+        new = copy(self)
+        new.routes = copy(self.routes)
+        new.prefixes = copy(self.prefixes)
+        new.hijacks = copy(self.hijacks)
+        new.fake_asp = copy(self.fake_asp)
+        return new
+
+
     def set_vps(self, nb_pref:int):
         '''
         Set the number of prefixes that this AS export to collector if it's a Vantage Point
@@ -92,72 +161,110 @@ class AS(object):
         self.providers.add(provider)
 
 
-    def add_route(self, prefixes:list, asp:list, hijack:bool=False, debug:bool=True):
+    def is_neighbor(self, asn:int):
         '''
-        Add a route to the prefixes if they have best route
+        Check if the AS is connected to this AS
+        :param asn: ASN
+        :return: True or False
+        '''
+        return asn in self.peers or asn in self.customers or asn in self.providers or asn in self.siblings
+
+
+    def preference(self, prefix, asp:ASPath):
+        '''
+        Compare a received route with the current route to the prefix (local pref based in Gao-Rexford model and
+        then the shortest AS path)
+        :param prefix: Prefix object
+        :param asp: AS path received with the prefix
+        :return: why the route is accepted ('New prefix', 'Customer', 'Peer' or 'Shortest AS path') or '' if the
+        current route is kept
+        '''
+        if not prefix in self.routes.keys():
+            return 'New prefix'
+        origen = asp[0]
+        last_origen = self.routes[prefix]['AS_path'][0]
+        # Apply local pref based in Gao-Rexford model
+        if (origen in self.customers and last_origen not in self.customers):
+            return 'Customer'
+        elif ((origen in self.peers or origen in self.siblings) and last_origen in self.providers):
+            return 'Peer'
+        elif (origen in self.peers and last_origen in self.siblings):
+            return 'Peer'
+        # Using the shortest AS path
+        elif ((origen in self.customers and last_origen in self.customers) or
+              (origen in self.peers and last_origen in self.peers) or
+              (origen in self.providers and last_origen in self.providers) or
+              (origen in self.siblings and last_origen in self.siblings)):
+            if len(self.routes[prefix]['AS_path']) > len(asp):
+                return 'Shortest AS path'
+        return ''
+
+
+    def would_accept(self, prefixes:list, asp:ASPath):
+        '''
+        Check, without changing the routes, if add_route would accept the route to any of the prefixes
         :param prefixes: a list with Prefixes objects
         :param asp: AS path received with the prefixes
+        :return: True or False
+        '''
+        if len(prefixes) == 0 or self.asn in asp:
+            return False
+        if not self.is_neighbor(asp[0]):
+            # add_route reports the error
+            return True
+        for prefix in prefixes:
+            if self.preference(prefix, asp) != '':
+                return True
+        return False
+
+
+    def add_route(self, prefixes:list, asp:ASPath, hijack:bool=False, debug:bool=True, events=None, metrics=None):
+        '''
+        Add a route to the prefixes if they have best route
+        :param prefixes: a list with Prefixes objects
+        :param asp: AS path received with the prefixes (ASPath, it is stored without copy)
         :param hijack: This is a prefix hijacked (True or False)
+        :param events: results.HijackLog to record the hijacked routes accepted (None = not recorded)
+        :param metrics: metrics.PropagationMetrics to count the decisions (None = not counted)
         :return: announce (A list with ASes to announce the route), new_asp (AS path to announce the route) and
         new_prefixes (Prefixes that had the best route to announce to the other ASes)
         '''
         announce = set()
-        new_asp = copy(asp)
-        new_asp.insert(0,self.asn)
+        new_asp = asp.prepend(self.asn)
         new_prefixes = list()
         origen = asp[0]
         accept = False
         accept_by = ''
-        if not (origen in self.peers or origen in self.customers or origen in self.providers or origen in self.siblings):
+        if not self.is_neighbor(origen):
             print('ERROR: This AS ({}) is not a neighbored.'.format(origen))
         elif self.asn in asp:
+            if metrics is not None:
+                metrics.count('loop_rejections')
             if debug:
                 print('Route ignored by BGP (loop). AS{} -> AS_path:{}'.format(self.asn, asp))
         else:
             for prefix in prefixes:
-                accept = False
-                if not prefix in self.routes.keys():
-                    accept = True
-                    accept_by = 'New prefix'
-                else:
-                    last_origen = self.routes[prefix]['AS_path'][0]
-                    # Apply local pref based in Gao-Rexford model
-                    if (origen in self.customers and last_origen not in self.customers):
-                        accept = True
-                        accept_by = 'Customer'
-                    elif ((origen in self.peers or origen in self.siblings) and last_origen in self.providers):
-                        accept = True
-                        accept_by = 'Peer'
-                    elif (origen in self.peers and last_origen in self.siblings):
-                        accept = True
-                        accept_by = 'Peer'
-                    # Using the shortest AS path
-                    elif ((origen in self.customers and last_origen in self.customers) or
-                          (origen in self.peers and last_origen in self.peers) or
-                          (origen in self.providers and last_origen in self.providers) or
-                          (origen in self.siblings and last_origen in self.siblings)):
-                        if len(self.routes[prefix]['AS_path']) > len(asp):
-                            if self.routes[prefix]['AS_path'].count(self.routes[prefix]['AS_path'][-1]) > 1:
-                                prep = 'Prepend x{}'.format(
-                                    self.routes[prefix]['AS_path'].count(self.routes[prefix]['AS_path'][-1]) - 1)
-                            else:
-                                prep = ''
-                            if debug:
-                                print('[AS path length] Route to [{}] changed {} -> {}. {}'.format(prefix, self.routes[prefix]['AS_path'], asp, prep))
-                            accept = True
-                            accept_by = 'Shortest AS path'
+                accept_by = self.preference(prefix, asp)
+                accept = accept_by != ''
+                if metrics is not None:
+                    if not accept:
+                        metrics.count('routes_kept')
+                    else:
+                        metrics.accept_by[accept_by] += 1
+                        if accept_by != 'New prefix':
+                            metrics.replaced[self.asn] += 1
+                if accept_by == 'Shortest AS path' and debug:
+                    old_asp = self.routes[prefix]['AS_path']
+                    if old_asp.count(old_asp[-1]) > 1:
+                        prep = 'Prepend x{}'.format(old_asp.count(old_asp[-1]) - 1)
                     else:
-                        accept = False
+                        prep = ''
+                    print('[AS path length] Route to [{}] changed {} -> {}. {}'.format(prefix, old_asp, asp, prep))
                 if accept:
-                    if hijack:
-                        if prefix in self.routes.keys():
-                            old_asp = self.routes[prefix]['AS_path']
-                            prep = 'Prepend x{}'.format(old_asp.count(old_asp[-1]) - 1)
-                        else:
-                            old_asp=[]
-                            prep=''
-                        print('AS {} hijacked: prefix[{}] from [{}], old AS path {}, new AS path {}. {}'.
-                              format(self.asn, prefix, accept_by, old_asp, asp, prep), file=hijacks_log)
+                    if hijack and events is not None:
+                        old_route = self.routes.get(prefix)
+                        events.record(self.asn, prefix, accept_by, None if old_route is None else old_route['AS_path'],
+                                      asp)
                     self.routes[prefix] = {'AS_path': asp, 'hijack': hijack}
                     new_prefixes.append(prefix)
             if accept:
@@ -175,12 +282,12 @@ class AS(object):
         '''
         Return AS path to prefix and information if the route was hijacked
         :param: prefix
-        :return: AS path, hijack(True/False)
+        :return: AS path (list), hijack(True/False)
         '''
         if type(prefix) is str:
             prefix = Prefix(prefix)
         if prefix in self.routes.keys():
-            return (self.routes[prefix]['AS_path'], self.routes[prefix]['hijack'])
+            return (self.routes[prefix]['AS_path'].to_list(), self.routes[prefix]['hijack'])
         else:
             return [], False
 
@@ -305,25 +412,89 @@ class AS(object):
     def has_hijack(self):
         '''
         Check if the AS has a route to prefix hijacked
-        :return: a list with hijacked prefixes and AS path
+        :return: a list with hijacked prefixes and AS path (ASPath, use to_list() to get the full path)
         '''
         hijack = list()
         for prefix in self.routes.keys():
             if self.routes[prefix]['hijack']:
-                asp = copy(self.routes[prefix]['AS_path'])
-                hijack.append([prefix, asp])
+                hijack.append([prefix, self.routes[prefix]['AS_path']])
         return hijack
 
 
+class ScenarioASes(dict):
+    def __init__(self, base=None):
+        '''
+        Mapping ASN -> AS object used by the graph. When created from other mapping (base), it is a copy-on-write
+        layer: it starts with the AS objects of the base (only the references are copied, so the ASes are read at
+        the speed of a dict) and an AS is copied to this layer when it changes.
+        A layer has the same ASes of its base (new ASes are not added to a layer).
+        :param base: mapping with the AS objects of the baseline scenario (None to create an empty mapping)
+        '''
+        super().__init__(base if base is not None else ())
+        self.base = base
+        # ASes copied to this layer
+        self.own = set()
+
+
+    def is_own(self, asn:int):
+        '''
+        Check if the AS object belongs to this layer (it can be changed without affecting the base)
+        :param asn: ASN
+        :return: True or False
+        '''
+        return self.base is None or asn in self.own
+
+
+    def writable(self, asn:int):
+        '''
+        Get the AS object to change it, copying it from the base if necessary
+        :param asn: ASN
+        :return: AS object
+        '''
+        if self.is_own(asn):
+            return self[asn]
+        as_obj = self[asn].fork()
+        self[asn] = as_obj
+        self.own.add(asn)
+        return as_obj
+
+
+    def writable_routes(self, asn:int):
+        '''
+        Get the AS object to change only its routes, copying it from the base if necessary. Only the routes are copied,
+        the other attributes stay shared with the base (used by the layers of the baselines, see Graph.load_baseline,
+        the scenarios on top of them copy the whole AS with writable)
+        :param asn: ASN
+        :return: AS object
+        '''
+        if self.is_own(asn):
+            return self[asn]
+        as_obj = copy(self[asn])
+        as_obj.routes = copy(as_obj.routes)
+        self[asn] = as_obj
+        self.own.add(asn)
+        return as_obj
+
+
+    def own_ases(self):
+        '''
+        Number of AS objects copied to this layer
+        :return: int
+        '''
+        return (len(self) if self.base is None else len(self.own))
+
+
 class Graph:
-    def __init__(self,root_folder:str='./data', override:bool=False, debug:bool=True):
+    def __init__(self,root_folder:str='./data', override:bool=False, debug:bool=True, rib_backend:str='dict'):
         '''
         Create an object to represent AS connections.
         :param root_folder: Folder to save partial information (default = ./data)
         :param override: Set True to ignore and replace previous information if they exist
         :param debug: True to show many information about the simulations, if False show a few information
+        :param rib_backend: 'dict' (routes in the AS objects) or 'arrays' (one PrefixRIB with NumPy arrays over the
+        AS indexes per prefix, always propagated with the three-stage algorithm)
         '''
-        self.ases = dict()
+        self.ases = ScenarioASes()
         self.roa = dict()
         self.hjk_announce = list()
         self.leg_announce = list()
@@ -341,63 +512,285 @@ class Graph:
         self.override = override
         self.debug = debug
         self.prepend_origin = dict()
+        self.topology = None
+        # topology used by the AS objects to build their sets of neighbours (rib_backend='arrays', see add_edges)
+        self.connections = Connections()
+        self.undo_log = None
+        self.undo_state = None
+        self.rib_backend = rib_backend
+        self.ribs = dict()
+        self.rov_mask = None
+        # named ROV deployments {name: boolean mask over the AS indexes}, shared by the scenarios (see add_rov_deployment)
+        self.rov_deployments = dict()
+        # ROV deployment used by this scenario (None = the ASes with ROV enabled by enable_rov)
+        self.rov_deployment = None
+        # ROA validity of the announcements of each prefix by each origin {prefix: array over the AS indexes}
+        self.roa_table = dict()
+        self.vps_array = None
+        # converged legitimate routes of the victims (see baseline_key and set_baseline_cache)
+        self.baselines = BaselineCache()
+        self.ignore_model_rounds = 0
+        # arrays in shared memory used by the processes of a Pool (see share_arrays)
+        self.shared = None
+        # results.HijackLog with the hijacked routes accepted by the ASes (None = disabled, see set_hijack_log)
+        self.hijack_log = None
+        # metrics.PropagationMetrics with counters and timers of the propagation (None = disabled, see set_metrics)
+        self.metrics = None
+        # resolve the routes of the stubs after the propagation (see Topology.stub_groups and set_collapse_stubs)
+        self.collapse_stubs = True
 
 
     def add_connections(self, input_file:str):
         '''
         Add connections in the graph using AS relationship from CAIDA
         File source = https://publicdata.caida.org/datasets/as-relationships/serial-2/
-        :param input_file: path to the file
+        The file is parsed once and saved in a binary cache, later loads memory-map the cache (see asrel.py)
+        :param input_file: path to the file or to its cache folder
+        :return: None
+        '''
+        self.add_edges(load_as_rel(input_file))
+
+
+    def add_edges(self, edges:dict):
+        '''
+        Add connections in the graph from AS relationship arrays (see asrel.load_as_rel and synthetic.py)
+        :param edges: a dict {'as1', 'as2', 'conn', 'tier1', 'ixp': numpy array}, conn is -1 when as1 is provider of
+        as2 and 0 when they are peers
         :return: None
         '''
         # Tier-2 source = https://en.wikipedia.org/wiki/Tier_2_network (accessed in 2024-11-11)
         tier2 = [6939, 7713, 9002, 1764, 34549, 4766, 9304, 22652, 9318, 3292, 2497, 1273, 2516, 23947, 4134, 4809,
                  4837, 3462, 5400, 7922, 1257, 12390, 2711, 8002, 14744, 38930, 33891, 41327, 7473, 24482, 9121,
                  6663, 7195]
-        tier1 = list()
-        ixp = list()
         self.tier2 = tier2
-        if input_file.endswith('.bz2'):
-            lines = bz2.open(input_file,'rt')
+        as1 = np.asarray(edges['as1'])
+        as2 = np.asarray(edges['as2'])
+        conn = np.asarray(edges['conn'])
+        if len(edges['tier1']) > 0:
+            self.tier1 = edges['tier1'].tolist()
+        if len(edges['ixp']) > 0:
+            self.ixp = edges['ixp'].tolist()
+        empty = len(self.ases) == 0
+        # the arrays backend uses the Topology, the AS objects build their sets of neighbours only if they are used
+        lazy = empty and self.rib_backend == 'arrays'
+        connections = (self.connections if lazy else None)
+
+        # ASes are added in the order they appear in the file
+        lines = np.arange(len(as1))
+        both = np.empty(2 * len(as1), dtype=np.int64)
+        both[0::2] = as1
+        both[1::2] = as2
+        order = np.argsort(both, kind='stable')
+        first = np.empty(len(both), dtype=bool)
+        first[:1] = True
+        np.not_equal(both[order[1:]], both[order[:-1]], out=first[1:])
+        for asn in both[np.sort(order[first])].tolist():
+            if empty or not asn in self.ases.keys():
+                self.ases[asn] = AS(asn, connections=connections)
+
+        if not lazy:
+            # neighbours are added to the sets in the order of the lines of the file
+            p2c = conn == -1
+            p2p = conn == 0
+            self._add_neighbors('customers', as1[p2c], as2[p2c], lines[p2c])
+            self._add_neighbors('providers', as2[p2c], as1[p2c], lines[p2c])
+            self._add_neighbors('peers', np.concatenate([as1[p2p], as2[p2p]]), np.concatenate([as2[p2p], as1[p2p]]),
+                                np.concatenate([lines[p2p], lines[p2p]]))
+        if empty:
+            self.topology = Topology.from_edges(as1, as2, conn, self.tier1, self.ixp)
+            if lazy:
+                self.connections.topology = self.topology
         else:
-            lines = open(input_file,'r')
-
-        for line in lines:
-            if line.startswith('#'):
-                if line.startswith("# input"):
-                    tmp = line.split(':')
-                    tmp = tmp[-1]
-                    tmp = tmp.strip()
-                    for t in tmp.split(' '):
-                        tier1.append(int(t))
-                    self.tier1 = tier1
-                elif line.startswith('# IXP'):
-                    tmp = line.split(':')
-                    tmp = tmp[-1]
-                    tmp = tmp.strip()
-                    for t in tmp.split(' '):
-                        ixp.append(int(t))
-                    self.ixp = ixp
-                continue
-            tmp = line.strip('\n').split('|')
-            if len(tmp)<3:
-                continue
-            as1 = int(tmp[0])
-            as2 = int(tmp[1])
-            conn = int(tmp[2])
-            if not as1 in self.ases.keys():
-                self.ases[as1] = AS(as1)
-            if not as2 in self.ases.keys():
-                self.ases[as2] = AS(as2)
-            if conn == 0:
-                self.ases[as1].add_peer(as2)
-                self.ases[as2].add_peer(as1)
-            elif conn == (-1):
-                self.ases[as1].add_customer(as2)
-                self.ases[as2].add_provider(as1)
+            self.topology = None
         print(len(self.ases.keys()), 'ASes and their connections were loaded.')
 
 
+    def _add_neighbors(self, attr:str, src, dst, lines):
+        '''
+        Add connections of one type to the AS objects
+        :param attr: set of the AS object ('customers', 'providers' or 'peers')
+        :param src: array with the ASNs that receive the connections
+        :param dst: array with the neighbour ASNs
+        :param lines: array with the line of each connection in the file
+        :return: None
+        '''
+        if len(src) == 0:
+            return
+        order = np.lexsort((lines, src))
+        src = src[order]
+        dst = dst[order].tolist()
+        starts = np.flatnonzero(np.diff(src)) + 1
+        bounds = [0] + starts.tolist() + [len(dst)]
+        for k, asn in enumerate(src[bounds[:-1]].tolist()):
+            getattr(self.ases[asn], attr).update(dst[bounds[k]:bounds[k + 1]])
+
+
+    def fork(self):
+        '''
+        Create a new scenario based on this graph without copying the AS objects (only the mapping of ASNs to them,
+        see ScenarioASes). The connections, countries and VPs are shared, the routes, prefixes, hijacks and ROV of an
+        AS are copied only when the AS changes in the new scenario. This graph must not be changed while the scenarios
+        created from it are used (nor the layers of the baselines of load_baseline, dropped by enable_rov).
+        :return: Graph object
+        '''
+        forked = copy(self)
+        forked.ases = ScenarioASes(self.ases)
+        forked.roa = {p: copy(ases) for p, ases in self.roa.items()}
+        forked.hjk_announce = copy(self.hjk_announce)
+        forked.leg_announce = copy(self.leg_announce)
+        forked.rov = copy(self.rov)
+        forked.vps_hjk = copy(self.vps_hjk)
+        forked.hjk_ases = copy(self.hjk_ases)
+        forked.prepend_origin = copy(self.prepend_origin)
+        forked.undo_log = None
+        forked.undo_state = None
+        forked.ribs = {p: rib.copy() for p, rib in self.ribs.items()}
+        forked.roa_table = dict(self.roa_table)
+        forked.baselines = self.baselines
+        return forked
+
+
+    def checkpoint(self):
+        '''
+        Start an undo log on the current scenario (usually after the legitimate announcement converged).
+        While the log is active, hijacks and routes changed by route_propagate are recorded, so rollback() can
+        restore this scenario in time proportional to the number of changes.
+        :return: None
+        '''
+        self.undo_log = list()
+        self.undo_state = (copy(self.hjk_announce), self.checked_hjk, self.vps_hjk, self.hjk_ases, set(self.ribs.keys()))
+        for rib in self.ribs.values():
+            rib.checkpoint()
+
+
+    def rollback(self):
+        '''
+        Restore the scenario saved by checkpoint(), the checkpoint remains active to run the next hijack
+        :return: number of changes undone
+        '''
+        if self.undo_log is None:
+            print('There is no checkpoint to rollback, use checkpoint() first.')
+            return 0
+        changes = len(self.undo_log)
+        for container, key, old in reversed(self.undo_log):
+            if old is UNSET:
+                container.pop(key, None)
+            else:
+                container[key] = old
+        self.undo_log.clear()
+        hjk_announce, self.checked_hjk, self.vps_hjk, self.hjk_ases, ribs = self.undo_state
+        self.hjk_announce = copy(hjk_announce)
+        for prefix in list(self.ribs.keys()):
+            if prefix in ribs:
+                changes += self.ribs[prefix].rollback()
+            else:
+                del self.ribs[prefix]
+        return changes
+
+
+    def clear_checkpoint(self):
+        '''
+        Stop recording changes, the current scenario becomes the new baseline
+        :return: None
+        '''
+        self.undo_log = None
+        self.undo_state = None
+        for rib in self.ribs.values():
+            rib.undo_log = None
+
+
+    def update_route(self, asn:int, prefixes:list, asp:ASPath, hijack:bool=False):
+        '''
+        Offer a route to an AS (AS.add_route), the AS is copied to this scenario only if it changes its routes and
+        the replaced routes are recorded when there is a checkpoint
+        :param asn: ASN receiving the route
+        :param prefixes: a list with Prefixes objects
+        :param asp: AS path received with the prefixes
+        :param hijack: This is a prefix hijacked (True or False)
+        :return: the same values of AS.add_route
+        '''
+        if ((self.undo_log is not None or not self.ases.is_own(asn)) and
+                not self.ases[asn].would_accept(prefixes, asp)):
+            if self.metrics is not None and len(prefixes) > 0:
+                if asn in asp:
+                    self.metrics.count('loop_rejections')
+                else:
+                    self.metrics.count('routes_kept', len(prefixes))
+            return set(), asp, list()
+        as_obj = self.ases.writable(asn)
+        if self.undo_log is not None:
+            for prefix in prefixes:
+                self.undo_log.append((as_obj.routes, prefix, as_obj.routes.get(prefix, UNSET)))
+        return as_obj.add_route(prefixes, asp, hijack, debug=self.debug, events=self.hijack_log, metrics=self.metrics)
+
+
+    def set_hijack_log(self, hijack_log):
+        '''
+        Record the hijacked routes accepted by the ASes (flood and three-stage propagation of the 'dict' RIB backend).
+        The events of each hijack are written when its propagation ends. The scenarios created by fork() use the
+        same log.
+        :param hijack_log: results.HijackLog object or None to disable the log
+        :return: None
+        '''
+        self.hijack_log = hijack_log
+
+
+    def set_collapse_stubs(self, enable:bool=True):
+        '''
+        Leave the stubs (ASes without customers and siblings, see Topology.stub_groups) out of the propagation and
+        give them their routes afterwards: in one pass per group of stubs with the same providers and peers with the
+        'arrays' backend, and with one offer per stub in the flood of the 'dict' backend. The routes are the same of
+        the full propagation. The flood keeps every offer to the stubs when a HijackLog is set.
+        :param enable: True or False
+        :return: None
+        '''
+        self.collapse_stubs = enable
+
+
+    def set_metrics(self, metrics):
+        '''
+        Count the decisions of the propagation and time its phases (see metrics.PropagationMetrics). The values are
+        summed until metrics.emit() is called (once per scenario by the caller). The scenarios created by fork() use
+        the same object.
+        :param metrics: metrics.PropagationMetrics object or None to disable the counters
+        :return: None
+        '''
+        self.metrics = metrics
+
+
+    def timer(self, phase:str):
+        '''
+        Time a block of code in the metrics of the scenario: with graph.timer('report'): ...
+        :param phase: name of the timer
+        :return: context manager (does nothing when the metrics are disabled)
+        '''
+        if self.metrics is None:
+            return nullcontext()
+        return self.metrics.timer(phase)
+
+
+    def emit_metrics(self, **scenario):
+        '''
+        Save the metrics of the scenario (one JSON line) and start new counters
+        :param scenario: fields that identify the scenario (victim, hijacker, ...)
+        :return: None
+        '''
+        if self.metrics is not None:
+            self.metrics.emit(**scenario)
+
+
+    def get_topology(self):
+        '''
+        Get the array-backed topology (dense ASN -> index mapping and CSR adjacency by relationship type).
+        It is created on first use and shared by copies of this graph, since the connections do not change
+        during the simulations.
+        :return: Topology object
+        '''
+        if self.topology is None or len(self.topology) != len(self.ases):
+            self.topology = Topology.from_graph(self)
+        return self.topology
+
+
     def add_siblings(self, asn:int, sibling:int):
         '''
         Not implement yet
@@ -407,6 +800,7 @@ class Graph:
         '''
         if asn in self.ases.keys():
             self.ases[asn].add_sibling(sibling)
+            self.topology = None
         else:
             print('AS not found!')
 
@@ -518,10 +912,53 @@ class Graph:
         :param asn:  ASN to print information
         :return: None
         '''
-        if asn in self.ases.keys():
-            self.ases[asn].print_rib()
-        else:
+        if asn not in self.ases.keys():
             print('AS{} not found!'.format(asn))
+        elif self.rib_backend == 'arrays':
+            line = '{}\t{} --> {}'
+            for prefix in sorted(self.ribs.keys()):
+                asp, hijack = self.get_route(asn, prefix)
+                if len(asp) > 0:
+                    print(line.format(('hjk' if hijack else 'leg'), prefix, asp))
+        else:
+            self.ases[asn].print_rib()
+
+
+    def get_route(self, asn:int, prefix):
+        '''
+        Return AS path to prefix and information if the route was hijacked
+        :param asn: ASN
+        :param prefix: Prefix object or IPv4 prefix X.X.X.X/X (str)
+        :return: AS path (list), hijack(True/False)
+        '''
+        if type(prefix) is str:
+            prefix = Prefix(prefix)
+        if self.rib_backend != 'arrays':
+            return self.ases[asn].get_route(prefix)
+        if prefix not in self.ribs.keys():
+            return [], False
+        topo = self.get_topology()
+        i = topo.get_index(asn)
+        rib = self.ribs[prefix]
+        asp = rib.get_path(topo, i)
+        return asp, (bool(rib.hijack[i]) if len(asp) > 0 else False)
+
+
+    def get_hijacked_routes(self, asn:int):
+        '''
+        Hijacked routes of an AS
+        :param asn: ASN
+        :return: a list with hijacked prefixes and AS path (list)
+        '''
+        if self.rib_backend != 'arrays':
+            return [[prefix, asp.to_list()] for prefix, asp in self.ases[asn].has_hijack()]
+        topo = self.get_topology()
+        i = topo.get_index(asn)
+        result = list()
+        for prefix, rib in self.ribs.items():
+            if rib.hijacked()[i]:
+                result.append([prefix, rib.get_path(topo, i)])
+        return result
 
 
     def add_prefix(self, asn:int, prefix:str, roa:bool=False):
@@ -533,12 +970,13 @@ class Graph:
         :return: True if the prefix was added, False if the AS is not in the graph
         '''
         if asn in self.ases.keys():
-            self.ases[asn].add_prefix(prefix)
+            self.ases.writable(asn).add_prefix(prefix)
             if roa:
                 p = Prefix(prefix)
                 if p not in self.roa.keys():
                     self.roa[p] = set()
                 self.roa[p].add(asn)
+                self.roa_table.pop(p, None)
             return True
         else:
             print('ERROR: AS{} not found in the graph!!'.format(asn))
@@ -554,30 +992,37 @@ class Graph:
         :return: None
         '''
         if hijacker in self.ases.keys():
-            self.ases[hijacker].hijack(prefix, fake_asp)
+            as_obj = self.ases.writable(hijacker)
+            if self.undo_log is not None:
+                self.undo_log.append((as_obj.__dict__, 'hijacks', copy(as_obj.hijacks)))
+                self.undo_log.append((as_obj.__dict__, 'fake_asp', as_obj.fake_asp))
+            as_obj.hijack(prefix, fake_asp)
         else:
             print('ERROR: AS{} not found in the graph!!'.format(hijacker))
 
 
-    def route_propagate(self, asn:int, hijack:bool=False, ignore_model_sometimes:bool=False, prepend_origin:dict=dict()):
+    def route_propagate(self, asn:int, hijack:bool=False, ignore_model_sometimes:bool=False, prepend_origin:dict=dict(),
+                        algorithm:str='flood'):
         '''
         Announce the prefixes from the AS, legitimate or hijacked
         :param asn: ASN to announce the prefixes
         :param hijack: Is a hijacked Prefix? (True or False)
         :param ignore_model_sometimes: Ignore Gao-Rexford model when there are no connections to all ASes
         :param prepend_origin: How many more times the origin AS will prepend the first ASN
+        :param algorithm: 'flood' (FIFO, every accepted route is announced again) or 'three_stage' (customer routes
+        up, peer routes across one hop and provider routes down, each AS settles once). The 'arrays' RIB backend
+        always uses the three-stage algorithm.
         :return: None
         '''
         ases_new_route = set()
         without_route = set(self.ases.keys())
         if hijack:
             prefixes = self.ases[asn].get_hijacks()
-            asp = self.ases[asn].get_fake_asp()
+            asp = ASPath.from_list([asn] + self.ases[asn].get_fake_asp())
             self.hjk_announce = [asn, asp, prefixes]
-            asp.insert(0,asn)
         else:
             prefixes = self.ases[asn].get_prefixes()
-            asp = [asn]
+            asp = ASPath(asn)
             self.leg_announce = [asn, asp, prefixes]
             self.prepend_origin[asn] = prepend_origin
         if len(self.leg_announce)>0:
@@ -585,48 +1030,713 @@ class Graph:
         else:
             asn_leg = 0
         list_ases = self.ases[asn].customers | self.ases[asn].providers | self.ases[asn].peers
-        nexts_ases = list()
+        nexts_ases = deque()
+        metrics = self.metrics
         if len(prefixes)==0:
             print('[{}]No {} route to propagate from AS{}.'.format(asn_leg, ('hijack' if hijack else 'legitimate'), asn))
         else:
-            for n in list_ases:
-                nexts_ases.append([n, copy(asp), prefixes])
-            while len(nexts_ases)>0:
-                n_asn, asp, prefixes = nexts_ases.pop(0)
-                prefix_add = list()
-                ases_new_route.add(n_asn)
-                if self.ases[n_asn].is_rov_enabled():
-                    for p in prefixes:
-                        if p in self.roa.keys():
-                            if asp[-1] in self.roa[p]:
-                                prefix_add.append(p)
-                            else:
-                                if self.debug:
-                                    print('[{}]ROV: AS{} reject prefix {} originated by AS{}.'.format(asn_leg,n_asn, p, asp[-1]))
-                else:
-                    prefix_add = prefixes
-                if len(asp)==1:
-                    if n_asn in prepend_origin.keys():
-                        prepend = prepend_origin[n_asn]
-                        p_asn=asp[-1]
-                        for p in range(prepend):
-                            asp.insert(0, p_asn)
-                        if self.debug:
-                            print('[{}]Prefix announce with prepend x{} to AS{}'.format(asn_leg,len(asp)-1,n_asn))
-                tmp_ases, tmp_asp, tmp_prefixes = self.ases[n_asn].add_route(prefix_add, asp, hijack,debug=self.debug)
-                for ta in tmp_ases:
-                    nexts_ases.append([ta, tmp_asp, tmp_prefixes])
+            start = perf_counter()
+            if self.rib_backend == 'arrays':
+                ases_new_route = self.array_propagate(asn, asp, prefixes, hijack, prepend_origin)
+            elif algorithm == 'three_stage':
+                for prefix in prefixes:
+                    ases_new_route |= self.three_stage_propagate(asn, asp, [prefix], hijack, prepend_origin, asn_leg)
+            else:
+                rov = self.get_rov_mask()
+                # offers to the stubs are kept in arrival order instead of queued (they do not announce routes)
+                deferred = (dict() if self.collapse_stubs and self.hijack_log is None else None)
+                if deferred is not None:
+                    stubs = self.get_topology().stub_offers()['asns']
+                    announced = prefixes
+                for n in list_ases:
+                    if deferred is not None and n in stubs:
+                        deferred.setdefault(n, list()).append((asp, prefixes))
+                    else:
+                        nexts_ases.append([n, asp, prefixes])
+                pushes = len(nexts_ases)
+                pops = 0
+                peak = pushes
+                while len(nexts_ases)>0:
+                    n_asn, asp, prefixes = nexts_ases.popleft()
+                    pops += 1
+                    ases_new_route.add(n_asn)
+                    prefix_add = self.rov_filter(n_asn, asp, prefixes, asn_leg, rov)
+                    if len(asp)==1:
+                        asp = self.origin_asp(n_asn, asp, prepend_origin, asn_leg)
+                    tmp_ases, tmp_asp, tmp_prefixes = self.update_route(n_asn, prefix_add, asp, hijack)
+                    for ta in tmp_ases:
+                        if deferred is not None and ta in stubs:
+                            deferred.setdefault(ta, list()).append((tmp_asp, tmp_prefixes))
+                        else:
+                            nexts_ases.append([ta, tmp_asp, tmp_prefixes])
+                    if len(tmp_ases) > 0:
+                        pushes += len(tmp_ases)
+                        peak = max(peak, len(nexts_ases))
+                if deferred is not None:
+                    ases_new_route.update(deferred.keys())
+                    self.resolve_stubs(deferred, announced, hijack, prepend_origin, asn_leg, rov)
+                if metrics is not None:
+                    metrics.count('queue_pushes', pushes)
+                    metrics.count('queue_pops', pops)
+                    metrics.peak_queue = max(metrics.peak_queue, peak)
+            if metrics is not None:
+                metrics.add_time('propagation', perf_counter() - start)
             without_route = without_route - ases_new_route
             if self.debug:
                 print("[{}]{} routes propagated from the AS{} to {} ASes".format(asn_leg,('Hijacked' if hijack else 'Legitimate'), asn, len(ases_new_route)))
                 print('[{}]{} AS(es) did not receive the route from the AS{}'.format(asn_leg,len(without_route), asn))
             if ignore_model_sometimes:
+                start = perf_counter()
                 more_routes = self.ignore_model_sometimes(prefixes)
+                if metrics is not None:
+                    metrics.add_time('ignore_model', perf_counter() - start)
                 if self.debug:
-                    print('[{}]More {} ASes added the route breaking Gao-Rexford model'.format(asn_leg, len(more_routes)))
+                    print('[{}]More {} ASes added the route breaking Gao-Rexford model in {} round(s)'.format(
+                        asn_leg, len(more_routes), self.ignore_model_rounds))
+        if hijack and self.hijack_log is not None:
+            self.hijack_log.flush()
         return without_route
 
 
+    def resolve_stubs(self, deferred:dict, prefixes, hijack:bool, prepend_origin:dict, asn_leg:int=0, rov=UNSET):
+        '''
+        Give the stubs the routes offered to them during the flood (see set_collapse_stubs). A stub only has
+        providers and peers, so the flood would keep the first of the best offers (peer before provider and then the
+        shortest AS path) and only this offer is sent to the stub.
+        :param deferred: a dict {stub ASN: [(AS path, prefixes), ...]} with the offers in arrival order
+        :param prefixes: prefixes of the announcement
+        :param hijack: Is a hijacked Prefix? (True or False)
+        :param prepend_origin: How many more times the origin AS will prepend the first ASN
+        :param asn_leg: legitimate ASN (only to print debug information)
+        :param rov: ROV mask from get_rov_mask()
+        :return: None
+        '''
+        for n_asn, offers in deferred.items():
+            peers = self.ases[n_asn].peers
+            prepend = prepend_origin.get(n_asn, 0)
+            for prefix in prefixes:
+                received = (offers if len(prefixes) == 1 else [offer for offer in offers if prefix in offer[1]])
+                if len(received) == 0:
+                    continue
+                asp = received[0][0]
+                if len(received) > 1:
+                    best = (asp[0] not in peers, len(asp) + (prepend if len(asp) == 1 else 0))
+                    for offer, _ in received[1:]:
+                        key = (offer[0] not in peers, len(offer) + (prepend if len(offer) == 1 else 0))
+                        if key < best:
+                            asp, best = offer, key
+                # ROV depends only on the origin of the announcement, the same for all offers
+                prefix_add = self.rov_filter(n_asn, asp, [prefix], asn_leg, rov)
+                if len(asp) == 1:
+                    asp = self.origin_asp(n_asn, asp, prepend_origin, asn_leg)
+                self.update_route(n_asn, prefix_add, asp, hijack)
+            if self.metrics is not None:
+                self.metrics.count('stub_offers', len(offers))
+
+
+    def array_propagate(self, asn:int, asp:ASPath, prefixes, hijack:bool, prepend_origin:dict):
+        '''
+        Propagate the announcement over the PrefixRIB arrays (rib_backend='arrays')
+        :param asn: ASN announcing the prefixes
+        :param asp: AS path announced by the origin
+        :param prefixes: announced prefixes
+        :param hijack: Is a hijacked Prefix? (True or False)
+        :param prepend_origin: How many more times the origin AS will prepend the first ASN
+        :return: a set with ASN that received the announcement
+        '''
+        topo = self.get_topology()
+        origin = topo.get_index(asn)
+        asp = asp.to_list()
+        rov = self.get_rov_mask()
+        offered = np.zeros(len(topo), dtype=bool)
+        for prefix in prefixes:
+            rib = self.get_rib(prefix)
+            valid = self.roa_state(prefix, asp[-1]) == propagation.ROA_VALID
+            offered |= propagation.three_stage(topo, rib, origin, asp, hijack, prepend_origin, rov, valid,
+                                               self.collapse_stubs)
+        if self.metrics is not None:
+            self.metrics.count('offers', int(offered.sum()))
+        return set(topo.asns[offered].tolist())
+
+
+    def hijack_bounds(self, hijacker:int, prepend_origin:dict=dict(), algorithm:str='flood', tight:bool=True):
+        '''
+        Lower and upper bounds of the number of ASes with hijacked routes (Contaminated_ASes) of the hijack of the
+        hijacker (see hijack), computed over the current routes of the scenario without propagating it. Only the
+        announcements of the hijacker to its neighbours are checked, with the rules of the propagation (loop, ROV,
+        relationship and length of the current route): each neighbour that accepts the route keeps a hijacked route
+        (lower bound). When only customers of the hijacker accept it, the hijacked routes stay in their customer cones
+        and the ASes without route (ignore_model_sometimes), otherwise they can reach every AS (upper bound). If no
+        neighbour accepts the route, the hijack does not change any route and both bounds are 0.
+        :param hijacker: ASN of the hijacker
+        :param prepend_origin: How many more times the origin AS will prepend the first ASN
+        :param algorithm: propagation algorithm of route_propagate ('flood' does not announce to siblings)
+        :param tight: False stops at the first neighbour that accepts the route and returns (1, number of ASes - 1),
+        enough to know if the hijack changes any route
+        :return: (lower bound, upper bound)
+        '''
+        topo = self.get_topology()
+        h = topo.get_index(hijacker)
+        if h < 0:
+            return 0, len(topo)
+        prefixes = self.ases[hijacker].get_hijacks()
+        if len(prefixes) == 0:
+            return 0, 0
+        asp = [hijacker] + self.ases[hijacker].get_fake_asp()
+        rov = self.get_rov_mask()
+        # relationship of the neighbours seen by the hijacker -> relationship of the hijacker seen by the neighbours
+        sessions = [(PROVIDER, CUSTOMER), (PEER, PEER), (CUSTOMER, PROVIDER)]
+        if self.rib_backend == 'arrays' or algorithm == 'three_stage':
+            sessions.append((SIBLING, SIBLING))
+        receivers = np.concatenate([topo.neighbors_by_rel(h, rel) for rel, _ in sessions]).astype(np.int64)
+        offer_rel = np.concatenate([np.full(len(topo.neighbors_by_rel(h, rel)), offer, dtype=np.int8)
+                                    for rel, offer in sessions])
+        lengths = propagation.origin_lengths(topo, receivers, asp, prepend_origin)
+        accepted = np.zeros(len(receivers), dtype=bool)
+        free = ~np.isin(topo.asns[receivers], asp)
+        asp_obj = ASPath.from_list(asp)
+        for prefix in prefixes:
+            keep = free.copy()
+            if rov is not None and self.roa_state(prefix, asp[-1]) != propagation.ROA_VALID:
+                keep &= ~rov[receivers]
+            if self.rib_backend == 'arrays':
+                rib = self.ribs.get(prefix)
+                if rib is not None:
+                    current = rib.rel[receivers]
+                    keep &= (offer_rel < current) | ((offer_rel == current) & (lengths < rib.length[receivers]))
+            else:
+                for k in np.flatnonzero(keep).tolist():
+                    n_asn = int(topo.asns[receivers[k]])
+                    offer = (self.origin_asp(n_asn, asp_obj, prepend_origin) if len(asp) == 1 else asp_obj)
+                    keep[k] = self.ases[n_asn].would_accept([prefix], offer)
+                    if keep[k] and not tight:
+                        return 1, len(topo) - 1
+            if keep.any() and not tight:
+                return 1, len(topo) - 1
+            accepted |= keep
+        if not accepted.any():
+            return 0, 0
+        contaminated = sorted_unique(receivers[accepted])
+        if (offer_rel[accepted] == PROVIDER).all() and topo.n_siblings.sum() == 0:
+            upper = len(topo.customer_cone(contaminated)) + self.routeless(prefixes)
+        else:
+            upper = len(topo) - 1
+        return len(contaminated), min(upper, len(topo) - 1)
+
+
+    def routeless(self, prefixes):
+        '''
+        Number of ASes without route to any of the prefixes
+        :param prefixes: Prefix objects
+        :return: int
+        '''
+        if self.rib_backend == 'arrays':
+            ribs = [self.ribs[prefix] for prefix in prefixes if prefix in self.ribs.keys()]
+            if len(ribs) < len(prefixes):
+                return len(self.get_topology())
+            return int(np.logical_or.reduce([rib.rel == NO_ROUTE for rib in ribs]).sum())
+        return sum(1 for asn in self.ases.keys() if any(p not in self.ases[asn].routes for p in prefixes))
+
+
+    def prune_hijack(self, hijacker:int, prepend_origin:dict=dict(), algorithm:str='flood'):
+        '''
+        Skip the propagation of a hijack when its bounds (see hijack_bounds) prove that it does not change any route:
+        the scenario is left as route_propagate and check_hijack would leave it (no AS with hijacked routes). The bounds
+        and the pruned scenarios are counted in the metrics (bound_lower, bound_upper and pruned_scenarios).
+        :param hijacker: ASN of the hijacker
+        :param prepend_origin: How many more times the origin AS will prepend the first ASN
+        :param algorithm: propagation algorithm of route_propagate
+        :return: True if the hijack was pruned (route_propagate is not needed), False otherwise
+        '''
+        # the exact bounds are only needed by the metrics
+        lower, upper = self.hijack_bounds(hijacker, prepend_origin, algorithm, tight=self.metrics is not None)
+        if self.metrics is not None:
+            self.metrics.count('bound_lower', lower)
+            self.metrics.count('bound_upper', upper)
+        if upper > 0:
+            return False
+        self.hjk_announce = [hijacker, ASPath.from_list([hijacker] + self.ases[hijacker].get_fake_asp()),
+                             self.ases[hijacker].get_hijacks()]
+        self.hjk_ases = set()
+        self.vps_hjk = set()
+        self.checked_hjk = True
+        if self.metrics is not None:
+            self.metrics.count('pruned_scenarios')
+        return True
+
+
+    def set_baseline_cache(self, cache:BaselineCache):
+        '''
+        Use a cache of legitimate propagations shared with other graphs (e.g. BaselineCache(folder) to keep the
+        baselines on disk). The scenarios created by fork() use the same cache.
+        :param cache: baselines.BaselineCache object
+        :return: None
+        '''
+        self.baselines = cache
+
+
+    def get_rov_digest(self):
+        '''
+        Hash of the ASes with ROV enabled
+        :return: hexadecimal digest (str) or 'none' if no AS has ROV enabled
+        '''
+        rov = self.get_rov_mask()
+        if rov is None:
+            return 'none'
+        return hashlib.sha256(np.packbits(rov).tobytes()).hexdigest()
+
+
+    def baseline_key(self, victim:int, prefix, roa:bool, ignore_model_sometimes:bool, prepend_origin:dict,
+                     algorithm:str='flood'):
+        '''
+        Key of a legitimate propagation in the cache of baselines. ROV only drops announcements without a valid ROA,
+        so the ROV configuration is part of the key only when the announcement is not valid and some AS has ROV
+        enabled: the baseline of a valid announcement is shared by all ROV configurations.
+        :param algorithm: propagation algorithm of route_propagate (the 'arrays' backend always uses the three-stage)
+        :return: (victim, prefix, ignore_model_sometimes, prepend, engine, topology digest, ROV digest or None)
+        '''
+        if type(prefix) is str:
+            prefix = Prefix(prefix)
+        valid = roa or self.roa_state(prefix, victim) == propagation.ROA_VALID
+        engine = ('arrays' if self.rib_backend == 'arrays' else algorithm)
+        rov = (None if valid else self.get_rov_digest())
+        return (victim, prefix, ignore_model_sometimes, tuple(sorted(prepend_origin.items())), engine,
+                self.get_topology().digest(), (None if rov == 'none' else rov))
+
+
+    def legit_batch(self, announces:list, roa:bool=True, ignore_model_sometimes:bool=True, lanes:int=64):
+        '''
+        Propagate the legitimate prefixes of many victims at once and save the routes in the cache of baselines
+        (rib_backend='arrays'). Up to 64 victims are propagated together (propagation.legit_lanes), each one in its
+        own scenario, the routes are the same of add_prefix + route_propagate. The scenario of the Graph is not
+        changed, use load_baseline to start a simulation from a cached baseline.
+        :param announces: list of [victim, prefix] or [victim, prefix, prepend_origin]
+        :param roa: Enable Route Origin Authorization to the prefixes and victims
+        :param ignore_model_sometimes: Ignore Gao-Rexford model when there are no connections to all ASes
+        :param lanes: number of victims propagated together (1-64)
+        :return: number of baselines computed
+        '''
+        if self.rib_backend != 'arrays':
+            print("ERROR: legit_batch needs a Graph with rib_backend='arrays'.")
+            return 0
+        lanes = min(max(lanes, 1), 64)
+        topo = self.get_topology()
+        rov = self.get_rov_mask()
+        pending = dict()
+        for announce in announces:
+            victim, prefix = announce[0], Prefix(announce[1])
+            prepend_origin = (announce[2] if len(announce) > 2 else dict())
+            key = self.baseline_key(victim, prefix, roa, ignore_model_sometimes, prepend_origin)
+            if topo.get_index(victim) < 0:
+                print('ERROR: AS{} not found in the graph!!'.format(victim))
+            elif key not in self.baselines:
+                pending[key] = prepend_origin
+        keys = list(pending.keys())
+        for first in range(0, len(keys), lanes):
+            chunk = keys[first:first + lanes]
+            origins = topo.get_indexes([key[0] for key in chunk])
+            prepends = [pending[key] for key in chunk]
+            valid = [roa or self.roa_state(key[1], key[0]) == propagation.ROA_VALID for key in chunk]
+            ribs = [PrefixRIB(key[1], len(topo)) for key in chunk]
+            propagation.legit_lanes(topo, ribs, origins, prepends, rov, valid)
+            for key, rib in zip(chunk, ribs):
+                if ignore_model_sometimes:
+                    propagation.ignore_model(topo, rib)
+                self.baselines.put(key, rib)
+            if self.debug:
+                print('{}/{} legitimate routes propagated.'.format(first + len(chunk), len(keys)))
+        return len(keys)
+
+
+    def save_baseline(self, victim:int, prefix:str, roa:bool=True, ignore_model_sometimes:bool=True,
+                      prepend_origin:dict=dict(), algorithm:str='flood'):
+        '''
+        Save the legitimate routes of the scenario (after add_prefix + route_propagate of the victim, before any
+        hijack) in the cache of baselines
+        :param victim: ASN that announces the prefix
+        :param prefix: IPv4 prefix
+        :param roa: Enable Route Origin Authorization to this prefix and AS
+        :param ignore_model_sometimes: Ignore Gao-Rexford model when there are no connections to all ASes
+        :param prepend_origin: How many more times the origin AS will prepend the first ASN
+        :param algorithm: propagation algorithm used by route_propagate
+        :return: None
+        '''
+        key = self.baseline_key(victim, prefix, roa, ignore_model_sometimes, prepend_origin, algorithm)
+        if self.rib_backend == 'arrays':
+            if key[1] in self.ribs.keys():
+                self.baselines.put(key, self.ribs[key[1]].copy())
+        else:
+            # the route dicts are replaced, never changed, so the baseline shares them with the scenario
+            self.baselines.put(key, {asn: as_obj.routes[key[1]] for asn, as_obj in self.ases.items()
+                                     if key[1] in as_obj.routes})
+
+
+    def load_baseline(self, victim:int, prefix:str, roa:bool=True, ignore_model_sometimes:bool=True,
+                      prepend_origin:dict=dict(), algorithm:str='flood'):
+        '''
+        Start a scenario from a legitimate propagation saved by legit_batch or save_baseline (the same state of
+        add_prefix + route_propagate)
+        :param victim: ASN that announces the prefix
+        :param prefix: IPv4 prefix
+        :param roa: Enable Route Origin Authorization to this prefix and AS
+        :param ignore_model_sometimes: Ignore Gao-Rexford model when there are no connections to all ASes
+        :param prepend_origin: How many more times the origin AS will prepend the first ASN
+        :param algorithm: propagation algorithm used by route_propagate
+        :return: True if the baseline was in the cache, False otherwise
+        '''
+        key = self.baseline_key(victim, prefix, roa, ignore_model_sometimes, prepend_origin, algorithm)
+        baseline = self.baselines.get(key)
+        if baseline is None or victim not in self.ases.keys():
+            return False
+        if self.rib_backend == 'arrays':
+            propagation.resolve_next_hops(self.get_topology(), baseline)
+            self.ribs[key[1]] = baseline.copy()
+        elif self.ases.base is not None and self.ases.own_ases() == 0:
+            # a new scenario (see fork) is created on top of a layer with the AS objects of the baseline, shared by
+            # the scenarios of the same baseline, so only the ASes changed by the scenario are copied
+            layer = self.baselines.get_layer(key, self.ases.base)
+            if layer is None:
+                layer = ScenarioASes(self.ases.base)
+                for asn, route in baseline.items():
+                    layer.writable_routes(asn).routes[key[1]] = route
+                self.baselines.put_layer(key, layer)
+            self.ases = ScenarioASes(layer)
+        else:
+            for asn, route in baseline.items():
+                self.ases.writable(asn).routes[key[1]] = route
+        self.add_prefix(victim, prefix, roa)
+        if self.metrics is not None:
+            self.metrics.count('baseline_hits')
+        self.leg_announce = [victim, ASPath(victim), self.ases[victim].get_prefixes()]
+        self.prepend_origin[victim] = prepend_origin
+        return True
+
+
+    def get_rib(self, prefix):
+        '''
+        Get the PrefixRIB of a prefix (rib_backend='arrays'), creating it if necessary
+        :param prefix: Prefix object
+        :return: PrefixRIB object
+        '''
+        if prefix not in self.ribs.keys():
+            self.ribs[prefix] = PrefixRIB(prefix, len(self.get_topology()))
+            if self.undo_log is not None:
+                self.ribs[prefix].checkpoint()
+        return self.ribs[prefix]
+
+
+    def add_rov_deployment(self, name:str, ases=None, mask=None):
+        '''
+        Save a named ROV deployment: the ASes with ROV enabled as a boolean mask over the AS indexes. The AS objects
+        are not changed, so one graph (and all scenarios created by fork) can simulate any number of deployments,
+        each scenario selects one with use_rov.
+        :param name: name of the deployment (e.g. 'rov_0.5')
+        :param ases: ASNs with ROV enabled (list or set)
+        :param mask: boolean array over the AS indexes (see get_topology), used if ases is None
+        :return: number of ASes with ROV enabled in the deployment
+        '''
+        topo = self.get_topology()
+        if ases is not None:
+            idx = topo.get_indexes(list(ases))
+            if (idx < 0).any():
+                print('{} ASes not found in the graph to enable ROV'.format(int((idx < 0).sum())))
+            mask = np.zeros(len(topo), dtype=bool)
+            mask[idx[idx >= 0]] = True
+        elif mask is None or len(mask) != len(topo):
+            print('ERROR: Inform the ASes or a mask with one value per AS to create the ROV deployment.')
+            return 0
+        mask = np.asarray(mask, dtype=bool)
+        mask.setflags(write=False)
+        self.rov_deployments[name] = mask
+        return int(mask.sum())
+
+
+    def use_rov(self, name:str=None):
+        '''
+        Select the ROV deployment of this scenario (ROV only changes the propagation, so selecting it is O(1)).
+        The ASes with ROV enabled by enable_rov are ignored while a deployment is selected.
+        :param name: name of a deployment saved by add_rov_deployment (None = the ASes enabled by enable_rov)
+        :return: True if the deployment was selected, False if it does not exist
+        '''
+        if name is not None and name not in self.rov_deployments.keys():
+            print('ERROR: ROV deployment {} not found.'.format(name))
+            return False
+        self.rov_deployment = name
+        # the ROV mask is created again on the next propagation (baselines that depend on ROV change their keys)
+        self.rov_mask = None
+        return True
+
+
+    def rov_count(self):
+        '''
+        Number of ASes with ROV enabled in the scenario (ROV column of the reports)
+        :return: int
+        '''
+        if self.rov_deployment is not None:
+            return int(self.rov_deployments[self.rov_deployment].sum())
+        return len(self.rov)
+
+
+    def get_rov_mask(self):
+        '''
+        Boolean mask over the AS indexes with the ASes with ROV enabled (the selected deployment, see use_rov)
+        :return: numpy array or None if no AS has ROV enabled
+        '''
+        if self.rov_mask is None:
+            topo = self.get_topology()
+            if self.rov_deployment is not None:
+                self.rov_mask = self.rov_deployments[self.rov_deployment]
+            else:
+                self.rov_mask = np.fromiter((self.ases[asn].rov_enabled for asn in topo.asns.tolist()), dtype=bool,
+                                            count=len(topo))
+        if not self.rov_mask.any():
+            return None
+        return self.rov_mask
+
+
+    def get_roa_table(self, prefix):
+        '''
+        ROA validity of the announcements of a prefix by each AS, created once per scenario and prefix
+        (propagation.ROA_VALID if the AS is authorised to announce the prefix, ROA_INVALID if there are ROAs to the
+        prefix but not to the AS and ROA_UNKNOWN if there are no ROAs to the prefix)
+        :param prefix: Prefix object
+        :return: numpy array over the AS indexes
+        '''
+        if prefix not in self.roa_table.keys():
+            topo = self.get_topology()
+            if prefix in self.roa.keys():
+                table = np.full(len(topo), propagation.ROA_INVALID, dtype=np.int8)
+                idx = topo.get_indexes(list(self.roa[prefix]))
+                table[idx[idx >= 0]] = propagation.ROA_VALID
+            else:
+                table = np.full(len(topo), propagation.ROA_UNKNOWN, dtype=np.int8)
+            self.roa_table[prefix] = table
+        return self.roa_table[prefix]
+
+
+    def roa_states(self, prefix, origins):
+        '''
+        ROA validity of the announcements of a prefix by many origins
+        :param prefix: Prefix object
+        :param origins: list of origin ASNs (the last ASN of the AS paths)
+        :return: numpy array with ROA_VALID, ROA_INVALID or ROA_UNKNOWN
+        '''
+        table = self.get_roa_table(prefix)
+        idx = self.get_topology().get_indexes(origins)
+        # ASNs out of the graph (forged AS paths) are not authorised by any ROA
+        outside = (propagation.ROA_INVALID if prefix in self.roa.keys() else propagation.ROA_UNKNOWN)
+        return np.where(idx >= 0, table[idx], outside)
+
+
+    def roa_state(self, prefix, origin:int):
+        '''
+        ROA validity of the announcement of a prefix by one origin (see get_roa_table)
+        :param prefix: Prefix object
+        :param origin: origin ASN (the last ASN of the AS path)
+        :return: ROA_VALID, ROA_INVALID or ROA_UNKNOWN
+        '''
+        i = self.get_topology().get_index(origin)
+        if i < 0:
+            return propagation.ROA_INVALID if prefix in self.roa.keys() else propagation.ROA_UNKNOWN
+        return self.get_roa_table(prefix)[i]
+
+
+    def share_arrays(self):
+        '''
+        Copy the topology, the ROV mask and the ROA tables of this scenario to shared memory once. The scenario
+        returned can be sent to the processes of a Pool (initializer) without these arrays, each process calls
+        attach_arrays() to use the shared memory instead of a copy.
+        The shared memory must be released with scenario.shared.unlink() when the processes finish.
+        :return: Graph object (a new scenario)
+        '''
+        topo = self.get_topology()
+        self.get_rov_mask()
+        arrays = topo.to_arrays()
+        arrays['rov_mask'] = self.rov_mask
+        for prefix in self.roa.keys():
+            arrays['roa/{}'.format(prefix)] = self.get_roa_table(prefix)
+        scenario = self.fork()
+        scenario.shared = SharedArrays(arrays)
+        scenario.topology = None
+        scenario.rov_mask = None
+        scenario.roa_table = dict()
+        if self.debug:
+            print('{:.1f} MB of arrays in shared memory.'.format(scenario.shared.nbytes() / 2**20))
+        return scenario
+
+
+    def attach_arrays(self):
+        '''
+        Use the arrays in shared memory created by share_arrays() (the arrays are read-only)
+        :return: None
+        '''
+        if self.shared is None:
+            return None
+        self.topology = Topology.from_arrays(self.shared, self.tier1, self.ixp)
+        self.connections.topology = self.topology
+        self.rov_mask = self.shared['rov_mask']
+        self.roa_table = {Prefix(key[4:]): self.shared[key] for key in self.shared.keys() if key.startswith('roa/')}
+
+
+    def __getstate__(self):
+        # the topology of the AS objects is sent with the Graph, except when it is in shared memory (see share_arrays)
+        state = self.__dict__.copy()
+        if self.shared is None:
+            state['connections_topology'] = self.connections.topology
+        return state
+
+
+    def __setstate__(self, state:dict):
+        topology = state.pop('connections_topology', None)
+        self.__dict__.update(state)
+        if topology is not None:
+            self.connections.topology = topology
+
+
+    def get_vps_array(self):
+        '''
+        Number of prefixes exported to the collectors by each AS (0 if it is not a VP) over the AS indexes
+        :return: numpy array
+        '''
+        if self.vps_array is None:
+            topo = self.get_topology()
+            self.vps_array = np.fromiter((self.ases[asn].vps_prefixes for asn in topo.asns.tolist()), dtype=np.int64,
+                                         count=len(topo))
+        return self.vps_array
+
+
+    def rov_filter(self, n_asn:int, asp:ASPath, prefixes, asn_leg:int=0, rov=UNSET):
+        '''
+        Apply Route Origin Validation in the AS that receives the announcement
+        :param n_asn: ASN receiving the announcement
+        :param asp: AS path received (the origin is the last ASN)
+        :param prefixes: announced prefixes
+        :param asn_leg: legitimate ASN (only to print debug information)
+        :param rov: ROV mask from get_rov_mask(), pass it when filtering many announcements of the same scenario
+        :return: prefixes accepted by the AS
+        '''
+        if rov is UNSET:
+            rov = self.get_rov_mask()
+        if rov is None or not rov[self.get_topology().get_index(n_asn)]:
+            return prefixes
+        prefix_add = list()
+        for p in prefixes:
+            if self.roa_state(p, asp[-1]) == propagation.ROA_VALID:
+                prefix_add.append(p)
+            elif self.debug and p in self.roa.keys():
+                print('[{}]ROV: AS{} reject prefix {} originated by AS{}.'.format(asn_leg,n_asn, p, asp[-1]))
+        if self.metrics is not None and len(prefix_add) < len(prefixes):
+            self.metrics.count('rov_rejections', len(prefixes) - len(prefix_add))
+        return prefix_add
+
+
+    def origin_asp(self, n_asn:int, asp:ASPath, prepend_origin:dict, asn_leg:int=0):
+        '''
+        Apply the origin prepend to the AS path announced directly by the origin to a neighbor
+        :param n_asn: neighbor ASN receiving the announcement
+        :param asp: AS path announced by the origin (ASPath)
+        :param prepend_origin: How many more times the origin AS will prepend the first ASN to each neighbor
+        :param asn_leg: legitimate ASN (only to print debug information)
+        :return: AS path (ASPath)
+        '''
+        if n_asn in prepend_origin.keys():
+            prepend = prepend_origin[n_asn]
+            p_asn=asp[-1]
+            for p in range(prepend):
+                asp = asp.prepend(p_asn)
+            if self.debug:
+                print('[{}]Prefix announce with prepend x{} to AS{}'.format(asn_leg,len(asp)-1,n_asn))
+        return asp
+
+
+    def three_stage_propagate(self, asn:int, asp:ASPath, prefixes:list, hijack:bool, prepend_origin:dict,
+                              asn_leg:int=0):
+        '''
+        Propagate the announcement in three stages following the Gao-Rexford model:
+        1) customer routes go up (customer -> provider) in increasing AS path length,
+        2) ASes with customer routes (and the origin) announce them to their peers and siblings,
+        3) provider routes go down (provider -> customer) in increasing AS path length.
+        Each AS decides with AS.add_route (same preference and shortest AS path rule of the flood), but because
+        the offers arrive in preference order it settles once and every connection is used at most once per stage.
+        The flood may keep routes announced before the neighbor settled (stale routes), this mode does not.
+        :param asn: ASN announcing the prefixes
+        :param asp: AS path announced by the origin (with the forged AS path when it is a hijack)
+        :param prefixes: prefixes announced, all of them must have the same routes in the ASes
+        :param hijack: Is a hijacked Prefix? (True or False)
+        :param prepend_origin: How many more times the origin AS will prepend the first ASN
+        :param asn_leg: legitimate ASN (only to print debug information)
+        :return: a set with ASN that received the announcement
+        '''
+        topo = self.get_topology()
+        asn_of = topo.asns.tolist()
+        origin = topo.get_index(asn)
+        rov = self.get_rov_mask()
+        offered = set()
+        customer_routes = list()
+        peer_routes = list()
+        provider_routes = list()
+
+        def offer(i:int, route:list):
+            n_asn = asn_of[i]
+            offered.add(n_asn)
+            if self.metrics is not None:
+                self.metrics.count('offers')
+            if len(route) == 1:
+                route = self.origin_asp(n_asn, route, prepend_origin, asn_leg)
+            prefix_add = self.rov_filter(n_asn, route, prefixes, asn_leg, rov)
+            if len(prefix_add) == 0:
+                return None
+            _, new_asp, new_prefixes = self.update_route(n_asn, prefix_add, route, hijack)
+            return (new_asp if len(new_prefixes) > 0 else None)
+
+        def offer_length(i:int, route:list):
+            if len(route) == 1:
+                return 1 + prepend_origin.get(asn_of[i], 0)
+            return len(route)
+
+        def by_length(levels:dict, export:list, next_rel:tuple):
+            while len(levels) > 0:
+                length = min(levels.keys())
+                for i, route, announce in levels.pop(length):
+                    new_asp = offer(i, route)
+                    if new_asp is None or not announce:
+                        continue
+                    export.append((i, new_asp))
+                    for rel in next_rel:
+                        for j in topo.neighbors_by_rel(i, rel).tolist():
+                            levels.setdefault(len(new_asp), list()).append((j, new_asp, rel != SIBLING))
+
+        # Stage 1: customer routes up
+        levels = dict()
+        for j in topo.providers(origin).tolist():
+            levels.setdefault(offer_length(j, asp), list()).append((j, asp, True))
+        by_length(levels, customer_routes, (PROVIDER,))
+        # Stage 2: one hop across peers (routes learned from siblings are not announced again)
+        senders = [(origin, asp)] + customer_routes
+        offers = list()
+        for i, route in senders:
+            for j in topo.peers(i).tolist():
+                offers.append((offer_length(j, route), j, route, True))
+            if i != origin:
+                for j in topo.siblings(i).tolist():
+                    offers.append((len(route), j, route, False))
+        offers.sort(key=lambda o: o[0])
+        for length, j, route, announce in offers:
+            new_asp = offer(j, route)
+            if new_asp is not None and announce:
+                peer_routes.append((j, new_asp))
+        # Stage 3: provider routes down
+        levels = dict()
+        for i, route in senders + peer_routes:
+            for j in topo.customers(i).tolist():
+                levels.setdefault(offer_length(j, route), list()).append((j, route, True))
+            if i != origin:
+                for j in topo.siblings(i).tolist():
+                    levels.setdefault(len(route), list()).append((j, route, False))
+        by_length(levels, provider_routes, (CUSTOMER, SIBLING))
+        return offered
+
+
     def all_route_propagate(self):
         '''
         Announce all prefixes from all ASes
@@ -645,7 +1755,8 @@ class Graph:
         '''
         asns = self.ases.keys()
         for asn in asns:
-            self.ases[asn].clear_routes()
+            self.ases.writable(asn).clear_routes()
+        self.ribs.clear()
 
 
     def restart_graph(self):
@@ -655,12 +1766,17 @@ class Graph:
         '''
         asns = self.ases.keys()
         for asn in asns:
-            self.ases[asn].clear_all()
+            self.ases.writable(asn).clear_all()
+        self.ribs.clear()
+        self.rov_mask = None
+        self.roa_table = dict()
+        self.baselines.clear()
         self.roa.clear()
         self.hjk_announce.clear()
         self.checked_hjk = False
         self.leg_announce.clear()
         self.rov.clear()
+        self.rov_deployment = None
         print('All clear!!!')
 
 
@@ -677,9 +1793,14 @@ class Graph:
             asns = self.ases.keys()
         else:
             asns = [asn]
-        hjk = set()
+        n_ases = len(asns)
+        if self.rib_backend == 'arrays' and not print_ases:
+            hjk, vps = self.array_check_hijack(asns, nb_prefix_full_route)
+            asns = []
+        else:
+            hjk = set()
         for asn in asns:
-            hijacks = self.ases[asn].has_hijack()
+            hijacks = self.get_hijacked_routes(asn)
             if len(hijacks) > 0:
                 hjk.add(asn)
                 if self.ases[asn].vps_prefixes >= nb_prefix_full_route:
@@ -692,7 +1813,7 @@ class Graph:
                     print('ASN{} has {} prefix(es) hijacked:'.format(asn, len(hijacks)))
                     for p in hijacks:
                         print('Prefix {} -> {}'.format(p[0], p[1]))
-        print('{}/{} ASes got hijacked prefixes.'.format(len(hjk), len(asns)))
+        print('{}/{} ASes got hijacked prefixes.'.format(len(hjk), n_ases))
         print('{} VPs exported the hijacked route to the collectors.'.format(len(vps)))
         self.vps_hjk = vps
         self.checked_hjk = True
@@ -700,6 +1821,86 @@ class Graph:
         return hjk
 
 
+    def hijack_batch(self, victim:int, hijackers:list, fake_asp:list, lanes:int=64,
+                     ignore_model_sometimes:bool=True, nb_prefix_full_route:int=100000):
+        '''
+        Run many hijacks of the victim prefixes at once (rib_backend='arrays'). Each hijacker is a lane (bit) of a
+        bitset per AS and up to 64 hijackers are propagated together over the legitimate routes (see
+        propagation.hijack_lanes), the scenario of the Graph is not changed. The results are the same of
+        Graph.hijack + Graph.route_propagate + Graph.check_hijack for each hijacker (columns Contaminated_ASes and
+        VPs_observ_hjk of text_report).
+        :param victim: ASN of the legitimate announcement (route_propagate must be run before)
+        :param hijackers: list of ASN hijackers
+        :param fake_asp: A forged AS path (list) used by all hijackers
+        :param lanes: number of hijackers propagated together (1-64)
+        :param ignore_model_sometimes: Ignore Gao-Rexford model when there are no connections to all ASes
+        :param nb_prefix_full_route: Minimum number of prefixes exported by a VPS to be considered full route information
+        :return: a dict {hijacker: (number of ASes with hijacked route, number of VPs that exported the hijacked route)}
+        '''
+        if self.rib_backend != 'arrays':
+            print("ERROR: hijack_batch needs a Graph with rib_backend='arrays'.")
+            return None
+        if len(self.leg_announce) == 0 or self.leg_announce[0] != victim:
+            print('ERROR: Propagate the legitimate route from AS{} before the hijacks.'.format(victim))
+            return None
+        lanes = min(max(lanes, 1), 64)
+        topo = self.get_topology()
+        prefixes = self.leg_announce[2]
+        rov = self.get_rov_mask()
+        vps_prefixes = self.get_vps_array()
+        full_route = vps_prefixes >= nb_prefix_full_route
+        partial_route = (vps_prefixes > 0) & ~full_route
+        selected = list()
+        for asn_hjk in hijackers:
+            if topo.get_index(asn_hjk) < 0:
+                print('ERROR: AS{} not found in the graph!!'.format(asn_hjk))
+            else:
+                selected.append(asn_hjk)
+        results = dict()
+        for first in range(0, len(selected), lanes):
+            chunk = selected[first:first + lanes]
+            origins = topo.get_indexes(chunk)
+            asps = [[asn_hjk] + list(fake_asp) for asn_hjk in chunk]
+            hijacked = np.zeros(len(topo), dtype=np.uint64)
+            from_customer = np.zeros(len(topo), dtype=np.uint64)
+            for prefix in prefixes:
+                valid = self.roa_states(prefix, [asp[-1] for asp in asps]) == propagation.ROA_VALID
+                hjk, cus = propagation.hijack_lanes(topo, self.ribs[prefix], origins, asps, rov, valid,
+                                                    ignore_model_sometimes)
+                hijacked |= hjk
+                from_customer |= cus
+            vps = hijacked & np.where(full_route, hijacked, np.where(partial_route, from_customer, np.uint64(0)))
+            for lane, asn_hjk in enumerate(chunk):
+                bit = np.uint64(1 << lane)
+                results[asn_hjk] = (int(np.count_nonzero(hijacked & bit)), int(np.count_nonzero(vps & bit)))
+            if self.debug:
+                print('[{}]{}/{} hijacks propagated.'.format(victim, first + len(chunk), len(selected)))
+        return results
+
+
+    def array_check_hijack(self, asns, nb_prefix_full_route:int=100000):
+        '''
+        Vectorised check_hijack over the PrefixRIB arrays (rib_backend='arrays')
+        :param asns: ASNs to check
+        :param nb_prefix_full_route: Minimum number of prefixes exported by a VPS to be considered full route information
+        :return: a set with the ASNs with hijacked routes and a set with the VPs that exported them
+        '''
+        topo = self.get_topology()
+        hijacked = np.zeros(len(topo), dtype=bool)
+        from_customer = np.zeros(len(topo), dtype=bool)
+        for rib in self.ribs.values():
+            hijacked |= rib.hijacked()
+            from_customer |= rib.hijacked_from_customer()
+        if len(asns) != len(topo):
+            selected = np.zeros(len(topo), dtype=bool)
+            idx = topo.get_indexes(list(asns))
+            selected[idx[idx >= 0]] = True
+            hijacked &= selected
+        vps_prefixes = self.get_vps_array()
+        vps = hijacked & ((vps_prefixes >= nb_prefix_full_route) | ((vps_prefixes > 0) & from_customer))
+        return set(topo.asns[hijacked].tolist()), set(topo.asns[vps].tolist())
+
+
     def enable_rov(self, percentage:float=0, ases:list=[]):
         '''
         Random enable Route Origin Validations (ROV) in some X% ASes or enable in a list of ASes
@@ -725,9 +1926,13 @@ class Graph:
         for asn in selected:
             if asn in self.ases.keys():
                 n_ases += 1
-                self.ases[asn].set_rov(True)
+                self.ases.writable(asn).set_rov(True)
             else:
                 print('AS{} not found in the graph to enable ROV'.format(asn))
+        # the layers of the baselines have copies of the AS objects made before
+        self.baselines.clear_layers()
+        # the ROV mask is created again on the next propagation (baselines that depend on ROV change their keys)
+        self.rov_mask = None
         print('ROV enabled in {} of {} ASes.'.format(n_ases, len(self.ases.keys())))
         self.rov=selected
 
@@ -814,47 +2019,87 @@ class Graph:
                 print('Customers: {}'.format(self.ases[asn].customers))
 
 
-    def ignore_model_sometimes(self, prefixes:list):
+    def ignore_model_sometimes(self, prefixes:list, max_rounds:int=2):
         '''
-        Ignore the Goa-Rexford model to propagate prefixes to all ASes
+        Ignore the Goa-Rexford model to propagate prefixes to all ASes. Each round visits the ASes without route in the
+        order of the graph and gives them the route of the first neighbor with route (provider, peer, sibling and
+        customer), the new routes are seen by the next ASes of the same round. Only the first round visits every AS
+        without route, the next ones only the ASes with a neighbor that got a route after their last visit. The
+        'arrays' RIB backend uses synchronous rounds instead (see propagation.ignore_model). The number of rounds
+        executed is saved in self.ignore_model_rounds.
         :param prefixes: Prefixes to propagate
+        :param max_rounds: maximum number of rounds (0 = until no AS gets a new route), the 'arrays' RIB backend
+        always repeats until no AS gets a new route
         :return: a set with ASN that received the route breaking the model
         '''
-        ases = copy(list(self.ases.keys()))
         more_routes = set()
-        try_again = True
-        for i in range(2):
-            if try_again:
-                try_again = False
-                for asn in ases:
-                    known_prefixes = self.ases[asn].routes.keys()
-                    for prefix in prefixes:
-                        if prefix in known_prefixes:
-                            continue
-                        neighbors = (list(self.ases[asn].providers) + list(self.ases[asn].peers) +
-                                     list(self.ases[asn].siblings) + list(self.ases[asn].customers))
-                        while len(neighbors)>0:
-                            n = neighbors.pop(0)
-                            if prefix in self.ases[n].routes.keys():
-                                asp = copy(self.ases[n].routes[prefix]['AS_path'])
-                                if not asn in asp:
-                                    hijack = copy(self.ases[n].routes[prefix]['hijack'])
-                                    asp.insert(0,n)
-                                    if n in self.ases[asn].providers:
-                                        conn = 'provider'
-                                    elif n in self.ases[asn].peers:
-                                        conn = 'peer'
-                                    elif n in self.ases[asn].siblings:
-                                        conn = 'sibling'
-                                    else:
-                                        conn = 'customer'
-                                    self.ases[asn].add_route([prefix],asp, hijack,debug=self.debug)
-                                    more_routes.add(asn)
-                                    if self.debug:
-                                        print('Gao-Rexford ERROR: AS{} added route to {} from AS{} ({}).'.format(asn, prefix, n, conn))
-                                    break
-                        if len(neighbors) == 0:
-                            try_again = True
+        self.ignore_model_rounds = 0
+        if self.rib_backend == 'arrays':
+            topo = self.get_topology()
+            for prefix in prefixes:
+                if prefix in self.ribs.keys():
+                    added, rounds = propagation.ignore_model(topo, self.ribs[prefix])
+                    more_routes.update(topo.asns[added].tolist())
+                    self.ignore_model_rounds = max(self.ignore_model_rounds, rounds)
+                    if self.metrics is not None:
+                        self.metrics.count('ignore_model_rounds', rounds)
+                        self.metrics.count('ignore_model_routes', len(added))
+                    if self.debug:
+                        print('Gao-Rexford ERROR: {} ASes added route to {} in {} round(s).'.format(len(added), prefix,
+                                                                                                   rounds))
+            return more_routes
+        order = None
+        for prefix in prefixes:
+            rounds = 0
+            # positions of the ASes without route in the order of the graph
+            pending = [k for k, (asn, as_obj) in enumerate(self.ases.items()) if prefix not in as_obj.routes]
+            if len(pending) > 0 and order is None:
+                ases = list(self.ases.keys())
+                order = {asn: k for k, asn in enumerate(ases)}
+            while len(pending) > 0 and (max_rounds == 0 or rounds < max_rounds):
+                rounds += 1
+                if self.metrics is not None:
+                    self.metrics.count('ignore_model_pending', len(pending))
+                queued = set(pending)
+                heapq.heapify(pending)
+                next_round = set()
+                while len(pending) > 0:
+                    k = heapq.heappop(pending)
+                    asn = ases[k]
+                    as_obj = self.ases[asn]
+                    if prefix in as_obj.routes.keys():
+                        continue
+                    route = None
+                    for conn, neighbors in (('provider', as_obj.providers), ('peer', as_obj.peers),
+                                            ('sibling', as_obj.siblings), ('customer', as_obj.customers)):
+                        for n in neighbors:
+                            route = self.ases[n].routes.get(prefix)
+                            if route is not None and not asn in route['AS_path']:
+                                break
+                            route = None
+                        if route is not None:
+                            break
+                    if route is None:
+                        continue
+                    self.update_route(asn, [prefix], route['AS_path'].prepend(n), route['hijack'])
+                    more_routes.add(asn)
+                    if self.debug:
+                        print('Gao-Rexford ERROR: AS{} added route to {} from AS{} ({}).'.format(asn, prefix, n, conn))
+                    # the neighbors without route visit the new route later in this round or in the next one
+                    for neighbor in (as_obj.providers | as_obj.peers | as_obj.siblings | as_obj.customers):
+                        if prefix not in self.ases[neighbor].routes.keys():
+                            j = order[neighbor]
+                            if j < k:
+                                next_round.add(j)
+                            elif j not in queued:
+                                queued.add(j)
+                                heapq.heappush(pending, j)
+                pending = list(next_round)
+            self.ignore_model_rounds = max(self.ignore_model_rounds, rounds)
+            if self.metrics is not None:
+                self.metrics.count('ignore_model_rounds', rounds)
+        if self.metrics is not None:
+            self.metrics.count('ignore_model_routes', len(more_routes))
         return more_routes
 
 
@@ -865,7 +2110,7 @@ class Graph:
         :return: AS path classification and the sequence by type connections
         '''
         path=list()
-        asp = copy(asp)
+        asp = list(asp)
         prev_asn = asp.pop(-1)
         result = ''
         for asn in reversed(asp):
@@ -911,25 +2156,34 @@ class Graph:
         return result, tmp
 
 
-    def export_hijack_as_paths(self,asn_leg:int, asn_hjk:int, ases:set, outfile:str = 'as_paths.csv'):
+    def hijacked_as_paths(self, ases:set):
         '''
-        Export hijacked AS path to a file and other information (Prefix;AS_path;Type;Sequence)
-        :param asn_leg: the legitimate ASN to check the hijack
-        :param asn_hjk: the hijecker ASN
+        Hijacked AS paths of some ASes and their classification (see asp_type)
         :param ases: a set of ASes to check the hijack
-        :param outfile: file to save information
-        :return: None
+        :return: a list of [prefix, AS path, type, sequence]
         '''
-        fake_asp = self.ases[asn_hjk].fake_asp
         asps = list()
         for asn in ases:
-            tmp = self.ases[asn].has_hijack()
+            tmp = self.get_hijacked_routes(asn)
             if len(tmp)>0:
                 asps += tmp
         result = []
         for prefix, asp in asps:
             asp_type, sequence = self.asp_type(asp)
             result.append([prefix, asp, asp_type, sequence])
+        return result
+
+
+    def export_hijack_as_paths(self,asn_leg:int, asn_hjk:int, ases:set, outfile:str = 'as_paths.csv'):
+        '''
+        Export hijacked AS path to a file and other information (Prefix;AS_path;Type;Sequence)
+        :param asn_leg: the legitimate ASN to check the hijack
+        :param asn_hjk: the hijecker ASN
+        :param ases: a set of ASes to check the hijack
+        :param outfile: file to save information
+        :return: None
+        '''
+        result = self.hijacked_as_paths(ases)
         if os.path.isfile(outfile):
             lines = ''
         else:
@@ -941,9 +2195,48 @@ class Graph:
             out.writelines(lines)
 
 
+    def report_record(self):
+        '''
+        Information about the hijack with the columns of text_report (results.REPORT_COLUMNS)
+        :return: a list with one value per column or None if there is no legitimate and hijack announce
+        '''
+        if len(self.leg_announce) == 0 or len(self.hjk_announce) == 0:
+            print('To get a text report make one legitimate announce and one hijack announce first.')
+            return None
+        if self.checked_hjk == False:
+            self.check_hijack()
+        if len(self.countries) == 0:
+            self.get_country_ases()
+        p_leg = self.leg_announce[2]
+        asn_leg = self.leg_announce[0]
+        desc_leg = self.ases[asn_leg].description
+        count_leg = self.ases[asn_leg].country
+        cont_leg = self.ases[asn_leg].continent
+        cus_leg = len(self.ases[asn_leg].customers)
+        peers_leg = len(self.ases[asn_leg].peers)
+        prov_leg = len(self.ases[asn_leg].providers)
+        degree_leg = cus_leg + peers_leg +prov_leg
+        roa = ('Y' if len(self.roa)>0 else 'N')
+        p_hjk = self.hjk_announce[2]
+        asn_hjk = self.hjk_announce[0]
+        desc_hjk = self.ases[asn_hjk].description
+        count_hjk = self.ases[asn_hjk].country
+        cont_hjk = self.ases[asn_hjk].continent
+        cus_hjk = len(self.ases[asn_hjk].customers)
+        peers_hjk = len(self.ases[asn_hjk].peers)
+        prov_hjk = len(self.ases[asn_hjk].providers)
+        degree_hjk = cus_hjk + peers_hjk + prov_hjk
+        fake_asp = self.ases[asn_hjk].get_fake_asp()
+        t_ases = len(self.ases.keys())
+        rov = self.rov_count()
+        return ['{}'.format(p_leg),asn_leg,desc_leg,count_leg,cont_leg,cus_leg,prov_leg,peers_leg,degree_leg,roa,
+                '{}'.format(p_hjk),asn_hjk,desc_hjk,count_hjk,cont_hjk,cus_hjk,prov_hjk,peers_hjk,degree_hjk,
+                list(fake_asp),len(fake_asp),t_ases,len(self.hjk_ases),len(self.vps_hjk),rov]
+
+
     def text_report(self, outfile:str, export_asp:bool=False, only_vps_asp:bool=True):
         '''
-        Export information about hijack to a file
+        Export information about hijack to a file (use results.ResultSink to write many scenarios)
         :param outfile: file will create with output information (must end with .csv)
         :param export_asp: create files with hijacked AS paths
         :param only_vps_asp: Only create files with AS path from VPs
@@ -951,45 +2244,16 @@ class Graph:
         '''
         if not (outfile.endswith('.csv') or outfile.endswith('.tmp')):
             outfile += '.csv'
-        if len(self.leg_announce) == 0 or len(self.hjk_announce) == 0:
-            print('To get a text report make one legitimate announce and one hijack announce first.')
-        else:
-            if self.checked_hjk == False:
-                self.check_hijack()
-            if len(self.countries) == 0:
-                self.get_country_ases()
-            p_leg = self.leg_announce[2]
+        record = self.report_record()
+        if record is not None:
             asn_leg = self.leg_announce[0]
-            desc_leg = self.ases[asn_leg].description
-            count_leg = self.ases[asn_leg].country
-            cont_leg = self.ases[asn_leg].continent
-            cus_leg = len(self.ases[asn_leg].customers)
-            peers_leg = len(self.ases[asn_leg].peers)
-            prov_leg = len(self.ases[asn_leg].providers)
-            degree_leg = cus_leg + peers_leg +prov_leg
-            roa = ('Y' if len(self.roa)>0 else 'N')
-            p_hjk = self.hjk_announce[2]
             asn_hjk = self.hjk_announce[0]
-            desc_hjk = self.ases[asn_hjk].description
-            count_hjk = self.ases[asn_hjk].country
-            cont_hjk = self.ases[asn_hjk].continent
-            cus_hjk = len(self.ases[asn_hjk].customers)
-            peers_hjk = len(self.ases[asn_hjk].peers)
-            prov_hjk = len(self.ases[asn_hjk].providers)
-            degree_hjk = cus_hjk + peers_hjk + prov_hjk
             fake_asp = self.ases[asn_hjk].get_fake_asp()
-            t_ases = len(self.ases.keys())
             hjk_ases = self.hjk_ases
-            rov = len(self.rov)
             lines = ''
-            line = '\n{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{};{}'
             if not os.path.isfile(outfile):
-                lines = ('Prefix_leg;Leg_ASN;Description_leg;Country_leg;Continent_leg;Customer_leg;Providers_leg;Peers_leg;Degree_leg;ROA;'
-                         'Prefix_hjk;Hijacker;Description_hjk;Country_hjk;Continent_hjk;Customer_hjk;Providers_hjk;Peers_hjk;Degree_hjk;Forged_AS_path;Type;'
-                         'Total_ASes;Contaminated_ASes;VPs_observ_hjk;ROV')
-            lines += line.format(p_leg,asn_leg,desc_leg,count_leg,cont_leg,cus_leg,prov_leg,peers_leg,degree_leg,roa,
-                                 p_hjk,asn_hjk,desc_hjk,count_hjk,cont_hjk,cus_hjk,prov_hjk,peers_hjk,degree_hjk,fake_asp,len(fake_asp),
-                                 t_ases,len(hjk_ases),len(self.vps_hjk),rov)
+                lines = ';'.join(REPORT_COLUMNS)
+            lines += '\n' + ';'.join('{}'.format(value) for value in record)
             with open(outfile, 'a') as out:
                 out.writelines(lines)
             if outfile.endswith('.csv'):
@@ -1090,6 +2354,7 @@ class Graph:
                 self.ases[asn].set_vps(vps[asn]['nb_pref'])
                 self.ases[asn].description += '({} - {})'.format(vps[asn]['name'], vps[asn]['collector'])
                 total_vps.append(asn)
+        self.vps_array = None
         print('From {} VPS, {} ASes were found in the graph and will be considered VPS based on information from RouteViews and/or RIPE-RIS.'.format(len(vps), len(total_vps)))
         self.vps = vps
         return vps
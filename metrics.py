@@ -0,0 +1,139 @@
+import os
+import json
+from collections import Counter
+from glob import glob
+from time import perf_counter
+import pandas as pd
+
+
+class PropagationMetrics:
+    def __init__(self, outfile:str='metrics', top:int=5):
+        '''
+        Counters and timers of the propagation (Graph.route_propagate, AS.add_route, Graph.ignore_model_sometimes).
+        They are summed until emit() writes them as one JSON line per scenario and starts new counters. Each process
+        writes its own file ({outfile}_{pid}.jsonl), so the processes of a Pool do not share a file.
+        Counters:
+        - queue_pushes, queue_pops, peak_queue: announcements queued by the flood
+        - stub_offers: offers to the stubs resolved after the flood (Graph.set_collapse_stubs)
+        - offers: routes offered to the ASes by the three-stage propagation (ASes offered with the 'arrays' backend)
+        - routes_kept: offers that did not change the route of the AS
+        - loop_rejections: offers with the ASN of the receiver in the AS path
+        - rov_rejections: prefixes dropped by ROV
+        - baseline_hits: legitimate propagations loaded from the cache of baselines (Graph.load_baseline)
+        - bound_lower, bound_upper, pruned_scenarios: bounds of the ASes with hijacked routes and hijacks not
+        propagated because the bounds prove that they change no route (Graph.prune_hijack)
+        - route_replacements: accepted routes that replaced a route of the AS (top ASes in top_replaced)
+        - accept_by: accepted routes by reason (see AS.preference)
+        - ignore_model_rounds, ignore_model_pending, ignore_model_routes: rounds, ASes visited and routes added by
+        ignore_model_sometimes
+        Timers (seconds): propagation, ignore_model and the phases timed by the caller (see timer)
+        :param outfile: path and prefix of the file names
+        :param top: number of ASes with more route replacements saved in each line
+        '''
+        self.outfile = outfile
+        self.top = top
+        self.pid = None
+        self.out = None
+        self.reset()
+
+
+    def __getstate__(self):
+        # the file is not sent to other processes
+        state = self.__dict__.copy()
+        state['pid'] = None
+        state['out'] = None
+        return state
+
+
+    def reset(self):
+        self.counters = Counter()
+        self.accept_by = Counter()
+        self.replaced = Counter()
+        self.timers = dict()
+        self.peak_queue = 0
+
+
+    def count(self, name:str, n:int=1):
+        self.counters[name] += n
+
+
+    def add_time(self, phase:str, seconds:float):
+        self.timers[phase] = self.timers.get(phase, 0.0) + seconds
+
+
+    def timer(self, phase:str):
+        '''
+        Time a block of code: with metrics.timer('report'): ...
+        :param phase: name of the timer
+        :return: context manager
+        '''
+        return PhaseTimer(self, phase)
+
+
+    def record(self, **scenario):
+        '''
+        Values of the current scenario
+        :param scenario: fields that identify the scenario (victim, hijacker, ...)
+        :return: dict
+        '''
+        record = dict(scenario)
+        record.update(self.counters)
+        record['peak_queue'] = self.peak_queue
+        record['route_replacements'] = sum(self.replaced.values())
+        record['top_replaced'] = [[asn, n] for asn, n in self.replaced.most_common(self.top)]
+        record['accept_by'] = dict(self.accept_by)
+        record['timers'] = {phase: round(seconds, 6) for phase, seconds in self.timers.items()}
+        return record
+
+
+    def emit(self, **scenario):
+        '''
+        Write the values of the scenario as a JSON line and start new counters
+        :param scenario: fields that identify the scenario (victim, hijacker, ...)
+        :return: the record written (dict)
+        '''
+        record = self.record(**scenario)
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.out = open('{}_{}.jsonl'.format(self.outfile, self.pid), 'w')
+        self.out.write(json.dumps(record) + '\n')
+        self.out.flush()
+        self.reset()
+        return record
+
+
+    def close(self):
+        if self.out is not None and self.pid == os.getpid():
+            self.out.close()
+        self.out = None
+        self.pid = None
+
+
+class PhaseTimer:
+    def __init__(self, metrics:PropagationMetrics, phase:str):
+        self.metrics = metrics
+        self.phase = phase
+
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.add_time(self.phase, perf_counter() - self.start)
+
+
+def read_metrics(files):
+    '''
+    Read the JSON lines written by PropagationMetrics
+    :param files: file name, list of file names or glob pattern (e.g. 'metrics_*.jsonl')
+    :return: pandas DataFrame (accept_by and timers are expanded to columns accept_by.X and timers.X)
+    '''
+    if isinstance(files, str):
+        files = sorted(glob(files))
+    records = list()
+    for file in files:
+        with open(file, 'r') as f:
+            records += [json.loads(line) for line in f if line.strip() != '']
+    return pd.json_normalize(records)
@@ -0,0 +1,156 @@
+import os
+import random
+import signal
+import cProfile
+import pstats
+from collections import Counter
+from glob import glob
+
+
+class ScenarioProfiler:
+    def __init__(self, outfile:str='profile', sample:float=0.1, seed:int=None, stacks:bool=True,
+                 interval:float=0.005):
+        '''
+        Profile a fraction of the tasks of a simulation campaign. The sampled tasks run under cProfile and, if stacks
+        is True, a sampling profiler (SIGPROF timer) counts the call stacks. Each process saves its own files after
+        every sampled task ({outfile}_{pid}.prof and {outfile}_{pid}.folded), merge() sums them in:
+        - {outfile}.prof: pstats file of all processes
+        - {outfile}.txt: functions sorted by cumulative and by internal time
+        - {outfile}.folded: call stacks in the folded format of flamegraph.pl / speedscope ("a;b;c count")
+        :param outfile: path and prefix of the file names
+        :param sample: fraction of the tasks profiled (1.0 = all)
+        :param seed: seed of the sample
+        :param stacks: count the call stacks with the sampling profiler (only where SIGPROF exists)
+        :param interval: seconds of CPU time between two stack samples
+        '''
+        self.outfile = outfile
+        self.sample = sample
+        self.seed = seed
+        self.stacks = stacks and hasattr(signal, 'setitimer')
+        self.interval = interval
+        self.pid = None
+        self.profile = None
+        self.folded = None
+        self.random = None
+        self.tasks = 0
+
+
+    def __getstate__(self):
+        # the profiles are not sent to other processes
+        state = self.__dict__.copy()
+        state['pid'] = None
+        state['profile'] = None
+        state['folded'] = None
+        state['random'] = None
+        return state
+
+
+    def setup(self):
+        '''
+        Start new profiles when the object is used in a new process (the profiles of the parent are discarded)
+        :return: None
+        '''
+        if self.pid == os.getpid():
+            return
+        self.pid = os.getpid()
+        self.profile = cProfile.Profile()
+        self.folded = Counter()
+        self.random = random.Random(None if self.seed is None else '{}-{}'.format(self.seed, self.pid))
+        self.tasks = 0
+
+
+    def run(self, function, *args):
+        '''
+        Run the function, profiling it if the task is selected by the sample
+        :param function: function to run
+        :param args: arguments of the function
+        :return: the value returned by the function
+        '''
+        self.setup()
+        if self.sample < 1.0 and self.random.random() >= self.sample:
+            return function(*args)
+        if self.stacks:
+            handler = signal.signal(signal.SIGPROF, self.sample_stack)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        self.profile.enable()
+        try:
+            return function(*args)
+        finally:
+            self.profile.disable()
+            if self.stacks:
+                signal.setitimer(signal.ITIMER_PROF, 0, 0)
+                signal.signal(signal.SIGPROF, handler)
+            self.tasks += 1
+            self.dump()
+
+
+    def sample_stack(self, signum, frame):
+        '''
+        SIGPROF handler, counts the call stack below ScenarioProfiler.run
+        '''
+        stack = list()
+        while frame is not None and frame.f_code is not ScenarioProfiler.run.__code__:
+            code = frame.f_code
+            stack.append('{}:{}'.format(os.path.basename(code.co_filename), code.co_name))
+            frame = frame.f_back
+        if len(stack) > 0:
+            self.folded[';'.join(reversed(stack))] += 1
+
+
+    def dump(self):
+        '''
+        Save the profiles of this process (the files are replaced, they have all tasks profiled by the process)
+        :return: None
+        '''
+        self.profile.dump_stats('{}_{}.prof'.format(self.outfile, self.pid))
+        if self.stacks:
+            write_folded('{}_{}.folded'.format(self.outfile, self.pid), self.folded)
+
+
+    def clear(self):
+        '''
+        Remove the files of the processes of a previous campaign
+        :return: None
+        '''
+        for file in glob('{}_[0-9]*.prof'.format(self.outfile)) + glob('{}_[0-9]*.folded'.format(self.outfile)):
+            os.remove(file)
+
+
+    def merge(self, top:int=40):
+        '''
+        Merge the files of all processes
+        :param top: number of functions in the text report
+        :return: pstats.Stats object (None if no task was profiled)
+        '''
+        files = sorted(glob('{}_[0-9]*.prof'.format(self.outfile)))
+        if len(files) == 0:
+            return None
+        stats = pstats.Stats(*files)
+        stats.dump_stats(self.outfile + '.prof')
+        with open(self.outfile + '.txt', 'w') as f:
+            print('Profiles merged from {} processes.'.format(len(files)), file=f)
+            report = pstats.Stats(*files, stream=f)
+            report.sort_stats('cumulative').print_stats(top)
+            report.sort_stats('tottime').print_stats(top)
+        folded = Counter()
+        for file in sorted(glob('{}_[0-9]*.folded'.format(self.outfile))):
+            folded.update(read_folded(file))
+        if len(folded) > 0:
+            write_folded(self.outfile + '.folded', folded)
+        return stats
+
+
+def write_folded(outfile:str, folded:Counter):
+    with open(outfile, 'w') as f:
+        for stack, count in folded.most_common():
+            f.write('{} {}\n'.format(stack, count))
+
+
+def read_folded(infile:str):
+    folded = Counter()
+    with open(infile, 'r') as f:
+        for line in f:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            if stack != '':
+                folded[stack] += int(count)
+    return folded
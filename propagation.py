@@ -0,0 +1,621 @@
+import numpy as np
+from topology import CUSTOMER, PEER, SIBLING, PROVIDER, csr_gather
+from rib import NO_ROUTE, PrefixRIB
+
+# Order used to select the neighbor when the Gao-Rexford model is ignored (same of Graph.ignore_model_sometimes)
+IGNORE_MODEL_ORDER = (PROVIDER, PEER, SIBLING, CUSTOMER)
+# ROA validity of an announcement (prefix, origin), ASes with ROV enabled only accept valid announcements
+ROA_UNKNOWN = 0
+ROA_VALID = 1
+ROA_INVALID = 2
+
+
+def origin_lengths(topology, receivers, asp:list, prepend_origin:dict):
+    '''
+    Length of the AS path announced by the origin to each neighbor (prepend only when the AS path has only the origin)
+    :param topology: Topology object
+    :param receivers: array with neighbor indexes
+    :param asp: AS path announced by the origin (list)
+    :param prepend_origin: How many more times the origin AS will prepend the first ASN to each neighbor
+    :return: array with lengths
+    '''
+    lengths = np.full(len(receivers), len(asp), dtype=np.int32)
+    if len(asp) == 1 and len(prepend_origin) > 0:
+        asns = topology.asns[receivers].tolist()
+        lengths += np.array([prepend_origin.get(a, 0) for a in asns], dtype=np.int32)
+    return lengths
+
+
+def accept_offers(rib, receivers, senders, lengths, rel:int, origin:int, hijack:bool, blocked):
+    '''
+    Select the best offer to each receiver and replace the current route when the offer is better
+    (customer > peer > sibling > provider and then the shortest AS path, the same rules of AS.add_route)
+    :param rib: PrefixRIB object
+    :param receivers: array with the indexes of the ASes receiving the offers
+    :param senders: array with the indexes of the ASes announcing the route
+    :param lengths: array with the AS path length received
+    :param rel: relationship of the senders seen by the receivers
+    :param origin: index of the AS that announced the prefix
+    :param hijack: the offers are to a hijacked prefix
+    :param blocked: boolean mask with the ASes that do not accept this announcement (loop or ROV)
+    :return: array with the indexes of ASes that accepted the route
+    '''
+    keep = ~blocked[receivers]
+    if rel == SIBLING:
+        # do not send back the route to the sibling that announced it
+        keep &= rib.next_hop[senders] != receivers
+    receivers = receivers[keep]
+    if len(receivers) == 0:
+        return receivers
+    senders = senders[keep]
+    lengths = lengths[keep]
+    # one sort of the key (receiver, length, sender) instead of np.lexsort
+    n = len(rib)
+    max_length = int(lengths.max()) + 1
+    keys = np.sort((receivers.astype(np.int64) * max_length + lengths) * n + senders)
+    receivers = keys // (max_length * n)
+    first = np.ones(len(receivers), dtype=bool)
+    first[1:] = receivers[1:] != receivers[:-1]
+    keys = keys[first]
+    receivers = receivers[first]
+    senders = keys % n
+    lengths = ((keys // n) % max_length).astype(np.int32)
+    current = rib.rel[receivers]
+    better = (rel < current) | ((rel == current) & (lengths < rib.length[receivers]))
+    receivers = receivers[better]
+    rib.set_routes(receivers, senders[better], lengths[better], rel, origin, hijack)
+    return receivers
+
+
+def by_length(topology, rib, levels:dict, rel:int, next_rel:tuple, origin:int, hijack:bool, blocked, skip=None):
+    '''
+    Process the offers in increasing AS path length, ASes that accept a route announce it to the next neighbors
+    :param levels: dict {length: [(receivers, senders), ...]}
+    :param rel: relationship of the senders seen by the receivers
+    :param next_rel: relationships used to announce the accepted routes
+    :param skip: boolean mask with the ASes that do not receive the announcements of the next neighbors (None = all
+    receive them)
+    :return: list of arrays with the ASes that accepted a route
+    '''
+    accepted = list()
+    while len(levels) > 0:
+        length = min(levels.keys())
+        receivers = np.concatenate([r for r, s in levels[length]])
+        senders = np.concatenate([s for r, s in levels.pop(length)])
+        new = accept_offers(rib, receivers, senders, np.full(len(receivers), length, dtype=np.int32), rel, origin,
+                            hijack, blocked)
+        if len(new) == 0:
+            continue
+        accepted.append(new)
+        for n_rel in next_rel:
+            senders, receivers = topology.gather(new, n_rel)
+            if skip is not None:
+                keep = ~skip[receivers]
+                senders = senders[keep]
+                receivers = receivers[keep]
+            if len(receivers) > 0:
+                levels.setdefault(length + 1, list()).append((receivers, senders))
+    return accepted
+
+
+def resolve_stubs(topology, rib, senders, rel:int, origin:int, asp:list, prepend_origin:dict, hijack:bool, blocked):
+    '''
+    Offer the routes of the senders to the stubs (Topology.stub_groups) in one pass. The stubs do not announce the
+    routes they learn, so they are left out of the stages of three_stage and their offers are resolved at the end:
+    the best offer (shortest AS path and then the lowest index, the order of accept_offers) is chosen once per group
+    of stubs with the same providers and peers and replaces the route of each stub of the group when it is better.
+    :param senders: array with the indexes of the ASes that announce their routes (the origin is not included)
+    :param rel: relationship of the senders seen by the stubs (PEER or PROVIDER)
+    :param origin: index of the AS that announced the prefix
+    :param asp: AS path announced by the origin (list)
+    :param prepend_origin: How many more times the origin AS will prepend the first ASN to each neighbor
+    :param hijack: the offers are to a hijacked prefix
+    :param blocked: boolean mask with the ASes that do not accept this announcement (loop or ROV)
+    :return: arrays with the indexes of the stubs that received an offer and of the stubs that accepted the route
+    '''
+    n = len(topology)
+    none = np.iinfo(np.int64).max
+    links = topology.stub_offers()
+    # best offer of each group, the key is length * N + sender
+    senders, groups = csr_gather(*links[rel], senders)
+    best = np.full(len(topology.stub_groups()[2]), none, dtype=np.int64)
+    np.minimum.at(best, groups, (rib.length[senders].astype(np.int64) + 1) * n + senders)
+    members = links['stubs']
+    keys = best[links['groups']]
+    # the origin announces to its neighbors with the prepends of each neighbor
+    receivers = topology.neighbors_by_rel(origin, CUSTOMER if rel == PROVIDER else rel).astype(np.int64)
+    receivers = receivers[in_sorted(receivers, members)]
+    lengths = origin_lengths(topology, receivers, asp, prepend_origin).astype(np.int64)
+    np.minimum.at(keys, np.searchsorted(members, receivers), lengths * n + origin)
+    offered = keys != none
+    members = members[offered]
+    keys = keys[offered]
+    keep = ~blocked[members]
+    nodes = members[keep]
+    keys = keys[keep]
+    lengths = (keys // n).astype(np.int32)
+    current = rib.rel[nodes]
+    better = (rel < current) | ((rel == current) & (lengths < rib.length[nodes]))
+    nodes = nodes[better]
+    rib.set_routes(nodes, keys[better] % n, lengths[better], rel, origin, hijack)
+    return members, nodes
+
+
+def three_stage(topology, rib, origin:int, asp:list, hijack:bool=False, prepend_origin:dict=dict(), rov=None,
+                valid:bool=True, collapse_stubs:bool=True):
+    '''
+    Propagate one announcement over the arrays of a PrefixRIB following the Gao-Rexford model in three stages:
+    customer routes up, peer routes across one hop and provider routes down (see Graph.three_stage_propagate).
+    :param topology: Topology object
+    :param rib: PrefixRIB object (changed in place, it may have routes of other announcement)
+    :param origin: index of the AS announcing the prefix
+    :param asp: AS path announced by the origin (list with the origin ASN and the forged AS path)
+    :param hijack: Is a hijacked prefix? (True or False)
+    :param prepend_origin: How many more times the origin AS will prepend the first ASN to each neighbor
+    :param rov: boolean mask with the ASes with ROV enabled (None if no AS validates the routes)
+    :param valid: the announcement is valid (ROA) for the ROV ASes
+    :param collapse_stubs: leave the stubs out of the stages and give them their routes in one pass at the end
+    (resolve_stubs), the routes are the same
+    :return: boolean mask with the ASes that received the announcement
+    '''
+    n = len(topology)
+    rib.add_announce(origin, asp, prepend_origin)
+    skip = (topology.stub_groups()[0] if collapse_stubs else None)
+    blocked = np.zeros(n, dtype=bool)
+    loop = topology.get_indexes(asp)
+    blocked[loop[loop >= 0]] = True
+    if rov is not None and not valid:
+        blocked |= rov
+    offered = np.zeros(n, dtype=bool)
+
+    def origin_offers(rel:int):
+        receivers = topology.neighbors_by_rel(origin, rel).astype(np.int64)
+        offered[receivers] = True
+        if skip is not None:
+            receivers = receivers[~skip[receivers]]
+        return receivers, origin_lengths(topology, receivers, asp, prepend_origin)
+
+    def without_stubs(senders, receivers):
+        if skip is None:
+            return senders, receivers
+        keep = ~skip[receivers]
+        return senders[keep], receivers[keep]
+
+    # Stage 1: customer routes up
+    receivers, lengths = origin_offers(PROVIDER)
+    levels = dict()
+    for length in np.unique(lengths).tolist():
+        sel = receivers[lengths == length]
+        levels[length] = [(sel, np.full(len(sel), origin, dtype=np.int64))]
+    customer_routes = by_length(topology, rib, levels, CUSTOMER, (PROVIDER,), origin, hijack, blocked)
+    customer_routes = np.concatenate(customer_routes) if len(customer_routes) > 0 else np.zeros(0, dtype=np.int64)
+    offered[customer_routes] = True
+    # Stage 2: one hop across peers (routes learned from siblings are not announced again)
+    receivers, lengths = origin_offers(PEER)
+    senders, peers = without_stubs(*topology.gather(customer_routes, PEER))
+    offered[peers] = True
+    peer_routes = accept_offers(rib, np.concatenate([receivers, peers]),
+                                np.concatenate([np.full(len(receivers), origin, dtype=np.int64), senders]),
+                                np.concatenate([lengths, rib.length[senders] + 1]), PEER, origin, hijack, blocked)
+    senders, siblings = topology.gather(customer_routes, SIBLING)
+    offered[siblings] = True
+    accept_offers(rib, siblings.astype(np.int64), senders, rib.length[senders] + 1, SIBLING, origin, hijack, blocked)
+    # Stage 3: provider routes down
+    receivers, lengths = origin_offers(CUSTOMER)
+    levels = dict()
+    for length in np.unique(lengths).tolist():
+        sel = receivers[lengths == length]
+        levels.setdefault(length, list()).append((sel, np.full(len(sel), origin, dtype=np.int64)))
+    holders = np.concatenate([customer_routes, peer_routes])
+    senders, customers = without_stubs(*topology.gather(holders, CUSTOMER))
+    for length in np.unique(rib.length[senders]).tolist():
+        sel = rib.length[senders] == length
+        levels.setdefault(length + 1, list()).append((customers[sel].astype(np.int64), senders[sel]))
+    provider_routes = by_length(topology, rib, levels, PROVIDER, (CUSTOMER,), origin, hijack, blocked, skip)
+    for new in provider_routes:
+        offered[new] = True
+    if skip is not None:
+        # Stubs: peer routes from the ASes with customer routes, then provider routes from all ASes with routes
+        peers, _ = resolve_stubs(topology, rib, customer_routes, PEER, origin, asp, prepend_origin, hijack, blocked)
+        offered[peers] = True
+        announced = np.concatenate([customer_routes, peer_routes] + provider_routes)
+        _, new = resolve_stubs(topology, rib, announced, PROVIDER, origin, asp, prepend_origin, hijack, blocked)
+        offered[new] = True
+    # Siblings of ASes with provider or peer routes
+    holders = np.concatenate([peer_routes] + provider_routes)
+    senders, siblings = topology.gather(holders, SIBLING)
+    offered[siblings] = True
+    accept_offers(rib, siblings.astype(np.int64), senders, rib.length[senders] + 1, SIBLING, origin, hijack, blocked)
+    return offered
+
+
+def in_sorted(values, table):
+    '''
+    Vectorised membership test against a sorted array (faster than np.isin for a small table)
+    :param values: array
+    :param table: sorted array
+    :return: boolean mask
+    '''
+    if len(table) == 0:
+        return np.zeros(len(values), dtype=bool)
+    pos = np.minimum(np.searchsorted(table, values), len(table) - 1)
+    return table[pos] == values
+
+
+def ignore_model(topology, rib, max_rounds:int=0):
+    '''
+    Give a route to ASes without route to the prefix from any neighbor with a route, ignoring the Gao-Rexford model
+    (neighbor preference: provider, peer, sibling and customer). The first round visits the ASes without route,
+    the next rounds only the ASes without route connected to the ASes that got a route in the previous round.
+    :param topology: Topology object
+    :param rib: PrefixRIB object
+    :param max_rounds: maximum number of rounds (0 = until no AS gets a new route)
+    :return: array with the ASes that received a route and the number of rounds executed
+    '''
+    # ASes in the announced AS path (origin and forged AS path) do not accept the route (loop),
+    # the pairs (origin, AS) are encoded as origin * N + AS
+    n = len(topology)
+    loops = list()
+    for origin, (asp, prepend_origin) in rib.announces.items():
+        loop = topology.get_indexes(asp)
+        loops.append(origin * n + loop[loop >= 0])
+    loops = np.sort(np.concatenate(loops)) if len(loops) > 0 else np.zeros(0, dtype=np.int64)
+    ranks_rel = np.array(IGNORE_MODEL_ORDER, dtype=np.int8)
+    added = list()
+    rounds = 0
+    pending = np.nonzero(~rib.has_route())[0]
+    while len(pending) > 0 and (max_rounds == 0 or rounds < max_rounds):
+        receivers = list()
+        senders = list()
+        ranks = list()
+        for rank, rel in enumerate(IGNORE_MODEL_ORDER):
+            # the senders are the neighbors <rel> of the ASes without route
+            r, s = topology.gather(pending, rel)
+            receivers.append(r)
+            senders.append(s.astype(np.int64))
+            ranks.append(np.full(len(r), rank, dtype=np.int8))
+        receivers = np.concatenate(receivers)
+        senders = np.concatenate(senders)
+        ranks = np.concatenate(ranks)
+        keep = rib.rel[senders] != NO_ROUTE
+        receivers = receivers[keep]
+        senders = senders[keep]
+        ranks = ranks[keep]
+        keep = ~in_sorted(rib.origin[senders].astype(np.int64) * n + receivers, loops)
+        receivers = receivers[keep]
+        senders = senders[keep]
+        ranks = ranks[keep]
+        if len(receivers) == 0:
+            break
+        rounds += 1
+        order = np.lexsort((senders, ranks, receivers))
+        receivers = receivers[order]
+        first = np.ones(len(receivers), dtype=bool)
+        first[1:] = receivers[1:] != receivers[:-1]
+        receivers = receivers[first]
+        senders = senders[order][first]
+        rels = ranks_rel[ranks[order][first]]
+        for hijack in (False, True):
+            sel = rib.hijack[senders] == hijack
+            if sel.any():
+                rib.set_routes(receivers[sel], senders[sel], rib.length[senders[sel]] + 1, rels[sel],
+                               rib.origin[senders[sel]], hijack)
+        added.append(receivers)
+        # ASes without route connected to the ASes that got a route in this round
+        pending = np.concatenate([topology.gather(receivers, rel)[1] for rel in IGNORE_MODEL_ORDER])
+        pending = np.unique(pending[rib.rel[pending] == NO_ROUTE]).astype(np.int64)
+    added = np.concatenate(added) if len(added) > 0 else np.zeros(0, dtype=np.int64)
+    return added, rounds
+
+
+def lane_masks(lanes:int):
+    '''
+    One bit per lane in an uint64 bitset
+    :param lanes: number of lanes (1-64)
+    :return: array with the bit of each lane and the bitset with all lanes
+    '''
+    bits = np.left_shift(np.uint64(1), np.arange(lanes, dtype=np.uint64))
+    return bits, np.bitwise_or.reduce(bits)
+
+
+def or_offers(n:int, receivers, bits):
+    '''
+    Join the lanes offered to each receiver
+    :param n: number of ASes
+    :param receivers: array with AS indexes
+    :param bits: array with the lanes (bitset) offered to each receiver
+    :return: array with the receivers (unique) and the lanes offered to them
+    '''
+    offers = np.zeros(n, dtype=np.uint64)
+    np.bitwise_or.at(offers, receivers, bits)
+    nodes = np.nonzero(offers)[0]
+    return nodes, offers[nodes]
+
+
+def lane_stages(topology, rib, origins, asps:list, prepends:list, blocked):
+    '''
+    The three stages of three_stage for up to 64 announcements at once, each announcement is a lane (bit) of an
+    uint64 bitset per AS. The routes of the PrefixRIB are shared by all lanes and the new routes are kept as bitsets
+    by relationship and AS path length, so each AS is visited once per level for all lanes. The decisions are the
+    same of three_stage, but the next hops are not chosen.
+    :param topology: Topology object
+    :param rib: PrefixRIB with the routes known before the announcements (not changed)
+    :param origins: array with the index of the AS announcing the prefix in each lane
+    :param asps: AS path announced in each lane
+    :param prepends: How many more times the origin AS will prepend the first ASN to each neighbor, one dict per lane
+    :param blocked: bitsets with the lanes where each AS does not accept the announcement (loop or ROV)
+    :return: bitsets with the lanes where each AS accepted the announcement and the accepted routes
+    [(relationship, [(length, ASes, lanes), ...]), ...] in the order they were accepted
+    '''
+    n = len(topology)
+    bits, all_lanes = lane_masks(len(origins))
+    none = np.uint64(0)
+    accepted = np.zeros(n, dtype=np.uint64)
+    customer = np.zeros(n, dtype=np.uint64)
+    peer = np.zeros(n, dtype=np.uint64)
+
+    def rib_worse(nodes, rel:int, k:int):
+        # lanes where the route of the PrefixRIB is worse than the offer (rel, k)
+        current = rib.rel[nodes]
+        worse = (current > rel) | ((current == rel) & (rib.length[nodes] > k))
+        return np.where(worse, all_lanes, none)
+
+    def join(entries:list):
+        return or_offers(n, np.concatenate([r for r, b in entries]), np.concatenate([b for r, b in entries]))
+
+    def origin_offers(rel:int, levels:dict):
+        for lane, origin in enumerate(origins):
+            receivers = topology.neighbors_by_rel(origin, rel).astype(np.int64)
+            lengths = origin_lengths(topology, receivers, asps[lane], prepends[lane])
+            for k in np.unique(lengths).tolist():
+                sel = receivers[lengths == k]
+                levels.setdefault(k, list()).append((sel, np.full(len(sel), bits[lane], dtype=np.uint64)))
+        return levels
+
+    def offers_from(entries:list, rel:int, levels:dict):
+        # entries [(length, nodes, lanes), ...] announced to the neighbors <rel> with length + 1
+        for k, nodes, lanes_bits in entries:
+            senders, receivers = topology.gather(nodes, rel)
+            if len(receivers) > 0:
+                pos = np.searchsorted(nodes, senders)
+                levels.setdefault(k + 1, list()).append((receivers.astype(np.int64), lanes_bits[pos]))
+        return levels
+
+    def by_length(levels:dict, rel:int, next_rel):
+        routes = list()
+        while len(levels) > 0:
+            k = min(levels.keys())
+            nodes, offers = join(levels.pop(k))
+            offers &= ~accepted[nodes] & ~blocked[nodes] & rib_worse(nodes, rel, k)
+            sel = offers != 0
+            nodes = nodes[sel]
+            offers = offers[sel]
+            if len(nodes) == 0:
+                continue
+            accepted[nodes] |= offers
+            routes.append((k, nodes, offers))
+            if next_rel is not None:
+                offers_from([(k, nodes, offers)], next_rel, levels)
+        return routes
+
+    # Stage 1: customer routes up
+    customer_routes = by_length(origin_offers(PROVIDER, dict()), CUSTOMER, PROVIDER)
+    for k, nodes, offers in customer_routes:
+        customer[nodes] |= offers
+    # Stage 2: one hop across peers and siblings
+    peer_routes = by_length(offers_from(customer_routes, PEER, origin_offers(PEER, dict())), PEER, None)
+    for k, nodes, offers in peer_routes:
+        peer[nodes] |= offers
+    sibling_routes = by_length(offers_from(customer_routes, SIBLING, dict()), SIBLING, None)
+    # Stage 3: provider routes down
+    levels = offers_from(customer_routes + peer_routes, CUSTOMER, origin_offers(CUSTOMER, dict()))
+    provider_routes = by_length(levels, PROVIDER, CUSTOMER)
+    # Siblings of ASes with provider or peer routes (replace provider routes and longer sibling routes)
+    levels = offers_from(peer_routes + provider_routes, SIBLING, dict())
+    shorter = np.zeros(n, dtype=np.uint64)
+    pending = list(sibling_routes)
+    final_routes = list()
+    while len(levels) > 0:
+        k = min(levels.keys())
+        for s_k, nodes, offers in pending:
+            if s_k <= k:
+                shorter[nodes] |= offers
+        pending = [entry for entry in pending if entry[0] > k]
+        nodes, offers = join(levels.pop(k))
+        offers &= ~blocked[nodes] & ~customer[nodes] & ~peer[nodes] & ~shorter[nodes]
+        offers &= accepted[nodes] | rib_worse(nodes, SIBLING, k)
+        sel = offers != 0
+        nodes = nodes[sel]
+        offers = offers[sel]
+        if len(nodes) > 0:
+            accepted[nodes] |= offers
+            shorter[nodes] |= offers
+            final_routes.append((k, nodes, offers))
+    return accepted, [(CUSTOMER, customer_routes), (PEER, peer_routes), (SIBLING, sibling_routes),
+                      (PROVIDER, provider_routes), (SIBLING, final_routes)]
+
+
+def lane_blocked(topology, origins, asps:list, rov=None, valid=None):
+    '''
+    Bitsets with the lanes where each AS does not accept the announcement
+    :return: bitsets of the loops (AS in the announced AS path) and bitsets of the loops or ROV
+    '''
+    bits, all_lanes = lane_masks(len(origins))
+    loop = np.zeros(len(topology), dtype=np.uint64)
+    for lane, asp in enumerate(asps):
+        idx = topology.get_indexes(asp)
+        np.bitwise_or.at(loop, idx[idx >= 0], bits[lane])
+    blocked = loop.copy()
+    if rov is not None and valid is not None and not all(valid):
+        blocked[rov] |= np.bitwise_or.reduce(bits[~np.asarray(valid, dtype=bool)])
+    return loop, blocked
+
+
+def hijack_lanes(topology, rib, origins, asps:list, rov=None, valid=None, ignore_model_sometimes:bool=True):
+    '''
+    Propagate up to 64 hijacks of the same prefix at once over the legitimate routes of a PrefixRIB (lane_stages
+    and ignore_model_lanes), the results of each lane are the same of three_stage and ignore_model, but without the
+    next hops the AS paths are not available.
+    :param topology: Topology object
+    :param rib: PrefixRIB with the legitimate routes (not changed)
+    :param origins: array with the index of the hijacker of each lane
+    :param asps: AS path announced by each hijacker
+    :param rov: boolean mask with the ASes with ROV enabled (None if no AS validates the routes)
+    :param valid: list with the ROA validity of the announcement of each lane
+    :param ignore_model_sometimes: give routes ignoring the Gao-Rexford model after the propagation (ignore_model)
+    :return: bitsets with the lanes where each AS has a hijacked route and where it learned it from a customer
+    '''
+    bits, all_lanes = lane_masks(len(origins))
+    loop, blocked = lane_blocked(topology, origins, asps, rov, valid)
+    hijacked, routes = lane_stages(topology, rib, origins, asps, [dict()] * len(origins), blocked)
+    customer = np.zeros(len(topology), dtype=np.uint64)
+    for k, nodes, offers in routes[0][1]:
+        customer[nodes] |= offers
+    if ignore_model_sometimes:
+        ignore_model_lanes(topology, rib, hijacked, customer, loop, all_lanes)
+    return hijacked, customer
+
+
+def legit_lanes(topology, ribs:list, origins, prepends:list, rov=None, valid=None):
+    '''
+    Propagate up to 64 legitimate announcements (one per victim) at once, each one to its own empty PrefixRIB
+    (lane_stages), the routes are the same of three_stage. The next hops are not set (-1), use resolve_next_hops
+    before rebuilding AS paths or announcing other routes to the prefix.
+    :param topology: Topology object
+    :param ribs: list with one empty PrefixRIB per lane (changed in place)
+    :param origins: array with the index of the AS announcing the prefix in each lane
+    :param prepends: How many more times the origin AS will prepend the first ASN to each neighbor, one dict per lane
+    :param rov: boolean mask with the ASes with ROV enabled (None if no AS validates the routes)
+    :param valid: list with the ROA validity of the announcement of each lane
+    :return: None
+    '''
+    lanes = len(origins)
+    n = len(topology)
+    shift = np.arange(lanes, dtype=np.uint64)
+    asps = [[topology.get_asn(origin)] for origin in origins]
+    loop, blocked = lane_blocked(topology, origins, asps, rov, valid)
+    accepted, routes = lane_stages(topology, PrefixRIB(None, n), origins, asps, prepends, blocked)
+    # one row per lane
+    rel = np.full((lanes, n), NO_ROUTE, dtype=np.int8)
+    length = np.zeros((lanes, n), dtype=np.int32)
+    for route_rel, entries in routes:
+        for k, nodes, offers in entries:
+            idx, cols = np.nonzero((offers[:, None] >> shift) & np.uint64(1))
+            rel[cols, nodes[idx]] = route_rel
+            length[cols, nodes[idx]] = k
+    for lane, rib in enumerate(ribs):
+        origin = int(origins[lane])
+        rib.rel = rel[lane].copy()
+        rib.length = length[lane].copy()
+        rib.add_announce(origin, asps[lane], prepends[lane])
+        rib.origin[rib.has_route()] = origin
+
+
+def resolve_next_hops(topology, rib):
+    '''
+    Choose the next hop of the routes propagated by legit_lanes (routes without next hop): the neighbor with the
+    lowest index that announced the route (AS path one hop shorter and a route exported in the same stage), the same
+    choice of three_stage. Routes added later by ignore_model already have next hops and are not announcers.
+    :param topology: Topology object
+    :param rib: PrefixRIB with the routes of only one announcement (changed in place)
+    :return: number of next hops chosen
+    '''
+    unresolved = rib.has_route() & (rib.next_hop < 0)
+    if not unresolved.any():
+        return 0
+    origin, (asp, prepend_origin) = next(iter(rib.announces.items()))
+    # (relationship of the route, relationship of the receiver seen by the sender, routes exported by the sender)
+    # siblings get the routes of stage 2 (customer) before the routes of stage 3 (peer and provider)
+    exports = ((CUSTOMER, PROVIDER, (CUSTOMER,)), (PEER, PEER, (CUSTOMER,)), (PROVIDER, CUSTOMER, (CUSTOMER, PEER, PROVIDER)),
+               (SIBLING, SIBLING, (CUSTOMER,)), (SIBLING, SIBLING, (PEER, PROVIDER)))
+    for rel, back, exported in exports:
+        senders = np.nonzero(unresolved & np.isin(rib.rel, exported))[0]
+        if rel != SIBLING:
+            senders = np.append(senders, origin)
+        senders, receivers = topology.gather(senders, back)
+        receivers = receivers.astype(np.int64)
+        ok = (rib.rel[receivers] == rel) & (rib.next_hop[receivers] < 0)
+        senders = senders[ok]
+        receivers = receivers[ok]
+        expected = rib.length[senders] + 1
+        at_origin = senders == origin
+        if at_origin.any():
+            expected[at_origin] = origin_lengths(topology, receivers[at_origin], asp, prepend_origin)
+        ok = rib.length[receivers] == expected
+        # the sender with the lowest index
+        keys = np.sort(receivers[ok] * len(topology) + senders[ok])
+        receivers = keys // len(topology)
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = receivers[1:] != receivers[:-1]
+        rib.next_hop[receivers[first]] = keys[first] % len(topology)
+    return int(unresolved.sum())
+
+
+def ignore_model_lanes(topology, rib, hijacked, customer, loop, all_lanes):
+    '''
+    ignore_model for the lanes of hijack_lanes (the bitsets hijacked and customer are changed in place)
+    :param topology: Topology object
+    :param rib: PrefixRIB with the legitimate routes
+    :param hijacked: bitsets with the lanes where each AS has a hijacked route
+    :param customer: bitsets with the lanes where each AS learned the hijacked route from a customer
+    :param loop: bitsets with the lanes where each AS is in the hijacked AS path
+    :param all_lanes: bitset with all lanes
+    :return: number of rounds executed
+    '''
+    n = len(topology)
+    none = np.uint64(0)
+    # ASes in the legitimate AS paths do not accept legitimate routes
+    legit_loop = np.zeros(n, dtype=bool)
+    for origin, (asp, prepend_origin) in rib.announces.items():
+        idx = topology.get_indexes(asp)
+        legit_loop[idx[idx >= 0]] = True
+    routed = np.where(rib.has_route(), all_lanes, none) | hijacked
+    customer_rank = IGNORE_MODEL_ORDER.index(CUSTOMER)
+    rounds = 0
+    pending = np.nonzero(routed != all_lanes)[0]
+    while len(pending) > 0:
+        receivers = list()
+        senders = list()
+        ranks = list()
+        for rank, rel in enumerate(IGNORE_MODEL_ORDER):
+            r, s = topology.gather(pending, rel)
+            receivers.append(r)
+            senders.append(s.astype(np.int64))
+            ranks.append(np.full(len(r), rank, dtype=np.int64))
+        receivers = np.concatenate(receivers)
+        senders = np.concatenate(senders)
+        ranks = np.concatenate(ranks)
+        # the same order of ignore_model: receiver, neighbor preference and neighbor index
+        order = np.argsort((receivers * len(IGNORE_MODEL_ORDER) + ranks) * n + senders)
+        receivers = receivers[order]
+        senders = senders[order]
+        ranks = ranks[order]
+        from_hijack = hijacked[senders]
+        valid = routed[senders] & ~routed[receivers] & all_lanes
+        valid &= ~((from_hijack & loop[receivers]) | np.where(legit_loop[receivers], ~from_hijack, none))
+        # the first valid neighbor of each receiver in each lane
+        starts = np.ones(len(receivers), dtype=bool)
+        starts[1:] = receivers[1:] != receivers[:-1]
+        segment = np.cumsum(starts) - 1
+        pos = np.arange(len(receivers)) - np.nonzero(starts)[0][segment]
+        taken = np.zeros(int(segment[-1]) + 1 if len(segment) > 0 else 0, dtype=np.uint64)
+        chosen = np.zeros(len(receivers), dtype=np.uint64)
+        for p in range(int(pos.max()) + 1 if len(pos) > 0 else 0):
+            sel = np.nonzero(pos == p)[0]
+            chosen[sel] = valid[sel] & ~taken[segment[sel]]
+            taken[segment[sel]] |= valid[sel]
+        sel = chosen != 0
+        if not sel.any():
+            break
+        rounds += 1
+        receivers = receivers[sel]
+        chosen = chosen[sel]
+        np.bitwise_or.at(routed, receivers, chosen)
+        np.bitwise_or.at(hijacked, receivers, chosen & from_hijack[sel])
+        np.bitwise_or.at(customer, receivers[ranks[sel] == customer_rank],
+                         (chosen & from_hijack[sel])[ranks[sel] == customer_rank])
+        # ASes without route in some lane connected to the ASes that got a route in this round
+        pending = np.unique(np.concatenate([topology.gather(np.unique(receivers), rel)[1]
+                                            for rel in IGNORE_MODEL_ORDER])).astype(np.int64)
+        pending = pending[routed[pending] != all_lanes]
+    return rounds
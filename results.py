@@ -0,0 +1,663 @@
+import os
+import gzip
+import random
+import pickle as pk
+from glob import glob
+import numpy as np
+import pandas as pd
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Columns of Graph.text_report (one line per hijack scenario)
+REPORT_COLUMNS = ['Prefix_leg', 'Leg_ASN', 'Description_leg', 'Country_leg', 'Continent_leg', 'Customer_leg',
+                  'Providers_leg', 'Peers_leg', 'Degree_leg', 'ROA', 'Prefix_hjk', 'Hijacker', 'Description_hjk',
+                  'Country_hjk', 'Continent_hjk', 'Customer_hjk', 'Providers_hjk', 'Peers_hjk', 'Degree_hjk',
+                  'Forged_AS_path', 'Type', 'Total_ASes', 'Contaminated_ASes', 'VPs_observ_hjk', 'ROV']
+# Columns of Graph.export_hijack_as_paths with the ASNs of the scenario (one line per hijacked AS path)
+ASP_COLUMNS = ['Leg_ASN', 'Hijacker', 'Prefix', 'AS_path', 'Type', 'Sequence']
+# Types of the columns in the columnar files: 'int', 'str', 'category' or 'list' (list of int)
+REPORT_TYPES = dict(zip(REPORT_COLUMNS, ['str', 'int', 'str', 'str', 'str', 'int', 'int', 'int', 'int', 'category',
+                                         'str', 'int', 'str', 'str', 'str', 'int', 'int', 'int', 'int', 'list', 'int',
+                                         'int', 'int', 'int', 'int']))
+ASP_TYPES = {'Leg_ASN': 'int', 'Hijacker': 'int', 'Prefix': 'str', 'AS_path': 'list', 'Type': 'category',
+             'Sequence': 'list'}
+# Output formats and the extension of the files
+FORMATS = {'csv': '.csv', 'parquet': '.parquet', 'npz': '.npz'}
+# File extension added by each compression
+COMPRESSIONS = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+# Fields of the hijack event log (one event per hijacked route accepted by an AS, see HijackLog)
+EVENT_COLUMNS = ['ASN', 'Prefix', 'Accept_by', 'Old_length', 'New_length', 'Prepend']
+# Reasons returned by AS.preference, saved as codes in the binary event log
+ACCEPT_BY = ['New prefix', 'Customer', 'Peer', 'Shortest AS path']
+# Record of the binary event log (Old_length = -1 when the AS had no route to the prefix)
+EVENT_DTYPE = np.dtype([('ASN', '<i8'), ('Prefix', 'S18'), ('Accept_by', 'i1'), ('Old_length', '<i2'),
+                        ('New_length', '<i2'), ('Prepend', '<i2')])
+# Formats of the event log and the extension of the files
+EVENT_FORMATS = {'text': '.log', 'csv': '.csv', 'binary': '.bin'}
+# Version of the campaign journal (journals of other versions are not resumed)
+JOURNAL_VERSION = 1
+
+
+def open_text(outfile:str, compression:str=None):
+    '''
+    Open a text file to write, compressed or not
+    :param outfile: file name (the extension of the compression is added)
+    :param compression: None, 'gzip' or 'zstd' (needs the zstandard package)
+    :return: file object
+    '''
+    if compression not in COMPRESSIONS.keys():
+        raise ValueError('Compression {} not supported, use one of {}.'.format(compression, list(COMPRESSIONS.keys())))
+    outfile += COMPRESSIONS[compression]
+    if compression == 'gzip':
+        return gzip.open(outfile, 'wt')
+    elif compression == 'zstd':
+        if zstandard is None:
+            raise ImportError('Install the zstandard package to write zstd files.')
+        return zstandard.open(outfile, 'wt')
+    return open(outfile, 'w')
+
+
+class ResultSink:
+    def __init__(self, outfile:str, columns:list=REPORT_COLUMNS, compression:str=None, batch_size:int=1000):
+        '''
+        Write records to a semicolon CSV file (the same format of Graph.text_report). The records are kept in memory
+        and written in batches of lines, the file is opened only once.
+        :param outfile: file to save the records
+        :param columns: names of the columns (header)
+        :param compression: None, 'gzip' or 'zstd'
+        :param batch_size: number of records kept in memory before writing them
+        '''
+        self.outfile = outfile
+        self.columns = columns
+        self.batch_size = batch_size
+        self.buffer = list()
+        self.records = 0
+        self.out = open_text(outfile, compression)
+        self.out.write(';'.join(columns) + '\n')
+
+
+    def write(self, record:list):
+        '''
+        Add one record (a list with one value per column)
+        :param record: list
+        :return: None
+        '''
+        self.buffer.append(';'.join('{}'.format(value) for value in record))
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+
+    def write_many(self, records:list):
+        for record in records:
+            self.write(record)
+
+
+    def flush(self):
+        '''
+        Write the records kept in memory
+        :return: None
+        '''
+        if len(self.buffer) > 0:
+            self.out.write('\n'.join(self.buffer) + '\n')
+            self.records += len(self.buffer)
+            self.buffer.clear()
+        self.out.flush()
+
+
+    def close(self):
+        if self.out is not None:
+            self.flush()
+            self.out.close()
+            self.out = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ReportSink:
+    def __init__(self, outfile:str, compression:str=None, export_asp:bool=True, batch_size:int=1000,
+                 file_format:str='csv'):
+        '''
+        Single writer of a simulation campaign: the report of each scenario goes to outfile and the hijacked AS paths
+        to one file per type of forged AS path (outfile_as-path_type-X.csv), created when the first AS path arrives
+        :param outfile: file to save the reports (must end with .csv, the extension changes with the format)
+        :param compression: None, 'gzip' or 'zstd'
+        :param export_asp: save the hijacked AS paths
+        :param batch_size: number of records kept in memory before writing them (csv)
+        :param file_format: 'csv', 'parquet' or 'npz' (see ColumnarSink)
+        '''
+        if file_format not in FORMATS.keys():
+            raise ValueError('Format {} not supported, use one of {}.'.format(file_format, list(FORMATS.keys())))
+        self.outfile = (outfile[:-len('.csv')] if outfile.endswith('.csv') else outfile)
+        self.compression = compression
+        self.export_asp = export_asp
+        self.batch_size = batch_size
+        self.file_format = file_format
+        self.report = self.create_sink(self.outfile, REPORT_COLUMNS, REPORT_TYPES)
+        self.asp = dict()
+
+
+    def create_sink(self, name:str, columns:list, types:dict):
+        '''
+        Create the writer of one file
+        :param name: file name without extension
+        :param columns: names of the columns
+        :param types: types of the columns (only for columnar formats)
+        :return: ResultSink or ColumnarSink object
+        '''
+        if self.file_format == 'csv':
+            return ResultSink(name + FORMATS['csv'], columns, self.compression, self.batch_size)
+        return ColumnarSink(name + FORMATS[self.file_format], columns, types, self.file_format, self.compression)
+
+
+    def add(self, results:list):
+        '''
+        Write the results of a task
+        :param results: a list of [report record, hijacked AS paths] (see Graph.report_record and
+        Graph.hijacked_as_paths)
+        :return: None
+        '''
+        for record, asps in results:
+            if record is None:
+                continue
+            self.report.write(record)
+            if not self.export_asp or len(asps) == 0:
+                continue
+            asp_type = record[REPORT_COLUMNS.index('Type')]
+            if asp_type not in self.asp.keys():
+                self.asp[asp_type] = self.create_sink('{}_as-path_type-{}'.format(self.outfile, asp_type), ASP_COLUMNS,
+                                                      ASP_TYPES)
+            asn_leg = record[REPORT_COLUMNS.index('Leg_ASN')]
+            asn_hjk = record[REPORT_COLUMNS.index('Hijacker')]
+            for asp in asps:
+                self.asp[asp_type].write([asn_leg, asn_hjk] + list(asp))
+
+
+    def close(self):
+        self.report.close()
+        for sink in self.asp.values():
+            sink.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def encode_columns(records:list, columns:list, types:dict):
+    '''
+    Convert records to typed NumPy arrays (one entry per column, the lists are flattened with offsets and the
+    categories are stored as codes)
+    :param records: list of records (one value per column)
+    :param columns: names of the columns
+    :param types: a dict {column: 'int', 'str', 'category' or 'list'}
+    :return: a dict {column: array}, {column: (values, offsets)} or {column: (codes, categories)}
+    '''
+    encoded = dict()
+    for k, column in enumerate(columns):
+        values = [record[k] for record in records]
+        if types[column] == 'int':
+            encoded[column] = np.array(values, dtype=np.int64)
+        elif types[column] == 'str':
+            encoded[column] = np.array(['{}'.format(v) for v in values], dtype=str)
+        elif types[column] == 'category':
+            categories, codes = np.unique(np.array(['{}'.format(v) for v in values], dtype=str), return_inverse=True)
+            encoded[column] = (codes.astype(np.int32), categories)
+        else:
+            offsets = np.zeros(len(values) + 1, dtype=np.int64)
+            np.cumsum([len(v) for v in values], out=offsets[1:])
+            flat = [a for v in values for a in v]
+            encoded[column] = (np.array(flat, dtype=np.int64), offsets)
+    return encoded
+
+
+class ColumnarSink:
+    def __init__(self, outfile:str, columns:list=REPORT_COLUMNS, types:dict=REPORT_TYPES, file_format:str='parquet',
+                 compression:str=None, batch_size:int=100000):
+        '''
+        Write records with typed columns: 'parquet' (one file, one row group per batch, needs pyarrow) or 'npz'
+        (a folder with one NumPy file per batch). Read the files with read_columnar.
+        :param outfile: file (parquet) or folder (npz) to save the records
+        :param columns: names of the columns
+        :param types: a dict {column: 'int', 'str', 'category' or 'list'}
+        :param file_format: 'parquet' or 'npz'
+        :param compression: None, 'gzip' or 'zstd' (npz files are compressed with zlib if it is not None)
+        :param batch_size: number of records kept in memory before writing them
+        '''
+        if file_format not in ('parquet', 'npz'):
+            raise ValueError('Format {} not supported, use parquet or npz.'.format(file_format))
+        if file_format == 'parquet' and pa is None:
+            raise ImportError('Install the pyarrow package to write parquet files.')
+        if compression not in COMPRESSIONS.keys():
+            raise ValueError('Compression {} not supported, use one of {}.'.format(compression, list(COMPRESSIONS.keys())))
+        self.outfile = outfile
+        self.columns = columns
+        self.types = types
+        self.file_format = file_format
+        self.compression = compression
+        self.batch_size = batch_size
+        self.buffer = list()
+        self.records = 0
+        self.parts = 0
+        self.writer = None
+        if file_format == 'npz':
+            os.makedirs(outfile, exist_ok=True)
+            for part in glob(os.path.join(outfile, 'part-*.npz')):
+                os.remove(part)
+
+
+    def write(self, record:list):
+        self.buffer.append(record)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+
+    def write_many(self, records:list):
+        for record in records:
+            self.write(record)
+
+
+    def flush(self):
+        '''
+        Write the records kept in memory as a new row group (parquet) or part (npz)
+        :return: None
+        '''
+        if len(self.buffer) == 0:
+            return None
+        self.write_part(encode_columns(self.buffer, self.columns, self.types))
+        self.records += len(self.buffer)
+        self.buffer.clear()
+
+
+    def write_part(self, encoded:dict):
+        '''
+        Write encoded columns (see encode_columns) as a new row group (parquet) or part (npz)
+        :return: None
+        '''
+        if self.file_format == 'parquet':
+            table = self.to_table(encoded)
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.outfile, table.schema, compression=(self.compression or 'none'))
+            self.writer.write_table(table)
+        else:
+            arrays = {'__columns__': np.array(self.columns, dtype=str),
+                      '__types__': np.array([self.types[c] for c in self.columns], dtype=str)}
+            for column, value in encoded.items():
+                if self.types[column] == 'list':
+                    arrays[column + '.values'], arrays[column + '.offsets'] = value
+                elif self.types[column] == 'category':
+                    arrays[column + '.codes'], arrays[column + '.categories'] = value
+                else:
+                    arrays[column] = value
+            part = os.path.join(self.outfile, 'part-{:05d}.npz'.format(self.parts))
+            (np.savez_compressed if self.compression is not None else np.savez)(part, **arrays)
+        self.parts += 1
+
+
+    def to_table(self, encoded:dict):
+        '''
+        Arrow table with the encoded columns (see encode_columns)
+        '''
+        arrays = list()
+        for column in self.columns:
+            if self.types[column] == 'list':
+                values, offsets = encoded[column]
+                arrays.append(pa.LargeListArray.from_arrays(pa.array(offsets), pa.array(values)))
+            elif self.types[column] == 'category':
+                codes, categories = encoded[column]
+                arrays.append(pa.DictionaryArray.from_arrays(pa.array(codes), pa.array(categories.tolist())))
+            elif self.types[column] == 'str':
+                arrays.append(pa.array(encoded[column].tolist(), type=pa.string()))
+            else:
+                arrays.append(pa.array(encoded[column]))
+        return pa.Table.from_arrays(arrays, names=self.columns)
+
+
+    def close(self):
+        self.flush()
+        if self.parts == 0:
+            # a file with the columns and no rows
+            self.write_part(encode_columns([], self.columns, self.types))
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_columnar(path:str, columns:list=None):
+    '''
+    Read the records saved by ColumnarSink, only the columns selected are read from the files
+    :param path: parquet file or npz folder
+    :param columns: names of the columns to read (None = all)
+    :return: pandas DataFrame (lists are NumPy arrays and categories are pandas categoricals)
+    '''
+    if not os.path.isdir(path):
+        if pq is None:
+            raise ImportError('Install the pyarrow package to read parquet files.')
+        return pq.read_table(path, columns=columns).to_pandas()
+    data = dict()
+    types = dict()
+    for part in sorted(glob(os.path.join(path, 'part-*.npz'))):
+        with np.load(part) as npz:
+            names = npz['__columns__'].tolist()
+            types.update(zip(names, npz['__types__'].tolist()))
+            for column in (names if columns is None else columns):
+                if types[column] == 'list':
+                    values, offsets = npz[column + '.values'], npz[column + '.offsets']
+                    value = [values[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+                elif types[column] == 'category':
+                    value = npz[column + '.categories'][npz[column + '.codes']].tolist()
+                else:
+                    value = npz[column]
+                data.setdefault(column, list()).append(value)
+    df = pd.DataFrame({column: (np.concatenate(parts) if types[column] in ('int', 'str')
+                                else [v for part in parts for v in part]) for column, parts in data.items()})
+    for column in df.columns:
+        if types[column] == 'category':
+            df[column] = df[column].astype('category')
+    return df
+
+
+class HijackLog:
+    def __init__(self, outfile:str='hijacks', file_format:str='binary', sample:float=1.0, seed:int=None):
+        '''
+        Log of the hijacked routes accepted by the ASes (AS.add_route). The events only are kept in memory during the
+        propagation and they are written once per scenario (flush). Each process writes its own file
+        ({outfile}_{pid}.ext), so the processes of a Pool do not share a file. The files are not compressed, because
+        the processes of a Pool are terminated without closing them.
+        :param outfile: path and prefix of the file names
+        :param file_format: 'text' (the old hijacks_*.log lines), 'csv' (EVENT_COLUMNS) or 'binary' (records with
+        EVENT_DTYPE, read them with read_hijack_log)
+        :param sample: fraction of the events saved (1.0 = all)
+        :param seed: seed of the sample
+        '''
+        if file_format not in EVENT_FORMATS.keys():
+            raise ValueError('Format {} not supported, use one of {}.'.format(file_format, list(EVENT_FORMATS.keys())))
+        self.outfile = outfile
+        self.file_format = file_format
+        self.sample = sample
+        self.seed = seed
+        self.events = list()
+        self.pid = None
+        self.out = None
+        self.random = random.Random(seed)
+
+
+    def __getstate__(self):
+        # the file and the events are not sent to other processes
+        state = self.__dict__.copy()
+        state['events'] = list()
+        state['pid'] = None
+        state['out'] = None
+        return state
+
+
+    def record(self, asn:int, prefix, accept_by:str, old_asp, asp):
+        '''
+        Keep one event in memory (called in the propagation, the fields are computed in flush)
+        :param asn: ASN that accepted the hijacked route
+        :param prefix: Prefix object
+        :param accept_by: why the route was accepted (see AS.preference)
+        :param old_asp: AS path of the route replaced (None if the AS had no route to the prefix)
+        :param asp: AS path accepted
+        :return: None
+        '''
+        if self.sample < 1.0 and self.random.random() >= self.sample:
+            return
+        self.events.append((asn, prefix, accept_by, old_asp, asp))
+
+
+    def file_name(self):
+        '''
+        File of this process
+        :return: path (str)
+        '''
+        return '{}_{}{}'.format(self.outfile, os.getpid(), EVENT_FORMATS[self.file_format])
+
+
+    def open(self):
+        '''
+        Open the file of this process, the events inherited from other process (fork) are discarded
+        :return: None
+        '''
+        if self.pid == os.getpid():
+            return
+        self.pid = os.getpid()
+        if self.file_format == 'binary':
+            self.out = open(self.file_name(), 'wb')
+        elif self.file_format == 'csv':
+            self.out = ResultSink(self.file_name(), EVENT_COLUMNS, batch_size=float('inf'))
+        else:
+            self.out = open(self.file_name(), 'w')
+
+
+    def flush(self):
+        '''
+        Write the events of the scenario
+        :return: number of events written
+        '''
+        if self.pid is not None and self.pid != os.getpid():
+            self.events.clear()
+            self.pid = None
+        if len(self.events) == 0:
+            return 0
+        self.open()
+        nb_events = len(self.events)
+        if self.file_format == 'text':
+            lines = list()
+            for asn, prefix, accept_by, old_asp, asp in self.events:
+                if old_asp is None:
+                    old_asp, prep = [], ''
+                else:
+                    prep = 'Prepend x{}'.format(old_asp.count(old_asp[-1]) - 1)
+                lines.append('AS {} hijacked: prefix[{}] from [{}], old AS path {}, new AS path {}. {}'.
+                             format(asn, prefix, accept_by, old_asp, asp, prep))
+            self.out.write('\n'.join(lines) + '\n')
+            self.out.flush()
+        else:
+            records = [(asn, '{}'.format(prefix), accept_by, -1 if old_asp is None else len(old_asp), len(asp),
+                        0 if old_asp is None else old_asp.count(old_asp[-1]) - 1)
+                       for asn, prefix, accept_by, old_asp, asp in self.events]
+            if self.file_format == 'csv':
+                self.out.write_many(records)
+                self.out.flush()
+            else:
+                codes = {name: code for code, name in enumerate(ACCEPT_BY)}
+                array = np.array([(asn, prefix.encode(), codes.get(accept_by, -1), old, new, prep)
+                                  for asn, prefix, accept_by, old, new, prep in records], dtype=EVENT_DTYPE)
+                self.out.write(array.tobytes())
+                self.out.flush()
+        self.events.clear()
+        return nb_events
+
+
+    def close(self):
+        self.flush()
+        if self.out is not None and self.pid == os.getpid():
+            self.out.close()
+        self.out = None
+        self.pid = None
+
+
+def read_hijack_log(files):
+    '''
+    Read binary event logs written by HijackLog
+    :param files: file name, list of file names or glob pattern (e.g. 'hijacks_*.bin')
+    :return: pandas DataFrame with EVENT_COLUMNS
+    '''
+    if isinstance(files, str):
+        files = sorted(glob(files))
+    parts = [np.fromfile(file, dtype=EVENT_DTYPE) for file in files]
+    array = np.concatenate(parts) if len(parts) > 0 else np.zeros(0, dtype=EVENT_DTYPE)
+    df = pd.DataFrame({column: array[column] for column in EVENT_COLUMNS})
+    df['Prefix'] = df['Prefix'].str.decode('ascii')
+    df['Accept_by'] = pd.Categorical.from_codes(df['Accept_by'].astype(np.int64), ACCEPT_BY)
+    return df
+
+
+def journal_path(outfile:str):
+    '''
+    File of the campaign journal of a simulation (outfile without .csv + .journal)
+    :param outfile: file of the reports (see ReportSink)
+    :return: path (str)
+    '''
+    return (outfile[:-len('.csv')] if outfile.endswith('.csv') else outfile) + '.journal'
+
+
+class CampaignJournal:
+    def __init__(self, path:str, campaign:dict, resume:bool=False, sync:bool=True, units=None):
+        '''
+        Durable record of the completed units of a simulation campaign. A unit is a (victim, hijacker, forged AS path
+        type) of the campaign, the identity of the campaign (see campaign_id of the runners) is saved in the header of
+        the journal. Each task appends one pickle record with its units and results (add), so the reports can be
+        written again from the journal (replay) after a crash: the runner skips the completed units and only results of
+        units of the campaign not completed yet are accepted, so no report appears twice.
+        :param path: journal file (see journal_path)
+        :param campaign: a dict that identifies the campaign (snapshot, ROV configuration, ...), a journal of other
+        campaign is not resumed
+        :param resume: continue the journal if it exists (False = start a new one)
+        :param sync: call fsync after each record (the record survives a crash of the machine)
+        :param units: units (victim, hijacker, forged AS path type) of the campaign, the units of the journal out of
+        them are not completed, replayed or accepted (None = all units)
+        '''
+        self.path = path
+        self.campaign = dict(campaign)
+        self.sync = sync
+        self.units = (None if units is None else {tuple(unit) for unit in units})
+        self.completed = set()
+        self.records = 0
+        if not (resume and self.load()):
+            with open(path, 'wb') as f:
+                pk.dump({'version': JOURNAL_VERSION, 'campaign': self.campaign}, f)
+                f.flush()
+                os.fsync(f.fileno())
+        self.out = open(path, 'ab')
+
+
+    def read(self):
+        '''
+        Records of the journal file (a record cut by a crash ends the reading)
+        :return: generator of (file position after the record, units, results)
+        '''
+        with open(self.path, 'rb') as f:
+            pk.load(f)
+            while True:
+                try:
+                    units, results = pk.load(f)
+                except (EOFError, pk.UnpicklingError):
+                    break
+                yield f.tell(), units, results
+
+
+    def load(self):
+        '''
+        Read the completed units of an existing journal and remove a record cut by a crash
+        :return: True if the journal was loaded, False if it does not exist or its header is incomplete
+        '''
+        if not os.path.isfile(self.path):
+            return False
+        with open(self.path, 'rb') as f:
+            try:
+                header = pk.load(f)
+            except (EOFError, pk.UnpicklingError):
+                return False
+            end = f.tell()
+        if header.get('version') != JOURNAL_VERSION or header.get('campaign') != self.campaign:
+            raise ValueError('The journal {} belongs to other campaign {}, remove it or do not resume it.'.format(
+                self.path, header.get('campaign')))
+        for end, units, results in self.read():
+            self.completed.update(unit for unit in units if self.in_campaign(unit))
+            self.records += 1
+        if os.path.getsize(self.path) > end:
+            os.truncate(self.path, end)
+        return True
+
+
+    def pending(self, victim:int, hijacker:int, path:int):
+        return (victim, hijacker, path) not in self.completed
+
+
+    def in_campaign(self, unit):
+        return self.units is None or tuple(unit) in self.units
+
+
+    def campaign_results(self, results:list):
+        '''
+        Results of the units of the campaign
+        :param results: a list of [report record, hijacked AS paths] (see ReportSink.add)
+        :return: a list of (unit, [report record, hijacked AS paths])
+        '''
+        leg = REPORT_COLUMNS.index('Leg_ASN')
+        hjk = REPORT_COLUMNS.index('Hijacker')
+        asp_type = REPORT_COLUMNS.index('Type')
+        units = [(None if record is None else (record[leg], record[hjk], record[asp_type])) for record, asps in results]
+        return [(unit, result) for unit, result in zip(units, results) if unit is not None and self.in_campaign(unit)]
+
+
+    def add(self, units:list, results:list):
+        '''
+        Save the results of a task and mark its units as completed. Results of units completed before or out of the
+        campaign are dropped.
+        :param units: list of (victim, hijacker, forged AS path type) simulated by the task
+        :param results: a list of [report record, hijacked AS paths] (see ReportSink.add)
+        :return: the results accepted
+        '''
+        results = [result for unit, result in self.campaign_results(results) if unit not in self.completed]
+        units = [tuple(unit) for unit in units if tuple(unit) not in self.completed and self.in_campaign(unit)]
+        self.out.write(pk.dumps((units, results), protocol=pk.HIGHEST_PROTOCOL))
+        self.out.flush()
+        if self.sync:
+            os.fsync(self.out.fileno())
+        self.completed.update(units)
+        self.records += 1
+        return results
+
+
+    def replay(self, sink:ReportSink):
+        '''
+        Write the results saved in the journal (only the units of the campaign)
+        :param sink: ReportSink of the campaign
+        :return: number of records replayed
+        '''
+        records = 0
+        for end, units, results in self.read():
+            sink.add([result for unit, result in self.campaign_results(results)])
+            records += 1
+        return records
+
+
+    def close(self):
+        if self.out is not None:
+            self.out.close()
+            self.out = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,170 @@
+import numpy as np
+from topology import CUSTOMER, NOT_NEIGHBOR
+
+# Route class of ASes without route to the prefix (worse than any relationship)
+NO_ROUTE = 5
+
+
+class PrefixRIB:
+    def __init__(self, prefix, n:int):
+        '''
+        Routes of all ASes to one prefix kept as parallel arrays over the AS indexes of a Topology.
+        The AS path of a route is not stored, only the next hop, so the path is rebuilt following the next hops
+        until the AS that announced the prefix.
+        :param prefix: Prefix object
+        :param n: number of ASes in the topology
+        '''
+        self.prefix = prefix
+        self.next_hop = np.full(n, -1, dtype=np.int32)
+        self.length = np.zeros(n, dtype=np.int32)
+        self.rel = np.full(n, NO_ROUTE, dtype=np.int8)
+        self.origin = np.full(n, -1, dtype=np.int32)
+        self.hijack = np.zeros(n, dtype=bool)
+        # legitimate next hop of the ASes whose legitimate route was replaced by a hijacked route, so the legitimate
+        # AS paths of the other ASes can be rebuilt while the hijack is applied (see get_path)
+        self.legit_hop = np.full(n, -1, dtype=np.int32)
+        # origin index -> AS path announced by the origin (list) and prepends {neighbor ASN: times}
+        self.announces = dict()
+        self.undo_log = None
+
+
+    def __len__(self):
+        return len(self.next_hop)
+
+
+    def copy(self):
+        '''
+        Copy the routes to a new scenario
+        :return: PrefixRIB object
+        '''
+        new = PrefixRIB(self.prefix, 0)
+        new.next_hop = self.next_hop.copy()
+        new.length = self.length.copy()
+        new.rel = self.rel.copy()
+        new.origin = self.origin.copy()
+        new.hijack = self.hijack.copy()
+        new.legit_hop = self.legit_hop.copy()
+        new.announces = dict(self.announces)
+        return new
+
+
+    def add_announce(self, origin:int, asp:list, prepend_origin:dict):
+        '''
+        Register the AS path announced by an origin (used to rebuild the AS paths)
+        :param origin: index of the AS that announces the prefix
+        :param asp: AS path announced (the origin ASN and the forged AS path if it is a hijack)
+        :param prepend_origin: How many more times the origin AS will prepend the first ASN to each neighbor
+        :return: None
+        '''
+        if self.undo_log is not None:
+            self.undo_log.append(('announce', origin, self.announces.get(origin)))
+        self.announces[origin] = (list(asp), dict(prepend_origin))
+
+
+    def set_routes(self, idx, next_hop, length, rel, origin, hijack:bool):
+        '''
+        Replace the routes of some ASes
+        :param idx: array with AS indexes
+        :param next_hop: array (or value) with the next hop indexes
+        :param length: array (or value) with the AS path lengths
+        :param rel: array (or value) with the relationship of the next hop (CUSTOMER, PEER, SIBLING or PROVIDER)
+        :param origin: array (or value) with the index of the AS that announced the route
+        :param hijack: the routes are to a hijacked prefix
+        :return: None
+        '''
+        if self.undo_log is not None:
+            self.undo_log.append(('routes', idx, self.next_hop[idx], self.length[idx], self.rel[idx],
+                                  self.origin[idx], self.hijack[idx], self.legit_hop[idx]))
+        if hijack:
+            legit = ~self.hijack[idx] & (self.rel[idx] != NO_ROUTE)
+            self.legit_hop[idx] = np.where(legit, self.next_hop[idx], self.legit_hop[idx])
+        self.next_hop[idx] = next_hop
+        self.length[idx] = length
+        self.rel[idx] = rel
+        self.origin[idx] = origin
+        self.hijack[idx] = hijack
+
+
+    def checkpoint(self):
+        '''
+        Start recording the replaced routes (see Graph.checkpoint)
+        :return: None
+        '''
+        self.undo_log = list()
+
+
+    def rollback(self):
+        '''
+        Restore the routes replaced since the checkpoint
+        :return: number of routes restored
+        '''
+        changes = 0
+        if self.undo_log is None:
+            return changes
+        for entry in reversed(self.undo_log):
+            if entry[0] == 'announce':
+                if entry[2] is None:
+                    self.announces.pop(entry[1], None)
+                else:
+                    self.announces[entry[1]] = entry[2]
+            else:
+                _, idx, next_hop, length, rel, origin, hijack, legit_hop = entry
+                self.next_hop[idx] = next_hop
+                self.legit_hop[idx] = legit_hop
+                self.length[idx] = length
+                self.rel[idx] = rel
+                self.origin[idx] = origin
+                self.hijack[idx] = hijack
+                changes += len(idx)
+        self.undo_log.clear()
+        return changes
+
+
+    def has_route(self):
+        '''
+        :return: boolean mask with the ASes that have a route to the prefix
+        '''
+        return self.rel != NO_ROUTE
+
+
+    def hijacked(self):
+        '''
+        :return: boolean mask with the ASes that have a route to the hijacked prefix
+        '''
+        return self.hijack & (self.rel != NO_ROUTE)
+
+
+    def hijacked_from_customer(self):
+        '''
+        :return: boolean mask with the ASes that learned the hijacked route from a customer
+        '''
+        return self.hijack & (self.rel == CUSTOMER)
+
+
+    def get_path(self, topology, i:int):
+        '''
+        Rebuild the AS path received by an AS (same format stored by AS.add_route). A legitimate route is rebuilt over
+        the legitimate next hops, also through the ASes that have a hijacked route now.
+        :param topology: Topology object used to create the RIB
+        :param i: AS index
+        :return: AS path (list), empty if the AS has no route
+        '''
+        path = list()
+        if self.rel[i] == NO_ROUTE or self.rel[i] == NOT_NEIGHBOR:
+            return path
+        origin = self.origin[i]
+        hijack = self.hijack[i]
+        j = i
+        # the loop is bounded by the number of ASes in case of inconsistent next hops
+        for _ in range(len(self.next_hop)):
+            next_hop = (self.next_hop[j] if hijack or not self.hijack[j] else self.legit_hop[j])
+            if next_hop == origin:
+                asp, prepend_origin = self.announces[origin]
+                if len(asp) == 1:
+                    path += asp * (1 + prepend_origin.get(topology.get_asn(j), 0))
+                else:
+                    path += asp
+                return path
+            path.append(topology.get_asn(next_hop))
+            j = next_hop
+        return path
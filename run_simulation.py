@@ -1,11 +1,16 @@
 import os
+import hashlib
 from time import time
 import pickle as pk
 import pandas as  pd
 from multiprocessing import Pool
-from copy import deepcopy
 from graph import Graph
-from tools import Hijackers
+from tools import Hijackers, Scheduler
+from results import ReportSink, HijackLog, CampaignJournal, journal_path
+from baselines import BaselineCache
+from metrics import PropagationMetrics
+from profiling import ScenarioProfiler
+from asrel import cache_as_rel
 from get_rovista_data import ases_rov
 from urllib.request import urlretrieve
 
@@ -14,6 +19,10 @@ from urllib.request import urlretrieve
 if not os.path.isdir('./logs'):
     os.mkdir('./logs')
 logs = open('./logs/execution.log','w')
+# Graph used by the processes of the Pool when the arrays are in shared memory (see init_worker)
+worker_internet = None
+# profiling.ScenarioProfiler of the processes of the Pool (None = profiling disabled)
+worker_profiler = None
 
 
 def get_caida_file(date:str, folder:str):
@@ -21,23 +30,24 @@ def get_caida_file(date:str, folder:str):
     Get AS relationship file from CAIDA
     :param date: Date (YYYY-MM-DD)
     :param file: where it will be saved
-    :return: file name
+    :return: path to the binary cache of the file (see asrel.py)
     '''
     date = date.replace('-', '')
     file = '{}/{}.as-rel2.txt.bz2'.format(folder, date)
     if not os.path.isfile(file):
         url = 'https://publicdata.caida.org/datasets/as-relationships/serial-2/{}.as-rel2.txt.bz2'.format(date)
         urlretrieve(url, file)
-    return file
+    return cache_as_rel(file)
 
 
-def load_internet(input_file:str):
+def load_internet(input_file:str, rib_backend:str='dict'):
     '''
     Load information from the file and create a Graph object
-    :param input_file: file (AS relationship from CAIDA)
+    :param input_file: file (AS relationship from CAIDA) or its binary cache folder
+    :param rib_backend: 'dict' or 'arrays' (see Graph)
     :return: Graph object
     '''
-    internet = Graph(override=False,debug=False)
+    internet = Graph(override=False,debug=False,rib_backend=rib_backend)
     start = time()
     internet.add_connections(input_file=input_file)
     print("Load the connections took {:.4f} seconds".format(time() - start))
@@ -46,23 +56,40 @@ def load_internet(input_file:str):
 
 
 def run_analise(internet:Graph, victim:int, prefix:str, hijackers:list, outfile:str, type0:bool=True,
-                type1:bool=True, roa:bool=True):
+                type1:bool=True, roa:bool=True, algorithm:str='flood', baseline:bool=False,
+                prune:bool=True):
     '''
     Run the simulation and save the results in a file
     :param internet: Graph object used to base for the simulation
     :param victim: AS victim
     :param prefix: IPv4 prefix (legitimate and hijacked)
     :param hijackers: list of ASN hijackers
-    :param outfile: path and name of the file to save simulation information
+    :param outfile: path and name of the file to save simulation information (None to return the results)
     :param type0: run Type-0 hijack simulations
     :param type1: run Type-1 hijack simulations
     :param roa: Enable ROA (Route Origin Authorization) from AS victim
-    :return:
+    :param algorithm: propagation algorithm used by Graph.route_propagate ('flood' or 'three_stage')
+    :param baseline: only start from the legitimate routes saved by Graph.legit_batch (otherwise the legitimate routes
+    are loaded from the cache of baselines of the Graph or propagated and saved in the cache)
+    :param prune: skip the propagation of the hijacks that provably contaminate no AS (see Graph.prune_hijack)
+    :return: a list of [report record, hijacked AS paths of the VPs] (empty if outfile is not None)
     '''
-    added = internet.add_prefix(victim, prefix, roa)
+    results = list()
+    pruned = 0
+    scenarios = 0
+    loaded = internet.load_baseline(victim, prefix, roa, algorithm=algorithm)
+    if loaded or baseline:
+        added = loaded
+    else:
+        added = internet.add_prefix(victim, prefix, roa)
     if added:
-        internet.route_propagate(victim, hijack=False, ignore_model_sometimes=True)
+        if not loaded:
+            internet.route_propagate(victim, hijack=False, ignore_model_sometimes=True, algorithm=algorithm)
+            internet.save_baseline(victim, prefix, roa, algorithm=algorithm)
+            internet.emit_metrics(victim=victim, prefix=prefix, hijacker=None, forged_path=None)
         prefixes_hjk = prefix
+        # Hijacks run in place on the converged legitimate routes and are undone after the report
+        internet.checkpoint()
         for i, asn_hjk in enumerate(hijackers):
             fakes_asp = list()
             if type0:
@@ -74,19 +101,176 @@ def run_analise(internet:Graph, victim:int, prefix:str, hijackers:list, outfile:
             print("[{}]Route from AS{} propagated in {:.4f} seconds.".format(victim,victim, time() - start))
             print("[{}]Route from AS{} propagated in {:.4f} seconds.".format(victim,victim, time() - start), file=logs)
             for fake_asp in fakes_asp:
-                inter2 = deepcopy(internet)
                 print('[{}]####### Forged AS path: {}'.format(victim, fake_asp))
                 # Make prefix hijack
-                inter2.hijack(asn_hjk, prefixes_hjk, fake_asp)
+                internet.hijack(asn_hjk, prefixes_hjk, fake_asp)
                 start = time()
-                inter2.route_propagate(asn_hjk, hijack=True, ignore_model_sometimes=True)
+                scenarios += 1
+                if prune and internet.prune_hijack(asn_hjk, algorithm=algorithm):
+                    pruned += 1
+                else:
+                    internet.route_propagate(asn_hjk, hijack=True, ignore_model_sometimes=True, algorithm=algorithm)
                 print("[{}]Hijack route from AS{} propagated in {:.4f} seconds".format(victim, asn_hjk, time() - start,))
                 print("[{}]Hijack route from AS{} propagated in {:.4f} seconds".format(victim, asn_hjk, time() - start, ), file=logs)
-                inter2.text_report(outfile, export_asp=True)
-                del inter2
-                #inter2.restart_graph()
+                with internet.timer('report'):
+                    if outfile is None:
+                        results.append([internet.report_record(), internet.hijacked_as_paths(internet.vps_hjk)])
+                    else:
+                        internet.text_report(outfile, export_asp=True)
+                with internet.timer('rollback'):
+                    internet.rollback()
+                internet.emit_metrics(victim=victim, prefix=prefix, hijacker=asn_hjk, forged_path=fake_asp)
+        internet.clear_checkpoint()
+        print('[{}]{} of {} hijack scenarios pruned by their bounds.'.format(victim, pruned, scenarios))
+        print('[{}]{} of {} hijack scenarios pruned by their bounds.'.format(victim, pruned, scenarios), file=logs)
     else:
         print('Fail to run the simulation with AS{} as victim.'.format(victim))
+    return results
+
+
+def run_analise_batch(internet:Graph, analyse:list, hijackers:list, outfile_tmp:str, type0:bool=True,
+                      type1:bool=True, roa:bool=True, algorithm:str='flood'):
+    '''
+    Propagate the legitimate routes of many victims at once (Graph.legit_batch) and run the simulations of each
+    victim from the saved routes (needs a Graph with rib_backend='arrays')
+    :param internet: Graph object used to base for the simulation
+    :param analyse: list of [victim, prefix]
+    :param hijackers: list of ASN hijackers
+    :param outfile_tmp: path and name of the files to save simulation information ({} is replaced by the victim),
+    None to return the results
+    :param type0: run Type-0 hijack simulations
+    :param type1: run Type-1 hijack simulations
+    :param roa: Enable ROA (Route Origin Authorization) from AS victim
+    :param algorithm: propagation algorithm used by Graph.route_propagate ('flood' or 'three_stage')
+    :return: a list of [report record, hijacked AS paths of the VPs] (empty if outfile_tmp is not None)
+    '''
+    results = list()
+    start = time()
+    with internet.timer('legit_batch'):
+        internet.legit_batch(analyse, roa=roa)
+    internet.emit_metrics(victim=[asn for asn, prefix in analyse], prefix=None, hijacker=None, forged_path=None)
+    print("Routes from {} victims propagated in {:.4f} seconds.".format(len(analyse), time() - start))
+    print("Routes from {} victims propagated in {:.4f} seconds.".format(len(analyse), time() - start), file=logs)
+    for asn, prefix in analyse:
+        outfile = (None if outfile_tmp is None else outfile_tmp.format(asn))
+        results += run_analise(internet.fork(), asn, prefix, hijackers, outfile, type0, type1, roa,
+                               algorithm, baseline=True)
+    return results
+
+
+def init_worker(internet:Graph, profiler:ScenarioProfiler=None):
+    '''
+    Initialise a process of the Pool with the Graph (sent once per process), attach to the arrays in shared memory
+    if the Graph was created by Graph.share_arrays
+    :param internet: Graph object
+    :param profiler: profiling.ScenarioProfiler to profile a sample of the tasks (None = disabled)
+    :return:
+    '''
+    global worker_internet, worker_profiler
+    internet.attach_arrays()
+    worker_internet = internet
+    worker_profiler = profiler
+
+
+def run_task(victim:int, prefix:str, hijackers:list, type0:bool=True, type1:bool=True, roa:bool=True,
+             algorithm:str='flood'):
+    '''
+    Run run_analise in a new scenario of the Graph of the process (see init_worker)
+    :return: the results of run_analise
+    '''
+    return run_analise(worker_internet.fork(), victim, prefix, hijackers, None, type0, type1, roa, algorithm)
+
+
+def run_task_batch(analyse:list, hijackers:list, type0:bool=True, type1:bool=True, roa:bool=True,
+                   algorithm:str='flood'):
+    '''
+    Run run_analise_batch in a new scenario of the Graph of the process (see init_worker)
+    :return: the results of run_analise_batch
+    '''
+    return run_analise_batch(worker_internet.fork(), analyse, hijackers, None, type0, type1, roa, algorithm)
+
+
+def run_unit(unit:list):
+    '''
+    Run one task in a process of the Pool
+    :param unit: [run_task or run_task_batch, list of arguments]
+    :return: the results of the task
+    '''
+    function, args = unit
+    if worker_profiler is not None:
+        return worker_profiler.run(function, *args)
+    return function(*args)
+
+
+def run_numbered(item:list):
+    '''
+    Run one task in a process of the Pool and return its number (the tasks may finish out of order)
+    :param item: (number of the task, [function, list of arguments])
+    :return: (number of the task, results of the task)
+    '''
+    k, unit = item
+    return k, run_unit(unit)
+
+
+def task_units(task:list):
+    '''
+    Units (victim, hijacker, forged AS path type) simulated by a task
+    :param task: [run_task or run_task_batch, list of arguments]
+    :return: list of tuples
+    '''
+    function, args = task
+    if function is run_task:
+        victims, (hijackers, type0, type1) = [args[0]], args[2:5]
+    else:
+        victims, (hijackers, type0, type1) = [asn for asn, prefix in args[0]], args[1:4]
+    paths = [path for path, enabled in ((0, type0), (1, type1)) if enabled]
+    return [(victim, asn_hjk, path) for victim in victims for asn_hjk in hijackers for path in paths]
+
+
+def pending_task(task:list, journal:CampaignJournal):
+    '''
+    Remove from a task the victims, hijackers and forged AS paths with all units completed in the journal (units
+    completed in a task that runs again are dropped by CampaignJournal.add)
+    :param task: [run_task or run_task_batch, list of arguments]
+    :param journal: CampaignJournal of the campaign
+    :return: the task or None if all units were completed
+    '''
+    units = [unit for unit in task_units(task) if journal.pending(*unit)]
+    if len(units) == 0:
+        return None
+    victims = {unit[0] for unit in units}
+    hijackers = {unit[1] for unit in units}
+    paths = {unit[2] for unit in units}
+    function, args = task
+    if function is run_task:
+        return [function, [args[0], args[1], [asn for asn in args[2] if asn in hijackers], 0 in paths, 1 in paths]
+                + args[5:]]
+    return [function, [[[asn, prefix] for asn, prefix in args[0] if asn in victims],
+                       [asn for asn in args[1] if asn in hijackers], 0 in paths, 1 in paths] + args[4:]]
+
+
+def campaign_id(internet:Graph, roa:bool, algorithm:str, analyse:list, hjks:list, type0:bool, type1:bool):
+    '''
+    Identity of a simulation campaign saved in its journal: the topology, the ROV configuration, the victims, the
+    hijackers and the settings that change the results
+    :return: dict
+    '''
+    return {'snapshot': internet.get_topology().digest(), 'rov': internet.get_rov_digest(),
+            'simulations': hashlib.sha256(repr(([[int(asn), str(prefix)] for asn, prefix in analyse],
+                                                 [int(asn) for asn in hjks], type0, type1)).encode()).hexdigest(),
+            'rib_backend': internet.rib_backend, 'roa': roa, 'algorithm': algorithm}
+
+
+def create_profiler(folder:str, sample:float):
+    '''
+    Profiler of a simulation campaign (see profiling.ScenarioProfiler)
+    :param folder: folder where the profiles are saved (profile.txt, profile.prof and profile.folded)
+    :param sample: fraction of the tasks profiled (0 = profiling disabled)
+    :return: ScenarioProfiler object or None
+    '''
+    if sample <= 0:
+        return None
+    return ScenarioProfiler('{}/profile'.format(folder), sample=sample)
 
 
 def select_hijackers(internet:Graph, nb_hijackers:int, clusters:list):
@@ -114,29 +298,88 @@ def load_hijackers(internet:Graph, nb_hijackers:int, clusters:list, input_hjks:s
     return hjks
 
 
-def run_simulation(internet:Graph, hjks:list, analyse:list,outfile:str,n_threads:int=1, clear_tmp:bool=True,
-                   type0:bool=True, type1:bool=True, roa:bool=True):
-    args = []
-    files = []
-    outfile_tmp = outfile.replace('.csv','_{}.tmp')
-    for i, (asn, prefix) in enumerate(analyse):
-        tmp_f = outfile_tmp.format(asn)
-        files.append(tmp_f)
-        args.append([internet, asn, prefix, hjks, tmp_f, type0, type1, roa])
-    with Pool(processes=n_threads) as th_pool:
-        th_pool.starmap(run_analise, args, )
-    first_line = True
-    for f in files:
-        if not os.path.isfile(f):
-            continue
-        if first_line:
-            cmd = 'head -n 1 {} > {}'.format(f, outfile)
-            os.system(cmd)
-            first_line = False
-        cmd = 'cat ' + f + ' | grep "^{" >> '+ outfile
-        os.system(cmd)
-        if clear_tmp:
-            os.remove(f)
+def run_simulation(internet:Graph, hjks:list, analyse:list,outfile:str,n_threads:int=1, type0:bool=True,
+                   type1:bool=True, roa:bool=True, algorithm:str='flood', batch:int=0, shared:bool=False,
+                   hijackers_per_task:int=0, schedule:bool=False, compression:str=None,
+                   output_format:str='csv', hijack_log:HijackLog=None,
+                   metrics:PropagationMetrics=None, profiler:ScenarioProfiler=None, resume:bool=False,
+                   rov:str=None):
+    '''
+    Run the simulations of all victims in a Pool. The processes return the results of each task and only this process
+    writes them (results.ReportSink): the reports go to outfile and the hijacked AS paths seen by the VPs to
+    outfile_as-path_type-X.csv
+    :param shared: copy the topology and the ROV/ROA arrays to shared memory once (Graph.share_arrays), each
+    process receives the Graph once and the tasks only carry the victim, the prefix and the hijackers
+    :param hijackers_per_task: split the hijackers of each victim in tasks with this number of hijackers (0 = all)
+    :param schedule: split the simulations in units (victim, hijackers chunk, forged AS path) with similar costs
+    (tools.Scheduler), the free processes take the most expensive unit left (batch and hijackers_per_task are not used)
+    :param compression: None, 'gzip' or 'zstd' (the extension .gz or .zst is added to the csv files)
+    :param output_format: 'csv', 'parquet' or 'npz' (typed columns, read them with results.read_columnar)
+    :param hijack_log: results.HijackLog to record the hijacked routes accepted by the ASes, each process writes its
+    own file (None = disabled)
+    :param metrics: metrics.PropagationMetrics to save counters and timers of each scenario as JSON lines, each process
+    writes its own file (None = disabled)
+    :param profiler: profiling.ScenarioProfiler to profile a sample of the tasks (run_analise of a victim, a group of
+    victims or a scheduled unit) with cProfile and a stack sampler, the profiles of the processes are merged at the end
+    (None = disabled)
+    :param resume: continue the campaign journal of outfile (results.CampaignJournal) if it exists and belongs to the
+    same campaign (topology, ROV, victims, hijackers and settings), the completed units (victim, hijacker, forged AS
+    path) are skipped and the reports are written again from the journal without duplicates (False = start a new
+    journal)
+    :param rov: name of the ROV deployment simulated (Graph.add_rov_deployment), None = the ASes with ROV enabled in
+    the Graph
+    '''
+    if rov is not None:
+        internet = internet.fork()
+        if not internet.use_rov(rov):
+            return None
+    if hijackers_per_task > 0:
+        slices = [hjks[i:i + hijackers_per_task] for i in range(0, len(hjks), hijackers_per_task)]
+    else:
+        slices = [hjks]
+    if schedule:
+        forged_paths = [path for path, enabled in ((0, type0), (1, type1)) if enabled]
+        units = Scheduler(internet).create_units(analyse, hjks, forged_paths, 8 * n_threads)
+        tasks = [[run_task, [asn, prefix, hijackers, path == 0, path == 1, roa, algorithm]]
+                 for cost, asn, prefix, k, hijackers, path in units]
+    elif batch > 0:
+        # one task per group of victims, the legitimate routes of the group are propagated at once
+        tasks = [[run_task_batch, [analyse[i:i + batch], hijackers, type0, type1, roa, algorithm]]
+                 for i in range(0, len(analyse), batch) for hijackers in slices]
+    else:
+        tasks = [[run_task, [asn, prefix, hijackers, type0, type1, roa, algorithm]]
+                 for asn, prefix in analyse for hijackers in slices]
+    campaign = campaign_id(internet, roa, algorithm, analyse, hjks, type0, type1)
+    journal = CampaignJournal(journal_path(outfile), campaign, resume,
+                              units=[unit for task in tasks for unit in task_units(task)])
+    if len(journal.completed) > 0:
+        tasks = [task for task in (pending_task(task, journal) for task in tasks) if task is not None]
+        print('Resuming {}: {} units completed, {} tasks left.'.format(journal.path, len(journal.completed),
+                                                                      len(tasks)), file=logs)
+    if hijack_log is not None:
+        internet.set_hijack_log(hijack_log)
+    if metrics is not None:
+        internet.set_metrics(metrics)
+    if profiler is not None:
+        profiler.clear()
+    scenario = (internet.share_arrays() if shared else internet)
+    try:
+        with Pool(processes=n_threads, initializer=init_worker, initargs=(scenario, profiler)) as th_pool, \
+                ReportSink(outfile, compression, file_format=output_format) as sink:
+            journal.replay(sink)
+            # results are written as soon as each task finishes (in the order of the tasks, except for scheduled units)
+            for k, results in (th_pool.imap_unordered if schedule else th_pool.imap)(run_numbered, enumerate(tasks)):
+                sink.add(journal.add(task_units(tasks[k]), results))
+        if profiler is not None and profiler.merge() is not None:
+            print('Profiles saved in {}.txt and {}.folded'.format(profiler.outfile, profiler.outfile), file=logs)
+    finally:
+        journal.close()
+        if shared:
+            scenario.shared.unlink()
+        if hijack_log is not None:
+            hijack_log.close()
+        if metrics is not None:
+            metrics.close()
 
 
 def print_neighbors_stats(internet:Graph, asn:int):
@@ -187,11 +430,15 @@ if __name__ == '__main__':
     clusters = [[2, 2], [3, 3], [4, 10], [11, 0]]
     # number of simultaneous processes will be executed
     n_threads = 25
+    # fraction of the tasks profiled in each simulation (0 = profiling disabled)
+    profile_sample = 0
 
     df = pd.read_csv(input_file_prefix, sep=';')
     analyse = df[['ASN','Prefix']].values.tolist()
     asn_leg = df['ASN'].values.tolist()
     internet = load_internet(input_file)
+    # legitimate propagations shared by all simulations and saved for the next runs
+    internet.set_baseline_cache(BaselineCache('input/cache/baselines'))
     internet.get_vps()
     internet.get_country_ases()
     hjks = load_hijackers(internet, nb_hijackers, clusters, input_hjks)
@@ -201,13 +448,12 @@ if __name__ == '__main__':
     if not os.path.isdir(folder):
         os.mkdir(folder)
     outfile = '{}/result_{}.csv'.format(folder,date_file)
-    internet1 = deepcopy(internet)
     print('Starting simulation.')
     start = time()
     # File to save simulation data
-    run_simulation(internet1,hjks, analyse, outfile, n_threads, roa=False)
+    run_simulation(internet, hjks, analyse, outfile, n_threads, roa=False,
+                   profiler=create_profiler(folder, profile_sample))
     print("All execution took {:.4f} seconds".format(time() - start), file=logs)
-    del internet1
 
 
     # simulation (ROV enable, Type-0)
@@ -215,75 +461,80 @@ if __name__ == '__main__':
     if not os.path.isdir(folder):
         os.mkdir(folder)
     outfile = '{}/result_{}.csv'.format(folder,date_file)
-    internet1 = deepcopy(internet)
     print('Starting simulation.')
     start = time()
+    # ROV deployment saved in the Graph (the AS objects are not copied)
+    r_ases = ases_rov(ases=internet.get_ases(), date_target=date_file, folder='./data', min_ratio=1)
+    n_rov = internet.add_rov_deployment(os.path.basename(folder), ases=r_ases)
+    print('ROV enabled in {} of {} ASes.'.format(n_rov, len(internet.ases)))
     # File to save simulation data
-    r_ases = ases_rov(ases=internet1.get_ases(), date_target=date_file, folder='./data', min_ratio=1)
-    internet1.enable_rov(ases=r_ases)
-    run_simulation(internet1,hjks, analyse, outfile, n_threads, type0=True, type1=False, roa=True)
+    run_simulation(internet, hjks, analyse, outfile, n_threads, type0=True, type1=False, roa=True,
+                   profiler=create_profiler(folder, profile_sample), rov=os.path.basename(folder))
     print("All execution took {:.4f} seconds".format(time() - start), file=logs)
-    del internet1
 
     # simulation (ROV enable, Type-0)
     folder = './rov_0.75'
     if not os.path.isdir(folder):
         os.mkdir(folder)
     outfile = '{}/result_{}.csv'.format(folder,date_file)
-    internet1 = deepcopy(internet)
     print('Starting simulation.')
     start = time()
+    # ROV deployment saved in the Graph (the AS objects are not copied)
+    r_ases = ases_rov(ases=internet.get_ases(), date_target=date_file, folder='./data', min_ratio=0.75)
+    n_rov = internet.add_rov_deployment(os.path.basename(folder), ases=r_ases)
+    print('ROV enabled in {} of {} ASes.'.format(n_rov, len(internet.ases)))
     # File to save simulation data
-    r_ases = ases_rov(ases=internet1.get_ases(), date_target=date_file, folder='./data', min_ratio=0.75)
-    internet1.enable_rov(ases=r_ases)
-    run_simulation(internet1,hjks, analyse, outfile, n_threads, type0=True, type1=False, roa=True)
+    run_simulation(internet, hjks, analyse, outfile, n_threads, type0=True, type1=False, roa=True,
+                   profiler=create_profiler(folder, profile_sample), rov=os.path.basename(folder))
     print("All execution took {:.4f} seconds".format(time() - start), file=logs)
-    del internet1
 
     # simulation (ROV enable, Type-0)
     folder = './rov_0.5'
     if not os.path.isdir(folder):
         os.mkdir(folder)
     outfile = '{}/result_{}.csv'.format(folder,date_file)
-    internet1 = deepcopy(internet)
     print('Starting simulation.')
     start = time()
+    # ROV deployment saved in the Graph (the AS objects are not copied)
+    r_ases = ases_rov(ases=internet.get_ases(), date_target=date_file, folder='./data', min_ratio=0.50)
+    n_rov = internet.add_rov_deployment(os.path.basename(folder), ases=r_ases)
+    print('ROV enabled in {} of {} ASes.'.format(n_rov, len(internet.ases)))
     # File to save simulation data
-    r_ases = ases_rov(ases=internet1.get_ases(), date_target=date_file, folder='./data', min_ratio=0.50)
-    internet1.enable_rov(ases=r_ases)
-    run_simulation(internet1,hjks, analyse, outfile, n_threads, type0=True, type1=False, roa=True)
+    run_simulation(internet, hjks, analyse, outfile, n_threads, type0=True, type1=False, roa=True,
+                   profiler=create_profiler(folder, profile_sample), rov=os.path.basename(folder))
     print("All execution took {:.4f} seconds".format(time() - start), file=logs)
-    del internet1
 
     # simulation (ROV enable, Type-0)
     folder = './rov_0.25'
     if not os.path.isdir(folder):
         os.mkdir(folder)
     outfile = '{}/result_{}.csv'.format(folder,date_file)
-    internet1 = deepcopy(internet)
     print('Starting simulation.')
     start = time()
+    # ROV deployment saved in the Graph (the AS objects are not copied)
+    r_ases = ases_rov(ases=internet.get_ases(), date_target=date_file, folder='./data', min_ratio=0.25)
+    n_rov = internet.add_rov_deployment(os.path.basename(folder), ases=r_ases)
+    print('ROV enabled in {} of {} ASes.'.format(n_rov, len(internet.ases)))
     # File to save simulation data
-    r_ases = ases_rov(ases=internet1.get_ases(), date_target=date_file, folder='./data', min_ratio=0.25)
-    internet1.enable_rov(ases=r_ases)
-    run_simulation(internet1,hjks, analyse, outfile, n_threads, type0=True, type1=False, roa=True)
+    run_simulation(internet, hjks, analyse, outfile, n_threads, type0=True, type1=False, roa=True,
+                   profiler=create_profiler(folder, profile_sample), rov=os.path.basename(folder))
     print("All execution took {:.4f} seconds".format(time() - start), file=logs)
-    del internet1
 
     # simulation (ROV enable, Type-0)
     folder = './rov_0.01'
     if not os.path.isdir(folder):
         os.mkdir(folder)
     outfile = '{}/result_{}.csv'.format(folder,date_file)
-    internet1 = deepcopy(internet)
     print('Starting simulation.')
     start = time()
+    # ROV deployment saved in the Graph (the AS objects are not copied)
+    r_ases = ases_rov(ases=internet.get_ases(), date_target=date_file, folder='./data', min_ratio=0.01)
+    n_rov = internet.add_rov_deployment(os.path.basename(folder), ases=r_ases)
+    print('ROV enabled in {} of {} ASes.'.format(n_rov, len(internet.ases)))
     # File to save simulation data
-    r_ases = ases_rov(ases=internet1.get_ases(), date_target=date_file, folder='./data', min_ratio=0.01)
-    internet1.enable_rov(ases=r_ases)
-    run_simulation(internet1,hjks, analyse, outfile, n_threads, type0=True, type1=False, roa=True)
+    run_simulation(internet, hjks, analyse, outfile, n_threads, type0=True, type1=False, roa=True,
+                   profiler=create_profiler(folder, profile_sample), rov=os.path.basename(folder))
     print("All execution took {:.4f} seconds".format(time() - start), file=logs)
-    del internet1
 
     print('ASN;Neighbors;Total_Countries;Total_Continents;Customers;Customers_Countries;Customers_Continents;Peers;'
           'Peers_Countries;Peers_Continents;Providers;Providers_Countries;Providers_Continents')
@@ -0,0 +1,88 @@
+from multiprocessing import shared_memory
+import numpy as np
+
+# Offsets of the arrays in the block are multiples of this value
+ALIGNMENT = 64
+
+
+class SharedArrays:
+    def __init__(self, arrays:dict):
+        '''
+        Named NumPy arrays copied once to a multiprocessing.shared_memory block. Pickling this object only sends
+        the name of the block and the layout of the arrays, the processes that receive it attach to the same memory
+        (zero-copy). The process that created the block must call unlink() when the other processes finish.
+        :param arrays: a dict {name: numpy array}
+        '''
+        self.layout = dict()
+        size = 0
+        for key, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            self.layout[key] = (size, array.shape, array.dtype.str)
+            size += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self.owner = True
+        self.arrays = dict()
+        for key, array in arrays.items():
+            self.view(key)[...] = array
+
+
+    @classmethod
+    def attach(cls, name:str, layout:dict):
+        '''
+        Attach to a block created by another process
+        :param name: name of the shared memory block
+        :param layout: a dict {name: (offset, shape, dtype)}
+        :return: SharedArrays object
+        '''
+        shared = cls.__new__(cls)
+        shared.layout = layout
+        shared.shm = shared_memory.SharedMemory(name=name)
+        shared.owner = False
+        shared.arrays = dict()
+        return shared
+
+
+    def __reduce__(self):
+        return SharedArrays.attach, (self.shm.name, self.layout)
+
+
+    def view(self, key:str):
+        offset, shape, dtype = self.layout[key]
+        return np.ndarray(shape, dtype=np.dtype(dtype), buffer=self.shm.buf, offset=offset)
+
+
+    def __getitem__(self, key:str):
+        '''
+        Read-only array over the shared memory (the arrays are shared by all processes and must not change)
+        :param key: name of the array
+        :return: numpy array
+        '''
+        if key not in self.arrays.keys():
+            array = self.view(key)
+            array.flags.writeable = False
+            self.arrays[key] = array
+        return self.arrays[key]
+
+
+    def __contains__(self, key:str):
+        return key in self.layout
+
+
+    def keys(self):
+        return self.layout.keys()
+
+
+    def nbytes(self):
+        return self.shm.size
+
+
+    def unlink(self):
+        '''
+        Release the shared memory block (only the process that created it), the arrays of this object can not be
+        used after that
+        :return: None
+        '''
+        self.arrays.clear()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,173 @@
+import bz2
+import argparse
+import numpy as np
+import pandas as pd
+from graph import Graph
+from topology import sorted_unique
+
+# Distribution of the number of providers of an AS (CAIDA 2024-02-01: 1 = 43%, 2 = 36%, 3 = 12%, ...)
+PROVIDERS = [1, 2, 3, 4, 5, 6]
+PROVIDERS_P = [0.43, 0.36, 0.12, 0.05, 0.025, 0.015]
+# Number of batches used to attach the ASes (the weights of the providers are updated after each batch)
+BATCHES = 64
+
+
+def choose(rng, candidates, weights, size:int):
+    '''
+    Random ASes (indexes) with probability proportional to the weights
+    '''
+    p = weights[candidates].astype(np.float64)
+    return rng.choice(candidates, size=size, p=p / p.sum())
+
+
+def generate_as_rel(nb_ases:int, seed:int=0, tier1:int=19, transit:float=0.155, ixp:float=0.0004,
+                    peering:float=5.5, stub_peering:float=0.12, alpha:float=1.1):
+    '''
+    Create a CAIDA-like AS relationship topology:
+    - a clique of Tier-1 ASes (peers, without providers),
+    - transit ASes and stubs attached to providers by preferential attachment over the number of customers
+    (heavy-tailed customer degrees), always to ASes created before them (there are no provider cycles),
+    - peering between transit ASes and other ASes that peer (transit ASes and a fraction of the stubs) weighted by
+    their degree,
+    - IXP ASes (route servers) peering with many members.
+    The default values follow the CAIDA snapshot of 2024-02-01 (~15% transit ASes, 5.5 peering links per AS, 12% of
+    the stubs with peers).
+    :param nb_ases: number of ASes
+    :param seed: seed of the random generator
+    :param tier1: number of Tier-1 ASes
+    :param transit: fraction of the ASes that can have customers
+    :param ixp: fraction of the ASes that are IXPs
+    :param peering: number of peering links per AS
+    :param stub_peering: fraction of the stubs with peers
+    :param alpha: exponent of the preferential attachment (larger = heavier tail)
+    :return: a dict {'as1', 'as2', 'conn', 'tier1', 'ixp': numpy array} (same format of asrel.parse_as_rel)
+    '''
+    rng = np.random.default_rng(seed)
+    tier1 = min(tier1, nb_ases)
+    nb_ixp = min(max(1, int(round(nb_ases * ixp))), nb_ases - tier1) if nb_ases > tier1 else 0
+    nb_transit = int(round((nb_ases - tier1 - nb_ixp) * transit))
+    # ASNs are sorted, the Tier-1 ASes get the lowest numbers
+    asns = np.sort(rng.choice(np.arange(1, max(5 * nb_ases, 65536)), size=nb_ases, replace=False))
+    rest = rng.permutation(np.arange(tier1, nb_ases))
+    transit_idx = np.sort(rest[:nb_transit])
+    ixp_idx = np.sort(rest[nb_transit:nb_transit + nb_ixp])
+    stub_idx = rest[nb_transit + nb_ixp:]
+    tier1_idx = np.arange(tier1)
+
+    # customer -> provider links by preferential attachment, in batches
+    customers = np.zeros(nb_ases, dtype=np.int64)
+    customers[tier1_idx] = 10
+    src = list()
+    dst = list()
+    eligible = tier1_idx
+    for group in (transit_idx, np.concatenate([ixp_idx, stub_idx])):
+        for batch in np.array_split(group, min(BATCHES, max(1, len(group)))):
+            if len(batch) == 0 or len(eligible) == 0:
+                continue
+            nb = rng.choice(PROVIDERS, size=len(batch), p=PROVIDERS_P)
+            owners = np.repeat(batch, nb)
+            providers = choose(rng, eligible, (customers + 1.0) ** alpha, len(owners))
+            customers += np.bincount(providers, minlength=nb_ases)
+            src.append(providers)
+            dst.append(owners)
+            if group is transit_idx:
+                eligible = np.concatenate([eligible, batch])
+    if len(src) > 0:
+        p2c = unique_pairs(np.concatenate(src), np.concatenate(dst), nb_ases, ordered=True)
+    else:
+        p2c = np.zeros((0, 2), dtype=np.int64)
+
+    # peering: Tier-1 clique, private peering and IXPs
+    i, j = np.triu_indices(tier1, k=1)
+    peers = [np.stack([i, j], axis=1)]
+    providers_of = np.bincount(p2c[:, 1], minlength=nb_ases)
+    degree = customers + providers_of + 1.0
+    ixp_links = int(peering * nb_ases * 0.1)
+    private = int(peering * nb_ases) - len(peers[0]) - ixp_links
+    peering_ases = np.concatenate([transit_idx, stub_idx[rng.random(len(stub_idx)) < stub_peering]])
+    if private > 0 and nb_transit > 0:
+        a = choose(rng, transit_idx, degree, private)
+        b = choose(rng, peering_ases, degree ** 0.5, private)
+        peers.append(np.stack([a, b], axis=1))
+    if nb_ixp > 0 and ixp_links > 0 and len(peering_ases) > 0:
+        # members per IXP are heavy-tailed
+        members = rng.pareto(1.2, size=nb_ixp) + 1.0
+        members = np.maximum(1, (members / members.sum() * ixp_links).astype(np.int64))
+        a = np.repeat(ixp_idx, members)
+        b = choose(rng, peering_ases, degree ** 0.5, len(a))
+        peers.append(np.stack([a, b], axis=1))
+    peers = np.concatenate(peers)
+    peers = unique_pairs(peers[:, 0], peers[:, 1], nb_ases, ordered=False)
+    # a pair of ASes has only one relationship (customer-provider has priority)
+    keys = p2c.min(axis=1) * nb_ases + p2c.max(axis=1)
+    peers = peers[~np.isin(peers[:, 0] * nb_ases + peers[:, 1], keys)]
+
+    as1 = np.concatenate([asns[p2c[:, 0]], asns[peers[:, 0]]])
+    as2 = np.concatenate([asns[p2c[:, 1]], asns[peers[:, 1]]])
+    conn = np.concatenate([np.full(len(p2c), -1, dtype=np.int8), np.zeros(len(peers), dtype=np.int8)])
+    return {'as1': as1, 'as2': as2, 'conn': conn, 'tier1': asns[tier1_idx], 'ixp': asns[ixp_idx]}
+
+
+def unique_pairs(a, b, n:int, ordered:bool=True):
+    '''
+    Remove loops and duplicated pairs of indexes
+    :param ordered: False to consider (a, b) and (b, a) the same pair (the pairs are returned with a < b)
+    :return: array with shape (pairs, 2)
+    '''
+    a = np.asarray(a, dtype=np.int64)
+    b = np.asarray(b, dtype=np.int64)
+    keep = a != b
+    a = a[keep]
+    b = b[keep]
+    if not ordered:
+        a, b = np.minimum(a, b), np.maximum(a, b)
+    keys = sorted_unique(a * n + b)
+    return np.stack([keys // n, keys % n], axis=1)
+
+
+def write_as_rel(outfile:str, edges:dict, comment:str='synthetic AS relationships'):
+    '''
+    Write the topology in the as-rel2 format of CAIDA (as1|as2|conn|source), it can be loaded with
+    Graph.add_connections
+    :param outfile: file name (compressed with bz2 if it ends with .bz2)
+    :param edges: a dict {'as1', 'as2', 'conn', 'tier1', 'ixp': numpy array}
+    :param comment: first line of the file
+    :return: file name
+    '''
+    out = (bz2.open(outfile, 'wt') if outfile.endswith('.bz2') else open(outfile, 'w'))
+    with out:
+        out.write('# {}\n'.format(comment))
+        out.write('# input clique: {}\n'.format(' '.join(str(asn) for asn in edges['tier1'])))
+        out.write('# IXP ASes: {}\n'.format(' '.join(str(asn) for asn in edges['ixp'])))
+        df = pd.DataFrame({'as1': edges['as1'], 'as2': edges['as2'], 'conn': edges['conn'], 'source': 'bgp'})
+        df.to_csv(out, sep='|', header=False, index=False)
+    return outfile
+
+
+def create_as_rel(outfile:str, nb_ases:int, seed:int=0, **params):
+    '''
+    Generate a topology (see generate_as_rel) and write it (see write_as_rel)
+    :return: file name
+    '''
+    edges = generate_as_rel(nb_ases, seed, **params)
+    return write_as_rel(outfile, edges, 'synthetic AS relationships: {} ASes, seed {}'.format(nb_ases, seed))
+
+
+def create_graph(nb_ases:int, seed:int=0, rib_backend:str='dict', **params):
+    '''
+    Generate a topology (see generate_as_rel) and load it in a new Graph without writing a file
+    :param rib_backend: 'dict' or 'arrays' (see Graph)
+    :return: Graph object
+    '''
+    internet = Graph(override=False, debug=False, rib_backend=rib_backend)
+    internet.add_edges(generate_as_rel(nb_ases, seed, **params))
+    return internet
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Create a synthetic CAIDA-like AS relationship file.')
+    parser.add_argument('-n', '--ases', type=int, required=True)
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', required=True, help='as-rel2 file (.txt or .txt.bz2)')
+    args = parser.parse_args()
+    print(create_as_rel(args.output, args.ases, args.seed))
@@ -220,3 +220,67 @@ class Hijackers:
                     candidates.append(asn)
             hijackers += random.sample(candidates, nb)
         return hijackers
+
+
+class Scheduler:
+    def __init__(self, internet:Graph):
+        '''
+        Create an object to split the simulations in units of work (victim, hijackers chunk, forged AS path) with
+        similar costs. The units are ordered from the most expensive to the cheapest, so when the processes of a Pool
+        take the next unit as soon as they are free (Pool.imap_unordered), the last units to finish are the short ones.
+        :param internet: Graph object with ASes and their connections
+        '''
+        self.internet = internet
+        self.topology = internet.get_topology()
+        self.costs = dict()
+
+
+    def get_costs(self, asns:list):
+        '''
+        Estimate the relative cost to propagate a route from each AS: 1 + (degree + customer cone size) / number of
+        ASes. Routes from ASes with more neighbors and bigger customer cones reach more ASes before they converge.
+        :param asns: list of ASNs
+        :return: a dict {ASN: cost}
+        '''
+        missing = [asn for asn in set(asns) if asn not in self.costs.keys() and self.topology.get_index(asn) >= 0]
+        if len(missing) > 0:
+            idx = self.topology.get_indexes(missing)
+            cone = self.topology.customer_cone_sizes(idx)
+            costs = 1 + (self.topology.degree[idx] + cone) / len(self.topology)
+            self.costs.update(zip(missing, costs.tolist()))
+        return {asn: self.costs.get(asn, 1.0) for asn in asns}
+
+
+    def create_units(self, analyse:list, hijackers:list, forged_paths:list, nb_units:int):
+        '''
+        Split the hijackers of each victim in chunks with similar costs (about the total cost / nb_units) and create
+        one unit per victim, chunk and forged AS path. Each unit propagates the legitimate route again, so it costs
+        one more propagation from the victim.
+        :param analyse: list of [victim, prefix]
+        :param hijackers: list of ASN hijackers (the same to all victims)
+        :param forged_paths: types of forged AS path to simulate (0 = Type-0, 1 = Type-1)
+        :param nb_units: approximate number of units to create
+        :return: a list of [cost, victim, prefix, chunk number, hijackers chunk, forged AS path type], the most expensive first
+        '''
+        hjk_costs = self.get_costs(hijackers)
+        leg_costs = self.get_costs([asn for asn, _ in analyse])
+        total = sum(hjk_costs.values()) * len(analyse) * len(forged_paths)
+        target = total / max(nb_units, 1)
+        units = list()
+        for asn, prefix in analyse:
+            chunks = [[]]
+            cost = 0
+            for asn_hjk in hijackers:
+                if cost >= target:
+                    chunks.append([])
+                    cost = 0
+                chunks[-1].append(asn_hjk)
+                cost += hjk_costs[asn_hjk]
+            for k, chunk in enumerate(chunks):
+                if len(chunk) == 0:
+                    continue
+                cost = leg_costs[asn] + sum(hjk_costs[asn_hjk] for asn_hjk in chunk)
+                for path in forged_paths:
+                    units.append([cost, asn, prefix, k, chunk, path])
+        units.sort(key=lambda unit: -unit[0])
+        return units
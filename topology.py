@@ -0,0 +1,426 @@
+import hashlib
+import numpy as np
+
+# Relationship of a neighbour seen from an AS, ordered by Gao-Rexford preference (lower is preferred)
+NOT_NEIGHBOR = 0
+CUSTOMER = 1
+PEER = 2
+SIBLING = 3
+PROVIDER = 4
+RELATIONSHIPS = (CUSTOMER, PEER, SIBLING, PROVIDER)
+REL_NAMES = {NOT_NEIGHBOR: 'none', CUSTOMER: 'customer', PEER: 'peer', SIBLING: 'sibling', PROVIDER: 'provider'}
+
+
+def sorted_unique(values):
+    '''
+    Sorted unique values of an integer array (same as np.unique, sorting instead of hashing, which is faster for
+    the large arrays of the topology)
+    :param values: numpy array
+    :return: numpy array
+    '''
+    values = np.sort(values)
+    if len(values) == 0:
+        return values
+    keep = np.empty(len(values), dtype=bool)
+    keep[0] = True
+    np.not_equal(values[1:], values[:-1], out=keep[1:])
+    return values[keep]
+
+
+def csr_gather(indptr, indices, nodes):
+    '''
+    Rows of many nodes of CSR arrays at once
+    :param indptr: CSR row pointers
+    :param indices: CSR values
+    :param nodes: array with the rows
+    :return: two arrays (row, value), one entry per value
+    '''
+    nodes = np.asarray(nodes, dtype=np.int64)
+    starts = indptr[nodes]
+    counts = indptr[nodes + 1] - starts
+    total = int(counts.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=indices.dtype)
+    rows = np.repeat(nodes, counts)
+    offsets = np.arange(total, dtype=np.int64) - np.repeat(np.cumsum(counts) - counts, counts)
+    return rows, indices[np.repeat(starts, counts) + offsets]
+
+
+class Topology:
+    def __init__(self, asns, rows:dict, tier1:list=[], ixp:list=[]):
+        '''
+        Compact and immutable representation of the AS connections.
+        ASNs are mapped to dense indexes (0..N-1, sorted by ASN) and the neighbours of each relationship type are
+        kept in CSR arrays (indptr/indices), so the neighbours of an AS are a contiguous slice of integer indexes.
+        Use Topology.from_graph() or Topology.from_edges() to create the object.
+        :param asns: sorted array with all ASNs (numpy array)
+        :param rows: a dict {relationship: (indptr, indices)} with the CSR arrays of each relationship
+        :param tier1: list of Tier-1 ASNs (# input clique)
+        :param ixp: list of IXP ASNs (# IXP ASes)
+        '''
+        self.asns = np.asarray(asns, dtype=np.int64)
+        self.tier1 = list(tier1)
+        self.ixp = list(ixp)
+        self.index = {int(asn): i for i, asn in enumerate(self.asns.tolist())}
+        self.indptr = dict()
+        self.indices = dict()
+        for rel in RELATIONSHIPS:
+            indptr, indices = rows[rel]
+            self.indptr[rel] = np.asarray(indptr, dtype=np.int64)
+            self.indices[rel] = np.asarray(indices, dtype=np.int32)
+        self.n_customers = np.diff(self.indptr[CUSTOMER]).astype(np.int32)
+        self.n_peers = np.diff(self.indptr[PEER]).astype(np.int32)
+        self.n_siblings = np.diff(self.indptr[SIBLING]).astype(np.int32)
+        self.n_providers = np.diff(self.indptr[PROVIDER]).astype(np.int32)
+        # Same degree used by Graph.get_ases_infor() (siblings are not included)
+        self.degree = self.n_customers + self.n_peers + self.n_providers
+        # SHA-256 of the arrays (see digest)
+        self.sha256 = None
+        # stubs grouped by identical providers and peers (see stub_groups)
+        self.stubs = None
+        self.stub_links = None
+
+
+    def __len__(self):
+        return len(self.asns)
+
+
+    @staticmethod
+    def _csr(n:int, src, dst):
+        '''
+        Create CSR arrays with the neighbours (dst) of each index (src), neighbours are sorted by index
+        :param n: number of ASes
+        :param src: array with source indexes
+        :param dst: array with neighbour indexes
+        :return: indptr, indices
+        '''
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        if len(src) > 0:
+            # remove duplicated connections
+            keys = sorted_unique(src * n + dst)
+            src = keys // n
+            dst = keys % n
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+        return indptr, dst.astype(np.int32)
+
+
+    @classmethod
+    def from_edges(cls, as1, as2, conn, tier1:list=[], ixp:list=[], siblings=None):
+        '''
+        Create the topology from CAIDA AS relationship edges (as1|as2|conn)
+        :param as1: array with the first ASN of each connection
+        :param as2: array with the second ASN of each connection
+        :param conn: array with the connection type (-1 = as1 is provider of as2, 0 = peers)
+        :param tier1: list of Tier-1 ASNs
+        :param ixp: list of IXP ASNs
+        :param siblings: optional pairs of sibling ASNs [(as1, as2), ...]
+        :return: Topology object
+        '''
+        as1 = np.asarray(as1, dtype=np.int64)
+        as2 = np.asarray(as2, dtype=np.int64)
+        conn = np.asarray(conn, dtype=np.int64)
+        if siblings is None or len(siblings) == 0:
+            sib = np.zeros((0, 2), dtype=np.int64)
+        else:
+            sib = np.asarray(siblings, dtype=np.int64).reshape(-1, 2)
+        asns = sorted_unique(np.concatenate([as1, as2, sib[:, 0], sib[:, 1]]))
+        n = len(asns)
+        i1 = np.searchsorted(asns, as1)
+        i2 = np.searchsorted(asns, as2)
+        s1 = np.searchsorted(asns, sib[:, 0])
+        s2 = np.searchsorted(asns, sib[:, 1])
+        p2c = conn == -1
+        p2p = conn == 0
+        rows = {CUSTOMER: cls._csr(n, i1[p2c], i2[p2c]),
+                PROVIDER: cls._csr(n, i2[p2c], i1[p2c]),
+                PEER: cls._csr(n, np.concatenate([i1[p2p], i2[p2p]]), np.concatenate([i2[p2p], i1[p2p]])),
+                SIBLING: cls._csr(n, s1, s2)}
+        return cls(asns, rows, tier1, ixp)
+
+
+    @classmethod
+    def from_graph(cls, graph):
+        '''
+        Create the topology from the AS objects of a Graph
+        :param graph: Graph object with connections loaded
+        :return: Topology object
+        '''
+        asns = np.array(sorted(graph.ases.keys()), dtype=np.int64)
+        n = len(asns)
+        index = {int(asn): i for i, asn in enumerate(asns.tolist())}
+        rows = dict()
+        for rel, attr in ((CUSTOMER, 'customers'), (PEER, 'peers'), (SIBLING, 'siblings'), (PROVIDER, 'providers')):
+            src = list()
+            dst = list()
+            for asn, as_obj in graph.ases.items():
+                i = index[asn]
+                for neighbor in getattr(as_obj, attr):
+                    if neighbor in index:
+                        src.append(i)
+                        dst.append(index[neighbor])
+            rows[rel] = cls._csr(n, src, dst)
+        return cls(asns, rows, graph.tier1, graph.ixp)
+
+
+    def to_arrays(self):
+        '''
+        Arrays that describe the topology (used to share it between processes, see Topology.from_arrays)
+        :return: a dict {name: numpy array}
+        '''
+        arrays = {'asns': self.asns}
+        for rel in RELATIONSHIPS:
+            arrays['indptr/{}'.format(rel)] = self.indptr[rel]
+            arrays['indices/{}'.format(rel)] = self.indices[rel]
+        return arrays
+
+
+    @classmethod
+    def from_arrays(cls, arrays, tier1:list=[], ixp:list=[]):
+        '''
+        Create the topology over existing arrays (Topology.to_arrays) without copying them
+        :param arrays: a dict-like object {name: numpy array}
+        :param tier1: list of Tier-1 ASNs
+        :param ixp: list of IXP ASNs
+        :return: Topology object
+        '''
+        rows = {rel: (arrays['indptr/{}'.format(rel)], arrays['indices/{}'.format(rel)]) for rel in RELATIONSHIPS}
+        return cls(arrays['asns'], rows, tier1, ixp)
+
+
+    def get_index(self, asn:int):
+        '''
+        Get the dense index of an ASN
+        :param asn: ASN (int)
+        :return: index (int) or -1 if the AS is not in the topology
+        '''
+        return self.index.get(asn, -1)
+
+
+    def get_indexes(self, asns):
+        '''
+        Vectorised ASN -> index conversion
+        :param asns: list or array of ASNs
+        :return: array with the indexes (-1 for ASNs not in the topology)
+        '''
+        asns = np.asarray(asns, dtype=np.int64)
+        idx = np.searchsorted(self.asns, asns)
+        idx[idx >= len(self.asns)] = 0
+        found = self.asns[idx] == asns
+        return np.where(found, idx, -1)
+
+
+    def get_asn(self, i:int):
+        '''
+        Get the ASN of a dense index
+        :param i: index (int)
+        :return: ASN (int)
+        '''
+        return int(self.asns[i])
+
+
+    def neighbors_by_rel(self, i:int, rel:int):
+        '''
+        Neighbours of an AS with a relationship type
+        :param i: AS index
+        :param rel: CUSTOMER, PEER, SIBLING or PROVIDER
+        :return: array slice with neighbour indexes
+        '''
+        return self.indices[rel][self.indptr[rel][i]:self.indptr[rel][i + 1]]
+
+
+    def customers(self, i:int):
+        return self.neighbors_by_rel(i, CUSTOMER)
+
+
+    def peers(self, i:int):
+        return self.neighbors_by_rel(i, PEER)
+
+
+    def siblings(self, i:int):
+        return self.neighbors_by_rel(i, SIBLING)
+
+
+    def providers(self, i:int):
+        return self.neighbors_by_rel(i, PROVIDER)
+
+
+    def neighbors(self, i:int):
+        '''
+        All neighbours of an AS (providers, peers, siblings and customers)
+        :param i: AS index
+        :return: array with neighbour indexes
+        '''
+        return np.concatenate([self.providers(i), self.peers(i), self.siblings(i), self.customers(i)])
+
+
+    def relationship(self, i:int, j:int):
+        '''
+        Relationship of the AS j seen from AS i (the same tests done with the sets of the AS objects)
+        :param i: AS index
+        :param j: neighbour index
+        :return: CUSTOMER, PEER, SIBLING, PROVIDER or NOT_NEIGHBOR
+        '''
+        for rel in RELATIONSHIPS:
+            row = self.neighbors_by_rel(i, rel)
+            k = np.searchsorted(row, j)
+            if k < len(row) and row[k] == j:
+                return rel
+        return NOT_NEIGHBOR
+
+
+    def is_customer(self, i:int, j:int):
+        return self.relationship(i, j) == CUSTOMER
+
+
+    def is_peer(self, i:int, j:int):
+        return self.relationship(i, j) == PEER
+
+
+    def is_provider(self, i:int, j:int):
+        return self.relationship(i, j) == PROVIDER
+
+
+    def is_sibling(self, i:int, j:int):
+        return self.relationship(i, j) == SIBLING
+
+
+    def edges(self, rel:int):
+        '''
+        All edges of a relationship type as two arrays (i, j), where j is a <rel> of i
+        :param rel: CUSTOMER, PEER, SIBLING or PROVIDER
+        :return: src indexes, dst indexes
+        '''
+        src = np.repeat(np.arange(len(self.asns), dtype=np.int32), np.diff(self.indptr[rel]))
+        return src, self.indices[rel]
+
+
+    def gather(self, nodes, rel:int):
+        '''
+        Neighbours of many ASes at once (CSR gather)
+        :param nodes: array with AS indexes
+        :param rel: CUSTOMER, PEER, SIBLING or PROVIDER
+        :return: two arrays (sender, neighbour), one entry per connection
+        '''
+        return csr_gather(self.indptr[rel], self.indices[rel], nodes)
+
+
+    def customer_cone(self, i:int):
+        '''
+        ASes reached from an AS following only provider -> customer links (the AS included)
+        :param i: AS index or array with AS indexes (union of their customer cones)
+        :return: array with the indexes of the customer cone
+        '''
+        seen = np.zeros(len(self.asns), dtype=bool)
+        frontier = np.atleast_1d(np.asarray(i, dtype=np.int64))
+        seen[frontier] = True
+        while len(frontier) > 0:
+            _, neighbors = self.gather(frontier, CUSTOMER)
+            neighbors = np.unique(neighbors[~seen[neighbors]])
+            seen[neighbors] = True
+            frontier = neighbors
+        return np.flatnonzero(seen)
+
+
+    def customer_cone_sizes(self, nodes):
+        '''
+        Size of the customer cone of many ASes (ASes without customers have cone size 1)
+        :param nodes: array with AS indexes
+        :return: array with the sizes
+        '''
+        nodes = np.asarray(nodes, dtype=np.int64)
+        sizes = np.ones(len(nodes), dtype=np.int64)
+        for k in np.flatnonzero(self.n_customers[nodes] > 0).tolist():
+            sizes[k] = len(self.customer_cone(nodes[k]))
+        return sizes
+
+
+    def stub_groups(self):
+        '''
+        Stubs (ASes without customers and siblings) grouped by identical providers and peers. A stub never announces
+        the routes it learns, so its routes depend only on the offers of its providers and peers, and all stubs of a
+        group receive the same offers (see propagation.resolve_stubs). The groups are computed once per topology.
+        :return: boolean mask with the stubs, array with the group of each AS (-1 if it is not a stub) and array with
+        one stub of each group (representative)
+        '''
+        if self.stubs is None:
+            n = len(self.asns)
+            stub = (self.n_customers == 0) & (self.n_siblings == 0)
+            members = np.flatnonzero(stub)
+            # hash of the providers and of the peers (sum of random weights), equal sets have equal hashes
+            weights = np.random.default_rng(0).integers(1, 2 ** 63, size=(2, n), dtype=np.int64).astype(np.uint64)
+            signature = np.zeros(n, dtype=np.uint64)
+            for w, rel in zip(weights, (PROVIDER, PEER)):
+                src, dst = self.gather(members, rel)
+                np.add.at(signature, src, w[dst])
+            order = members[np.lexsort((self.n_peers[members], self.n_providers[members], signature[members]))]
+            first = np.ones(len(order), dtype=bool)
+            first[1:] = ((signature[order[1:]] != signature[order[:-1]]) |
+                         (self.n_providers[order[1:]] != self.n_providers[order[:-1]]) |
+                         (self.n_peers[order[1:]] != self.n_peers[order[:-1]]))
+            group = np.full(n, -1, dtype=np.int64)
+            group[order] = np.cumsum(first) - 1
+            reps = order[first]
+            # the neighbours (sorted in the CSR arrays) are compared with the representative, a stub with different
+            # neighbours and the same hash is moved to a new group
+            differ = np.zeros(n, dtype=bool)
+            for rel in (PROVIDER, PEER):
+                src, dst = self.gather(order, rel)
+                differ[src[dst != self.gather(reps[group[order]], rel)[1]]] = True
+            moved = np.flatnonzero(differ)
+            group[moved] = len(reps) + np.arange(len(moved))
+            reps = np.concatenate([reps, moved])
+            self.stubs = (stub, group, reps)
+        return self.stubs
+
+
+    def stub_offers(self):
+        '''
+        Arrays to offer routes to the groups of stubs (see stub_groups), computed once per topology
+        :return: a dict {'stubs': sorted indexes of the stubs, 'groups': group of each stub, PROVIDER/PEER: CSR arrays
+        (indptr, indices) with the groups that have each AS as provider/peer, 'asns': set with the ASNs of the stubs}
+        '''
+        if self.stub_links is None:
+            stub, group, reps = self.stub_groups()
+            members = np.flatnonzero(stub)
+            links = {'stubs': members, 'groups': group[members], 'asns': frozenset(self.asns[members].tolist())}
+            for rel in (PROVIDER, PEER):
+                rep, neighbors = self.gather(reps, rel)
+                links[rel] = self._csr(len(self.asns), neighbors, group[rep])
+            self.stub_links = links
+        return self.stub_links
+
+
+    def get_as_infor(self, i:int):
+        '''
+        Number of customers, providers and peers and the degree of an AS
+        :param i: AS index
+        :return: customers, providers, peers, degree
+        '''
+        return int(self.n_customers[i]), int(self.n_providers[i]), int(self.n_peers[i]), int(self.degree[i])
+
+
+    def digest(self):
+        '''
+        SHA-256 of the ASNs and the adjacency arrays, identifies the topology independently of the file it came from
+        :return: hexadecimal digest (str)
+        '''
+        if self.sha256 is None:
+            digest = hashlib.sha256(np.ascontiguousarray(self.asns, dtype=np.int64).tobytes())
+            for rel in RELATIONSHIPS:
+                digest.update(np.ascontiguousarray(self.indptr[rel], dtype=np.int64).tobytes())
+                digest.update(np.ascontiguousarray(self.indices[rel], dtype=np.int64).tobytes())
+            self.sha256 = digest.hexdigest()
+        return self.sha256
+
+
+    def nbytes(self):
+        '''
+        Memory used by the arrays (without the ASN -> index dict)
+        :return: number of bytes
+        '''
+        total = self.asns.nbytes
+        for rel in RELATIONSHIPS:
+            total += self.indptr[rel].nbytes + self.indices[rel].nbytes
+        return total